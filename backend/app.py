@@ -1,79 +1,309 @@
 # complete_app.py - AI Mental Health Platform Backend
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, Response
 from flask_cors import CORS
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import execute_values
 import os
 from datetime import datetime, timedelta
 import logging
 import json
-from werkzeug.utils import secure_filename
+import time
+import threading
+from werkzeug.exceptions import RequestEntityTooLarge
 import uuid
-import random
+from inference import BatchInferenceScheduler
+from inference_pool import InferenceProcessPool
+from cache import TTLCache, content_key
+from model_loader import ModelLoader
+from db import ConnectionPool, reset_query_count, query_count
+from jobs import JobQueue
+from voice_features import extract_voice_features, FEATURES_VERSION
+import blob_store
+import session_summary
+import live_audio
+from metrics_accumulator import MetricsAccumulator
+import rollups
+import migrate
+import queries
+from events import SessionEventBroker, NotifyListener, format_sse, notify as notify_session_event
+from instrumentation import Instrumentation
+from lexicon import Lexicon, DEFAULT_LEXICON_PATHS
+from upload_stream import UploadRequest, remove_stale_parts
+import models
+import emotion_vectors
+import queue
+import base64
+import click
+from contextlib import contextmanager
+import atexit
 
 # Initialize Flask app
 app = Flask(__name__)
+app.request_class = UploadRequest
 CORS(app)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
 app.config['UPLOAD_FOLDER'] = 'uploads'
+app.config['VOICE_UPLOAD_MAX_BYTES'] = int(os.environ.get('VOICE_UPLOAD_MAX_BYTES', 25 * 1024 * 1024))
+app.config['CALL_UPLOAD_MAX_BYTES'] = int(os.environ.get('CALL_UPLOAD_MAX_BYTES', 500 * 1024 * 1024))  # long call recordings
+app.config['VOICE_BLOB_GC_GRACE'] = float(os.environ.get('VOICE_BLOB_GC_GRACE', 3600))  # seconds an unreferenced blob is kept
+app.config['INFERENCE_MAX_BATCH_SIZE'] = int(os.environ.get('INFERENCE_MAX_BATCH_SIZE', 16))
+app.config['INFERENCE_MAX_WAIT_MS'] = float(os.environ.get('INFERENCE_MAX_WAIT_MS', 10))
+app.config['INFERENCE_TIMEOUT'] = float(os.environ.get('INFERENCE_TIMEOUT', 30))
+app.config['INFERENCE_BACKEND'] = os.environ.get('INFERENCE_BACKEND', 'thread')  # thread | process
+app.config['INFERENCE_WORKERS'] = int(os.environ.get('INFERENCE_WORKERS', 2))  # process backend only
+app.config['INFERENCE_THREADS_PER_WORKER'] = int(os.environ.get('INFERENCE_THREADS_PER_WORKER', 0))  # 0: cores / workers
+app.config['INFERENCE_PIN_CPUS'] = os.environ.get('INFERENCE_PIN_CPUS', '0') == '1'  # give each worker its own cores
+app.config['ANALYSIS_CACHE_SIZE'] = int(os.environ.get('ANALYSIS_CACHE_SIZE', 10000))
+app.config['ANALYSIS_CACHE_TTL'] = float(os.environ.get('ANALYSIS_CACHE_TTL', 86400))
+app.config['ANALYSIS_CACHE_PATH'] = os.environ.get('ANALYSIS_CACHE_PATH')  # e.g. 'uploads/analysis_cache.sqlite3'
+app.config['DASHBOARD_CACHE_SIZE'] = int(os.environ.get('DASHBOARD_CACHE_SIZE', 5000))
+app.config['DASHBOARD_CACHE_TTL'] = float(os.environ.get('DASHBOARD_CACHE_TTL', 60))  # max staleness in seconds, 0 disables expiry
+app.config['DASHBOARD_CACHE_PATH'] = os.environ.get('DASHBOARD_CACHE_PATH')  # shared by workers on one host, e.g. 'uploads/dashboard_cache.sqlite3'
+app.config['MODEL_LOADING'] = os.environ.get('MODEL_LOADING', 'background')  # background | lazy | eager | off
+app.config['MODEL_WARMUP_POLICY'] = os.environ.get('MODEL_WARMUP_POLICY', 'fallback')  # fallback | wait
+app.config['MODEL_WARMUP_WAIT'] = float(os.environ.get('MODEL_WARMUP_WAIT', 30))
+app.config['MODEL_QUANTIZATION'] = os.environ.get('MODEL_QUANTIZATION', 'none')  # none | dynamic-int8 (CPU)
+app.config['ANALYSIS_ENGINE'] = os.environ.get('ANALYSIS_ENGINE', 'pipelines')  # pipelines | shared-tokenizer | multihead
+app.config['MULTIHEAD_MODEL_PATH'] = os.environ.get('MULTIHEAD_MODEL_PATH')  # built by multihead.py distill
+app.config['DB_POOL_MIN_SIZE'] = int(os.environ.get('DB_POOL_MIN_SIZE', 2))
+app.config['DB_POOL_MAX_SIZE'] = int(os.environ.get('DB_POOL_MAX_SIZE', 20))
+app.config['DB_POOL_TIMEOUT'] = float(os.environ.get('DB_POOL_TIMEOUT', 5))
+app.config['DB_POOL_HEALTH_CHECK_INTERVAL'] = float(os.environ.get('DB_POOL_HEALTH_CHECK_INTERVAL', 30))
+app.config['BULK_INGEST_MAX_ITEMS'] = int(os.environ.get('BULK_INGEST_MAX_ITEMS', 1000))
+app.config['METRICS_FLUSH_INTERVAL'] = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1.0))  # seconds growth points are coalesced, 0 writes through
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+app.config['JOB_STATE_DIR'] = os.environ.get('JOB_STATE_DIR', 'uploads/jobs')
+app.config['JOB_RETENTION'] = float(os.environ.get('JOB_RETENTION', 86400))
+app.config['JOB_PRUNE_INTERVAL'] = float(os.environ.get('JOB_PRUNE_INTERVAL', 3600))  # seconds between retention sweeps
+app.config['SSE_KEEPALIVE_SECONDS'] = float(os.environ.get('SSE_KEEPALIVE_SECONDS', 15))
+app.config['SSE_BACKFILL_LIMIT'] = int(os.environ.get('SSE_BACKFILL_LIMIT', 500))
+app.config['LIVE_AUDIO_WINDOW_SECONDS'] = float(os.environ.get('LIVE_AUDIO_WINDOW_SECONDS', 2.0))
+app.config['LIVE_AUDIO_HOP_SECONDS'] = float(os.environ.get('LIVE_AUDIO_HOP_SECONDS', 0.5))  # one estimate per hop
+app.config['LIVE_AUDIO_BUFFER_SECONDS'] = float(os.environ.get('LIVE_AUDIO_BUFFER_SECONDS', 10.0))  # ring buffer per call
+app.config['LIVE_AUDIO_READ_BYTES'] = int(os.environ.get('LIVE_AUDIO_READ_BYTES', 4096))  # ~0.13 s of 16 kHz s16le
+app.config['LIVE_AUDIO_MAX_CALLS'] = int(os.environ.get('LIVE_AUDIO_MAX_CALLS', 32))  # per process
+app.config['LIVE_AUDIO_FLUSH_SECONDS'] = float(os.environ.get('LIVE_AUDIO_FLUSH_SECONDS', 5.0))  # emotion_history batch interval
+app.config['CHAT_SESSIONS_PAGE_SIZE'] = int(os.environ.get('CHAT_SESSIONS_PAGE_SIZE', 50))
+app.config['CHAT_SESSIONS_MAX_PAGE_SIZE'] = int(os.environ.get('CHAT_SESSIONS_MAX_PAGE_SIZE', 200))
+app.config['QUERY_COUNT_HEADER'] = os.environ.get('QUERY_COUNT_HEADER', '0') == '1'  # adds X-DB-Queries (benchmarks)
+app.config['INSTRUMENTATION_ENABLED'] = os.environ.get('INSTRUMENTATION_ENABLED', '1') == '1'  # phase timings + /api/metrics
+app.config['SERVER_TIMING'] = os.environ.get('SERVER_TIMING', '0') == '1'  # adds Server-Timing headers
+app.config['LEXICON_PATH'] = os.environ.get('LEXICON_PATH', '')  # extra lexicon files (os.pathsep separated), loaded after the bundled ones
 
-# Create upload directories
+# Request phase timings (db, inference, serialize) for /api/metrics and Server-Timing
+instrumentation = Instrumentation(
+    enabled=app.config['INSTRUMENTATION_ENABLED'],
+    server_timing=app.config['SERVER_TIMING']
+)
+if instrumentation.enabled:
+    app.json = instrumentation.json_provider(app)
+
+# Upload directories, created by prepare_upload_dirs() when serving starts
 upload_dirs = ['uploads', 'uploads/calls', 'uploads/voice', 'uploads/social', 'uploads/feedback']
-for directory in upload_dirs:
-    os.makedirs(directory, exist_ok=True)
+
+# Voice and call audio, stored once per distinct content
+voice_blobs = blob_store.BlobStore(os.path.join(app.config['UPLOAD_FOLDER'], 'blobs'))
+
+def prepare_upload_dirs():
+    """Create the upload directories and drop parts left by interrupted uploads"""
+    for directory in upload_dirs + [voice_blobs.root]:
+        os.makedirs(directory, exist_ok=True)
+        remove_stale_parts(directory)
 
 # Initialize ML models
-print("Loading ML models...")
-try:
-    from transformers import pipeline
-    sentiment_analyzer = pipeline("sentiment-analysis", model="cardiffnlp/twitter-roberta-base-sentiment-latest")
-    emotion_analyzer = pipeline("text-classification", model="j-hartmann/emotion-english-distilroberta-base")
-    print("ML models loaded successfully!")
-except Exception as e:
-    print(f"Error loading ML models: {e}")
-    print("Using fallback sentiment analysis...")
-    sentiment_analyzer = None
-    emotion_analyzer = None
+if app.config['MODEL_QUANTIZATION'] not in models.QUANTIZATION_MODES:
+    raise ValueError(f"MODEL_QUANTIZATION must be one of {models.QUANTIZATION_MODES}")
+if app.config['ANALYSIS_ENGINE'] not in models.ANALYSIS_ENGINES:
+    raise ValueError(f"ANALYSIS_ENGINE must be one of {models.ANALYSIS_ENGINES}")
+SENTIMENT_MODEL = models.SENTIMENT_MODEL
+EMOTION_MODEL = models.EMOTION_MODEL
+# Quantized and multihead results are cached separately from the reference models'
+MODEL_IDENTITY = models.model_identity(
+    app.config['MODEL_QUANTIZATION'], app.config['ANALYSIS_ENGINE'], app.config['MULTIHEAD_MODEL_PATH'])
+
+def build_text_analyzer():
+    return models.build_text_analyzer(
+        app.config['ANALYSIS_ENGINE'], app.config['MODEL_QUANTIZATION'], app.config['MULTIHEAD_MODEL_PATH'])
+
+# With the process backend, batches run in worker processes forked from this
+# one after the models are loaded, so all workers share one copy of the weights.
+# Forking is only safe before other threads start, so the models have to be
+# loaded eagerly by start_background_services() (with gunicorn, call it from
+# the post_fork hook) rather than in the background.
+if app.config['INFERENCE_BACKEND'] not in ('thread', 'process'):
+    raise ValueError("INFERENCE_BACKEND must be 'thread' or 'process'")
+if app.config['INFERENCE_BACKEND'] == 'process' and app.config['MODEL_LOADING'] not in ('eager', 'off'):
+    raise ValueError("INFERENCE_BACKEND=process requires MODEL_LOADING=eager")
+inference_pool = None
+if app.config['INFERENCE_BACKEND'] == 'process':
+    inference_pool = InferenceProcessPool(
+        workers=app.config['INFERENCE_WORKERS'],
+        threads_per_worker=app.config['INFERENCE_THREADS_PER_WORKER'],
+        pin_cpus=app.config['INFERENCE_PIN_CPUS'],
+        timeout=app.config['INFERENCE_TIMEOUT']
+    )
+
+def start_inference_workers(loaded):
+    """Fork the inference workers around the freshly loaded analyzer"""
+    if inference_pool is None:
+        return
+    if inference_pool.is_running:
+        inference_pool.stop()
+    inference_pool.start(loaded['analyzer'])
+
+# Models are built off the request path so the server can bind immediately
+model_loader = ModelLoader({
+    'analyzer': build_text_analyzer
+}, on_ready=start_inference_workers)
+
+if app.config['MODEL_LOADING'] == 'off':
+    print("ML models disabled, using fallback sentiment analysis...")
+    model_loader.disable()
+
+def load_models():
+    """Start loading the pipelines as MODEL_LOADING asks ('lazy' waits for first use)"""
+    if app.config['MODEL_LOADING'] == 'eager':
+        print("Loading ML models...")
+        model_loader.load_now()
+    elif app.config['MODEL_LOADING'] == 'background':
+        print("Loading ML models in the background...")
+        model_loader.start()
 
 # Database connection
-def get_db_connection():
+DB_CURSOR_FACTORY = instrumentation.cursor_factory()
+
+def open_db_connection():
+    """Open a new raw connection (used by the pool)"""
+    if os.environ.get('DATABASE_URL'):
+        return psycopg2.connect(os.environ['DATABASE_URL'], cursor_factory=DB_CURSOR_FACTORY)
+    return psycopg2.connect(
+        host='localhost',
+        database='mental_health_db',
+        user='postgres',
+        password='password',  # UPDATE THIS WITH YOUR PASSWORD
+        cursor_factory=DB_CURSOR_FACTORY
+    )
+
+db_pool = ConnectionPool(
+    open_db_connection,
+    min_size=app.config['DB_POOL_MIN_SIZE'],
+    max_size=app.config['DB_POOL_MAX_SIZE'],
+    checkout_timeout=app.config['DB_POOL_TIMEOUT'],
+    health_check_interval=app.config['DB_POOL_HEALTH_CHECK_INTERVAL']
+)
+
+@contextmanager
+def db_connection():
+    """Borrow a pooled connection for a request.
+
+    Yields None if no connection could be obtained; otherwise the pool's
+    ``lease`` returns it (or closes it, if broken) when the block exits.
+    """
     try:
-        conn = psycopg2.connect(
-            host='localhost',
-            database='mental_health_db',
-            user='postgres',
-            password='password',  # UPDATE THIS WITH YOUR PASSWORD
-            cursor_factory=RealDictCursor
-        )
-        return conn
+        with instrumentation.span('db_connect'):
+            conn = db_pool.getconn()
     except Exception as e:
         print(f"Database connection error: {e}")
-        return None
+        yield None
+        return
+    with db_pool.lease(conn):
+        yield conn
 
 # ========== HELPER FUNCTIONS ==========
 
+# Handle different label formats
+SENTIMENT_MAPPING = {
+    'LABEL_2': 0.8, 'POSITIVE': 0.8, 'POS': 0.8,
+    'LABEL_0': 0.2, 'NEGATIVE': 0.2, 'NEG': 0.2,
+    'LABEL_1': 0.5, 'NEUTRAL': 0.5, 'NEU': 0.5
+}
+
+def format_model_result(sentiment_result, emotion_result):
+    """Build the analysis dict returned to the API from raw pipeline outputs"""
+    return {
+        'sentiment_score': SENTIMENT_MAPPING.get(sentiment_result['label'].upper(), 0.5),
+        'emotion': emotion_result['label'],
+        'confidence': emotion_result['score'],
+        'raw_sentiment': sentiment_result['label'],
+        'emotion_scores': {label.lower(): round(float(score), 4)
+                           for label, score in emotion_result.get('scores', {}).items()} or None
+    }
+
+def run_model_batch(texts):
+    """Run the analyzer over one padded micro-batch of texts"""
+    if inference_pool is not None:
+        outputs = inference_pool.run(texts)
+    else:
+        outputs = model_loader.get('analyzer')(texts)
+    return [format_model_result(sentiment, emotion) for sentiment, emotion in outputs]
+
+# Shared scheduler so concurrent requests are analyzed together; with worker
+# processes it keeps one batch in flight per worker
+inference_scheduler = BatchInferenceScheduler(
+    run_model_batch,
+    max_batch_size=app.config['INFERENCE_MAX_BATCH_SIZE'],
+    max_wait_ms=app.config['INFERENCE_MAX_WAIT_MS'],
+    concurrency=inference_pool.workers if inference_pool is not None else 1
+)
+
+# Results keyed on the normalized text and the models that produced them
+analysis_cache = TTLCache(
+    max_entries=app.config['ANALYSIS_CACHE_SIZE'],
+    ttl=app.config['ANALYSIS_CACHE_TTL'],
+    disk_path=app.config['ANALYSIS_CACHE_PATH']
+)
+
+# Serialized dashboard responses per user, dropped by every write that changes them.
+# Other workers sharing DASHBOARD_CACHE_PATH may keep serving their in-memory
+# copy for up to DASHBOARD_CACHE_TTL seconds after an invalidation.
+dashboard_cache = TTLCache(
+    max_entries=app.config['DASHBOARD_CACHE_SIZE'],
+    ttl=app.config['DASHBOARD_CACHE_TTL'],
+    disk_path=app.config['DASHBOARD_CACHE_PATH']
+)
+
+def dashboard_cache_key(user_id):
+    return f'dashboard:{int(user_id)}'
+
+def invalidate_dashboard(user_id):
+    """Forget a user's cached dashboard; call after committing a write for them"""
+    if user_id is not None:
+        dashboard_cache.invalidate(dashboard_cache_key(user_id))
+
+def invalidate_dashboards(user_ids):
+    for user_id in user_ids:
+        invalidate_dashboard(user_id)
+
+# Growth points and mood scores, written to health_metrics in coalesced batches
+metrics_accumulator = MetricsAccumulator(
+    db_connection,
+    interval=app.config['METRICS_FLUSH_INTERVAL'],
+    on_flush=invalidate_dashboards
+)
+atexit.register(metrics_accumulator.stop)
+
+def models_available():
+    """True once the pipelines are loaded; optionally waits while they warm up"""
+    if model_loader.is_ready:
+        return True
+    model_loader.ensure_loading()
+    if model_loader.state == ModelLoader.WARMING and app.config['MODEL_WARMUP_POLICY'] == 'wait':
+        return model_loader.wait_ready(app.config['MODEL_WARMUP_WAIT'])
+    return False
+
+@instrumentation.timed('inference')
 def analyze_text_sentiment(text):
     """Analyze sentiment and emotion from text with fallback"""
     try:
-        if sentiment_analyzer and emotion_analyzer:
-            sentiment_result = sentiment_analyzer(text)[0]
-            emotion_result = emotion_analyzer(text)[0]
-            
-            # Handle different label formats
-            sentiment_mapping = {
-                'LABEL_2': 0.8, 'POSITIVE': 0.8, 'POS': 0.8,
-                'LABEL_0': 0.2, 'NEGATIVE': 0.2, 'NEG': 0.2,
-                'LABEL_1': 0.5, 'NEUTRAL': 0.5, 'NEU': 0.5
-            }
-            
-            sentiment_score = sentiment_mapping.get(sentiment_result['label'], 0.5)
-            
-            return {
-                'sentiment_score': sentiment_score,
-                'emotion': emotion_result['label'],
-                'confidence': emotion_result['score'],
-                'raw_sentiment': sentiment_result['label']
-            }
+        if models_available():
+            cache_key = content_key(text, MODEL_IDENTITY)
+            cached = analysis_cache.get(cache_key)
+            if cached is not None:
+                return dict(cached)
+
+            result = inference_scheduler.analyze(text, timeout=app.config['INFERENCE_TIMEOUT'])
+            analysis_cache.set(cache_key, result)
+            return dict(result)
         else:
             # Fallback simple sentiment analysis
             return analyze_text_simple(text)
@@ -82,107 +312,107 @@ def analyze_text_sentiment(text):
         logging.error(f"Error analyzing text: {e}")
         return analyze_text_simple(text)
 
-def analyze_text_simple(text):
-    """Simple fallback sentiment analysis"""
-    positive_words = ['happy', 'good', 'great', 'awesome', 'excellent', 'love', 'amazing', 
-                     'wonderful', 'fantastic', 'excited', 'joy', 'grateful', 'blessed']
-    negative_words = ['sad', 'bad', 'terrible', 'awful', 'hate', 'stressed', 'anxious',
-                     'depressed', 'worried', 'angry', 'frustrated', 'overwhelmed', 'lonely']
-    
-    text_lower = text.lower()
-    positive_count = sum(1 for word in positive_words if word in text_lower)
-    negative_count = sum(1 for word in negative_words if word in text_lower)
-    
-    if positive_count > negative_count:
-        return {
-            'sentiment_score': 0.7 + (positive_count * 0.1),
-            'emotion': 'joy',
-            'confidence': 0.8,
-            'raw_sentiment': 'POSITIVE'
-        }
-    elif negative_count > positive_count:
-        return {
-            'sentiment_score': 0.3 - (negative_count * 0.05),
-            'emotion': 'sadness',
-            'confidence': 0.8,
-            'raw_sentiment': 'NEGATIVE'
-        }
-    else:
-        return {
-            'sentiment_score': 0.5,
-            'emotion': 'neutral',
-            'confidence': 0.6,
-            'raw_sentiment': 'NEUTRAL'
-        }
-
-def analyze_voice_features(file_path):
-    """Simple voice analysis (mock implementation)"""
+@instrumentation.timed('inference')
+def analyze_text_batch(texts):
+    """Analyze many texts at once, returning results in input order"""
+    results = [None] * len(texts)
     try:
-        # In real implementation, use librosa and speech-to-text
-        # For now, return mock analysis
-        moods = ['energetic', 'calm', 'balanced', 'tired', 'excited']
-        mood = random.choice(moods)
-        
-        mood_scores = {
-            'energetic': 0.8,
-            'excited': 0.9,
-            'calm': 0.6,
-            'balanced': 0.7,
-            'tired': 0.3
-        }
-        
-        return {
-            'mood': mood,
-            'mood_score': mood_scores[mood],
-            'features': {
-                'duration': 10.0,
-                'energy_level': mood_scores[mood]
-            }
-        }
+        if models_available():
+            pending = {}
+            for i, text in enumerate(texts):
+                cache_key = content_key(text, MODEL_IDENTITY)
+                cached = analysis_cache.get(cache_key)
+                if cached is not None:
+                    results[i] = dict(cached)
+                else:
+                    pending.setdefault(cache_key, (text, []))[1].append(i)
+
+            # Submit every miss up front so the scheduler can fill whole batches
+            keys = list(pending.keys())
+            futures = inference_scheduler.submit_many([pending[key][0] for key in keys])
+            for key, future in zip(keys, futures):
+                result = future.result(timeout=app.config['INFERENCE_TIMEOUT'])
+                analysis_cache.set(key, result)
+                for i in pending[key][1]:
+                    results[i] = dict(result)
+            return results
     except Exception as e:
-        logging.error(f"Error analyzing voice: {e}")
-        return {
-            'mood': 'unknown', 
-            'mood_score': 0.5, 
-            'features': {'duration': 0}
-        }
+        logging.error(f"Error analyzing text batch: {e}")
+
+    return [result if result is not None else analyze_text_simple(text)
+            for text, result in zip(texts, results)]
+
+# Fallback analyzer: bundled VADER and wellbeing lexicons plus any configured extra files
+text_lexicon = Lexicon.load(
+    DEFAULT_LEXICON_PATHS + [path for path in app.config['LEXICON_PATH'].split(os.pathsep) if path]
+)
+
+def determine_risk_level(sentiment_score):
+    """Map a sentiment score to the stored risk level"""
+    if sentiment_score < 0.3:
+        return 'high'
+    elif sentiment_score < 0.6:
+        return 'medium'
+    return 'low'
+
+def weighted_feedback_sentiment(relationship, sentiment_score):
+    """Family feedback gets higher weight"""
+    weight_multiplier = 1.5 if relationship == 'family' else 1.0
+    return min(sentiment_score * weight_multiplier, 1.0)
+
+def analyze_text_simple(text):
+    """Rule-based fallback sentiment analysis (see lexicon.py)"""
+    return text_lexicon.analyze(text)
+
+def analyze_voice_features(file_path, duration=None):
+    """Voice analysis from streamed acoustic features (RMS, pitch, speaking rate, MFCCs).
+
+    Raises when the audio can't be decoded, so the job fails instead of
+    storing a made-up mood and awarding points for it.
+    """
+    return extract_voice_features(file_path, duration=duration)
+
+def analyze_voice_upload(payload):
+    """Voice analysis for a job payload, reused when the same audio was analyzed before.
+
+    Returns (analysis, fresh); a fresh result should be memoized with
+    ``blob_store.store_analysis`` when the job saves its rows.
+    """
+    if payload.get('sha256'):
+        with db_connection() as conn:
+            if conn:
+                cur = conn.cursor()
+                analysis = blob_store.cached_analysis(cur, payload['sha256'], FEATURES_VERSION)
+                cur.close()
+                if analysis:
+                    return analysis, False
+    # WAV durations were measured while the upload streamed in
+    return analyze_voice_features(payload['file_path'], payload.get('duration')), True
+
+def memoize_voice_analysis(cur, payload, analysis, fresh):
+    if fresh and payload.get('sha256'):
+        blob_store.store_analysis(cur, payload['sha256'], analysis, FEATURES_VERSION)
 
 def generate_emotion_breakdown(analysis):
-    """Generate detailed emotion breakdown for charts"""
-    base_emotions = [
-        {'emotion': 'Joy', 'color': 'bg-green-500'},
-        {'emotion': 'Sadness', 'color': 'bg-blue-500'},
-        {'emotion': 'Anger', 'color': 'bg-red-500'},
-        {'emotion': 'Fear', 'color': 'bg-purple-500'},
-        {'emotion': 'Surprise', 'color': 'bg-yellow-500'},
-        {'emotion': 'Disgust', 'color': 'bg-green-600'},
-        {'emotion': 'Neutral', 'color': 'bg-gray-500'},
-        {'emotion': 'Contempt', 'color': 'bg-indigo-500'},
-        {'emotion': 'Gratitude', 'color': 'bg-pink-500'},
-        {'emotion': 'Pride', 'color': 'bg-orange-500'}
-    ]
-    
-    breakdown = []
-    primary_emotion = analysis['emotion'].title()
-    primary_score = int(analysis['sentiment_score'] * 100)
-    
-    # Ensure primary emotion gets highest score
-    for emotion_info in base_emotions:
-        if emotion_info['emotion'] == primary_emotion:
-            percentage = max(primary_score, 20)  # At least 20%
-        else:
-            # Random percentage for other emotions, scaled down
-            percentage = random.randint(1, max(1, 100 - primary_score) // len(base_emotions))
-        
-        breakdown.append({
-            'emotion': emotion_info['emotion'],
-            'percentage': percentage,
-            'color': emotion_info['color']
-        })
-    
-    # Sort by percentage descending
-    breakdown.sort(key=lambda x: x['percentage'], reverse=True)
-    return breakdown
+    """Emotion breakdown for charts from the analysis' class probabilities"""
+    scores = analysis.get('emotion_scores')
+    if not scores:
+        # Fallback analyses only know the top emotion
+        scores = {analysis['emotion']: 1.0}
+    return emotion_vectors.breakdowns(emotion_vectors.from_scores(scores)[None, :])[0]
+
+def attach_emotion_breakdowns(rows):
+    """Replace each row's packed ``emotion_scores`` with its chart breakdown.
+
+    Returns the average breakdown over the rows that have scores (None if
+    none do). All rows are decoded and normalized as one NumPy matrix.
+    """
+    blobs = [row.pop('emotion_scores', None) for row in rows]
+    matrix = emotion_vectors.unpack_many(blobs)
+    per_row = iter(emotion_vectors.breakdowns(matrix))
+    for row, blob in zip(rows, blobs):
+        row['emotion_breakdown'] = next(per_row) if blob is not None else None
+    return emotion_vectors.mean_breakdown(matrix)
 
 def generate_mock_data(user_id):
     """Generate realistic mock data for testing"""
@@ -212,6 +442,78 @@ def generate_mock_data(user_id):
         'family_feedback': family_feedback
     }
 
+def ingest_texts(cur, user_id, items, points_per_item=10, check_in=False):
+    """Bulk-ingest text items for one user inside the caller's transaction.
+
+    Each item is a dict with ``text`` and ``data_type`` and optionally a
+    ``sentiment`` override and an original ``created_at``. All texts are
+    analyzed as one batch, ``user_data`` and ``analysis_results`` are written
+    with multi-row inserts. A check-in also updates the energy and check-in
+    counters in ``health_metrics`` in one statement; the caller queues
+    ``points_earned`` and ``avg_sentiment`` (the new mood score) on
+    ``metrics_accumulator`` once the transaction has committed.
+    """
+    if not items:
+        return {'data_ids': [], 'analyses': [], 'avg_sentiment': 0.5, 'points_earned': 0}
+
+    analyses = analyze_text_batch([item['text'] for item in items])
+
+    data_rows = execute_values(
+        cur,
+        """INSERT INTO user_data (user_id, data_type, content, created_at)
+           VALUES %s RETURNING id""",
+        [(user_id, item['data_type'], item['text'], item.get('created_at')) for item in items],
+        template="(%s, %s, %s, COALESCE(%s::timestamp, NOW()))",
+        page_size=len(items),
+        fetch=True
+    )
+    data_ids = [row['id'] for row in data_rows]
+
+    result_rows = []
+    rollup_events = []
+    total_sentiment = 0
+    for item, analysis, data_id in zip(items, analyses, data_ids):
+        sentiment_score = item.get('sentiment', analysis['sentiment_score'])
+        risk_level = determine_risk_level(sentiment_score)
+        analysis['risk_level'] = risk_level
+        total_sentiment += sentiment_score
+        result_rows.append((user_id, data_id, sentiment_score, analysis['emotion'], risk_level,
+                            analysis['confidence'], emotion_vectors.pack(analysis.get('emotion_scores')),
+                            item.get('created_at')))
+        rollup_events.append({'data_type': item['data_type'], 'sentiment': sentiment_score,
+                              'risk_level': risk_level, 'day': item.get('created_at')})
+
+    execute_values(
+        cur,
+        """INSERT INTO analysis_results
+           (user_id, data_id, sentiment_score, emotion_detected, risk_level, confidence_score,
+            emotion_scores, created_at)
+           VALUES %s""",
+        result_rows,
+        template="(%s, %s, %s, %s, %s, %s, %s, COALESCE(%s::timestamp, NOW()))",
+        page_size=len(result_rows)
+    )
+
+    rollups.record_many(cur, user_id, rollup_events)
+
+    avg_sentiment = total_sentiment / len(items)
+    points_earned = points_per_item * len(items)
+    if check_in:
+        energy_level = max(1, min(5, int(avg_sentiment * 5)))
+        cur.execute(
+            """UPDATE health_metrics 
+               SET energy_level = %s, check_ins = check_ins + 1, energy_streak = energy_streak + 1
+               WHERE user_id = %s""",
+            (energy_level, user_id)
+        )
+
+    return {
+        'data_ids': data_ids,
+        'analyses': analyses,
+        'avg_sentiment': avg_sentiment,
+        'points_earned': points_earned
+    }
+
 def generate_soap_note(session_id, cursor):
     """Generate SOAP note for therapy session"""
     try:
@@ -227,19 +529,10 @@ def generate_soap_note(session_id, cursor):
         if not session:
             return "Session not found"
         
-        # Get messages and emotions
-        cursor.execute("""
-            SELECT cm.content, cm.sender_type, ea.emotion_detected
-            FROM chat_messages cm
-            LEFT JOIN emotion_analysis ea ON cm.id = ea.message_id
-            WHERE cm.session_id = %s
-            ORDER BY cm.timestamp
-        """, (session_id,))
-        messages = cursor.fetchall()
-        
-        # Extract key themes
-        patient_messages = [msg for msg in messages if msg['sender_type'] == 'patient']
-        emotions_detected = [msg['emotion_detected'] for msg in patient_messages if msg['emotion_detected']]
+        # Emotions come from the running session summary instead of a message rescan
+        summary = session_summary.get_summary(cursor, session_id)
+        emotion_counts = summary['emotion_counts'] if summary else {}
+        emotions_detected = sorted(emotion_counts, key=emotion_counts.get, reverse=True)
         
         soap_note = f"""
 SOAP NOTE - {datetime.now().strftime('%B %d, %Y')}
@@ -252,7 +545,7 @@ Key themes discussed include emotional awareness, coping strategies, and current
 Patient demonstrated good engagement and willingness to share personal experiences.
 
 OBJECTIVE:
-Emotional range observed: {', '.join(set(emotions_detected)) if emotions_detected else 'Neutral to positive range'}
+Emotional range observed: {', '.join(emotions_detected) if emotions_detected else 'Neutral to positive range'}
 Patient maintained good eye contact and active participation throughout session.
 Speech patterns and affect consistent with reported emotional state.
 
@@ -275,43 +568,293 @@ Generated by AI MedScribe on {datetime.now().strftime('%m/%d/%Y at %I:%M %p')}
     except Exception as e:
         return f"Error generating SOAP note: {str(e)}"
 
+# ========== BACKGROUND JOBS ==========
+
+def committed_job_row(cur, payload):
+    """The user_data row a previous run of this job committed, or None.
+
+    Jobs interrupted by a restart run again from the start; finding the row
+    keeps them from storing the upload (and awarding points) twice.
+    """
+    if not payload.get('job_id'):
+        return None
+    cur.execute(queries.JOB_ROW_SQL, {'job_id': payload['job_id']})
+    return cur.fetchone()
+
+def process_voice_message_job(payload, report_progress):
+    """Analyze an uploaded voice message and store the results"""
+    user_id = payload['user_id']
+    filepath = payload['file_path']
+    
+    report_progress(0.1, 'analyzing')
+    voice_analysis, fresh = analyze_voice_upload(payload)
+    
+    report_progress(0.8, 'saving')
+    with db_connection() as conn:
+        if not conn:
+            raise RuntimeError('Database connection failed')
+        cur = conn.cursor()
+        existing = committed_job_row(cur, payload)
+        if existing:
+            cur.close()
+            return {
+                'status': 'processed',
+                'data_id': existing['id'],
+                'analysis': voice_analysis,
+                'points_earned': 15
+            }
+        memoize_voice_analysis(cur, payload, voice_analysis, fresh)
+        
+        # Store voice data
+        cur.execute(
+            "INSERT INTO user_data (user_id, data_type, file_path, job_id) VALUES (%s, %s, %s, %s) RETURNING id",
+            (user_id, 'voice_message', filepath, payload.get('job_id'))
+        )
+        data_id = cur.fetchone()['id']
+        
+        # Store analysis
+        cur.execute(
+            """INSERT INTO analysis_results 
+               (user_id, data_id, sentiment_score, emotion_detected, confidence_score) 
+               VALUES (%s, %s, %s, %s, %s)""",
+            (user_id, data_id, voice_analysis['mood_score'], 
+             voice_analysis['mood'], 0.7)
+        )
+        rollups.record(cur, user_id, 'voice_message', sentiment=voice_analysis['mood_score'])
+        
+        conn.commit()
+        cur.close()
+    points_earned = 15
+    metrics_accumulator.add(user_id, points_earned)
+    invalidate_dashboard(user_id)
+    
+    return {
+        'status': 'processed',
+        'data_id': data_id,
+        'analysis': voice_analysis,
+        'points_earned': points_earned
+    }
+
+def process_voice_call_job(payload, report_progress):
+    """Analyze an uploaded call recording and store the results"""
+    session_id = payload['session_id']
+    filepath = payload['file_path']
+    
+    report_progress(0.1, 'analyzing')
+    voice_analysis, fresh = analyze_voice_upload(payload)
+    
+    report_progress(0.8, 'saving')
+    with db_connection() as conn:
+        if not conn:
+            raise RuntimeError('Database connection failed')
+        cur = conn.cursor()
+        if committed_job_row(cur, payload):
+            cur.close()
+            return {
+                'analysis': voice_analysis,
+                'status': 'analyzed'
+            }
+        memoize_voice_analysis(cur, payload, voice_analysis, fresh)
+        
+        # Store voice analysis
+        cur.execute("""
+            INSERT INTO user_data (user_id, data_type, file_path, content, job_id)
+            VALUES ((SELECT patient_id FROM chat_sessions WHERE id = %s), 'voice_call', %s, %s, %s)
+            RETURNING id, user_id
+        """, (session_id, filepath, f"Voice call analysis: {voice_analysis['mood']}", payload.get('job_id')))
+        
+        data_row = cur.fetchone()
+        data_id = data_row['id']
+        
+        # Store analysis results
+        cur.execute("""
+            INSERT INTO analysis_results 
+            (user_id, data_id, sentiment_score, emotion_detected, confidence_score)
+            VALUES ((SELECT patient_id FROM chat_sessions WHERE id = %s), %s, %s, %s, %s)
+        """, (session_id, data_id, voice_analysis['mood_score'], voice_analysis['mood'], 0.8))
+        rollups.record(cur, data_row['user_id'], 'voice_call', sentiment=voice_analysis['mood_score'])
+        
+        conn.commit()
+        cur.close()
+    invalidate_dashboard(data_row['user_id'])
+    
+    return {
+        'analysis': voice_analysis,
+        'status': 'analyzed'
+    }
+
+# Voice/call uploads are analyzed off the request thread
+job_queue = JobQueue(
+    app.config['JOB_STATE_DIR'],
+    workers=app.config['JOB_WORKERS'],
+    retention=app.config['JOB_RETENTION'],
+    prune_interval=app.config['JOB_PRUNE_INTERVAL']
+)
+job_queue.register('voice_message', process_voice_message_job)
+job_queue.register('voice_call', process_voice_call_job)
+
+# Live chat updates for Server-Sent Events subscribers; message events
+# arrive from Postgres NOTIFY so every worker process sees them
+session_events = SessionEventBroker()
+session_event_listener = NotifyListener(open_db_connection, session_events, lambda *args: load_session_event(*args))
+
+# Live call audio being analyzed in this process
+live_calls = live_audio.LiveCalls(app.config['LIVE_AUDIO_MAX_CALLS'])
+
+_services_lock = threading.Lock()
+_services_started = False
+
+def start_background_services():
+    """Start the work a serving process owns; importing the module does none of it.
+
+    Runs once per process: from ``__main__`` for the dev server, otherwise on
+    the first request, so WSGI workers start it and CLI tools that import
+    this module never do.
+    """
+    global _services_started
+    with _services_lock:
+        if _services_started:
+            return
+        _services_started = True
+    prepare_upload_dirs()
+    load_models()
+    session_event_listener.start()
+    resumed = job_queue.resume()
+    if resumed:
+        logging.info(f"Resumed {resumed} unfinished background jobs")
+
 # ========== MAIN API ROUTES ==========
 
+@app.before_request
+def ensure_background_services():
+    if not _services_started:
+        start_background_services()
+
+@app.before_request
+def start_request_metrics():
+    reset_query_count()
+    instrumentation.begin_request()
+
+@app.after_request
+def finish_request_metrics(response):
+    # Covers work done before the response was returned (not inside streamed bodies)
+    queries = query_count()
+    if app.config['QUERY_COUNT_HEADER']:
+        response.headers['X-DB-Queries'] = str(queries)
+    if instrumentation.enabled:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        phases = instrumentation.end_request(endpoint, request.method, response.status_code, queries)
+        if instrumentation.server_timing and phases:
+            response.headers['Server-Timing'] = instrumentation.server_timing_value(phases, queries)
+    return response
+
+def collect_gauges():
+    """Point-in-time values from the pool, caches, scheduler, jobs and models"""
+    pool = db_pool.stats()
+    inference = inference_scheduler.stats()
+    gauges = [
+        ('app_db_pool_connections', 'Open pooled connections by state', {'state': 'in_use'}, pool['in_use']),
+        ('app_db_pool_connections', 'Open pooled connections by state', {'state': 'idle'}, pool['idle']),
+        ('app_db_pool_waits_total', 'Checkouts that had to wait for a connection', {}, pool['waits']),
+        ('app_db_pool_timeouts_total', 'Checkouts that timed out', {}, pool['timeouts']),
+        ('app_inference_queue_depth', 'Texts waiting for the batch scheduler', {}, inference['queued']),
+        ('app_inference_batches_total', 'Model batches run', {}, inference['batches']),
+        ('app_inference_avg_batch_size', 'Average texts per model batch', {}, inference['avg_batch_size']),
+        ('app_models_ready', '1 when the ML pipelines are loaded', {}, int(model_loader.is_ready)),
+        ('app_live_event_subscribers', 'Open Server-Sent Events streams', {}, session_events.stats()['subscribers']),
+        ('app_live_audio_calls', 'Live call audio streams being analyzed', {}, live_calls.stats()['calls']),
+        ('app_health_metrics_pending_users', 'Users with growth points not yet written', {}, metrics_accumulator.stats()['pending_users'])
+    ]
+    if inference_pool is not None:
+        workers = inference_pool.stats()
+        gauges += [
+            ('app_inference_workers', 'Inference worker processes by state', {'state': 'alive'}, workers['alive']),
+            ('app_inference_workers', 'Inference worker processes by state', {'state': 'idle'}, workers['idle']),
+            ('app_inference_worker_restarts_total', 'Inference workers replaced after dying or hanging', {}, workers['restarts']),
+            ('app_inference_worker_busy_seconds_total', 'Time workers spent on batches', {}, workers['busy_seconds'])
+        ]
+    for name, cache in (('analysis', analysis_cache), ('dashboard', dashboard_cache)):
+        stats = cache.stats()
+        gauges += [
+            ('app_cache_hits_total', 'Cache hits (memory and disk)', {'cache': name}, stats['hits'] + stats['disk_hits']),
+            ('app_cache_misses_total', 'Cache misses', {'cache': name}, stats['misses']),
+            ('app_cache_entries', 'Entries held in memory', {'cache': name}, stats['size'])
+        ]
+    for status, count in job_queue.stats().items():
+        gauges.append(('app_jobs', 'Background jobs by status', {'status': status}, count))
+    return gauges
+
+instrumentation.add_gauges(collect_gauges)
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition of request/phase histograms and gauges"""
+    if not instrumentation.enabled:
+        return jsonify({'error': 'Instrumentation is disabled'}), 404
+    return Response(instrumentation.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """Health check endpoint
+
+    Pass ?ready=1 to get a 503 while the models are still warming up
+    (useful as a readiness probe).
+    """
+    model_status = model_loader.status()
+    if model_loader.state == ModelLoader.READY:
+        readiness = 'ready'
+    elif model_loader.state in (ModelLoader.COLD, ModelLoader.WARMING):
+        readiness = 'warming'
+    else:
+        readiness = 'fallback_mode'
+
+    status_code = 200
+    if request.args.get('ready') and readiness == 'warming':
+        status_code = 503
+
     return jsonify({
         'status': 'healthy', 
         'timestamp': datetime.now().isoformat(),
-        'ml_models': 'loaded' if sentiment_analyzer else 'fallback_mode'
-    }), 200
+        'ml_models': readiness,
+        'model_loading': model_status,
+        'model_quantization': app.config['MODEL_QUANTIZATION'],
+        'analysis_engine': app.config['ANALYSIS_ENGINE'],
+        'inference': inference_scheduler.stats(),
+        'inference_workers': inference_pool.stats() if inference_pool is not None else None,
+        'analysis_cache': analysis_cache.stats(),
+        'dashboard_cache': dashboard_cache.stats(),
+        'db_pool': db_pool.stats(),
+        'jobs': job_queue.stats(),
+        'live_events': session_events.stats(),
+        'live_audio': live_calls.stats(),
+        'health_metrics_writes': metrics_accumulator.stats()
+    }), status_code
 
 @app.route('/api/users', methods=['POST'])
 def create_user():
     """Create a new user"""
     try:
         data = request.get_json()
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
+        with db_connection() as conn:
+            if not conn:
+                return jsonify({'error': 'Database connection failed'}), 500
             
-        cur = conn.cursor()
+            cur = conn.cursor()
         
-        cur.execute(
-            "INSERT INTO users (name, email) VALUES (%s, %s) RETURNING id",
-            (data['name'], data['email'])
-        )
-        user_id = cur.fetchone()['id']
+            cur.execute(
+                "INSERT INTO users (name, email) VALUES (%s, %s) RETURNING id",
+                (data['name'], data['email'])
+            )
+            user_id = cur.fetchone()['id']
         
-        # Initialize user metrics
-        cur.execute(
-            "INSERT INTO health_metrics (user_id, energy_level, growth_points, check_ins, energy_streak) VALUES (%s, %s, %s, %s, %s)",
-            (user_id, 3, 0, 0, 0)
-        )
+            # Initialize user metrics
+            cur.execute(
+                "INSERT INTO health_metrics (user_id, energy_level, growth_points, check_ins, energy_streak) VALUES (%s, %s, %s, %s, %s)",
+                (user_id, 3, 0, 0, 0)
+            )
         
-        conn.commit()
-        cur.close()
-        conn.close()
+            conn.commit()
+            cur.close()
         
         return jsonify({'user_id': user_id, 'message': 'User created successfully'}), 201
     except Exception as e:
@@ -319,51 +862,54 @@ def create_user():
 
 @app.route('/api/users/<int:user_id>/dashboard', methods=['GET'])
 def get_dashboard_data(user_id):
-    """Get dashboard data for a user"""
+    """Get dashboard data for a user (served from the dashboard cache when fresh)"""
     try:
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
+        cache_key = dashboard_cache_key(user_id)
+        body = dashboard_cache.get(cache_key)
+        if body is not None:
+            response = Response(body, status=200, mimetype='application/json')
+            response.headers['X-Cache'] = 'HIT'
+            return response
+        
+        # Read before querying so a write committed meanwhile keeps us from caching stale data
+        generation = dashboard_cache.generation(cache_key)
+        with db_connection() as conn:
+            if not conn:
+                return jsonify({'error': 'Database connection failed'}), 500
             
-        cur = conn.cursor()
+            cur = conn.cursor()
         
-        # Get user info
-        cur.execute("SELECT * FROM users WHERE id = %s", (user_id,))
-        user = cur.fetchone()
+            # Get user info
+            cur.execute(queries.USER_SQL, {'user_id': user_id})
+            user = cur.fetchone()
         
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
+            if not user:
+                return jsonify({'error': 'User not found'}), 404
         
-        # Get latest metrics
-        cur.execute(
-            "SELECT * FROM health_metrics WHERE user_id = %s ORDER BY created_at DESC LIMIT 1",
-            (user_id,)
-        )
-        metrics = cur.fetchone()
+            # Get latest metrics
+            cur.execute(queries.LATEST_HEALTH_METRICS_SQL, {'user_id': user_id})
+            metrics = cur.fetchone()
         
-        # Get recent analysis results
-        cur.execute(
-            """SELECT ar.*, ud.data_type, ud.created_at as data_created_at 
-               FROM analysis_results ar 
-               JOIN user_data ud ON ar.data_id = ud.id 
-               WHERE ar.user_id = %s 
-               ORDER BY ar.created_at DESC LIMIT 10""",
-            (user_id,)
-        )
-        recent_analysis = cur.fetchall()
+            # Get recent analysis results
+            cur.execute(queries.RECENT_ANALYSIS_SQL, {'user_id': user_id})
+            recent_analysis = [dict(row) for row in cur.fetchall()]
         
-        # Get data count by type
-        cur.execute(
-            """SELECT data_type, COUNT(*) as count 
-               FROM user_data 
-               WHERE user_id = %s 
-               GROUP BY data_type""",
-            (user_id,)
-        )
-        data_counts = cur.fetchall()
+            # Get data count by type
+            cur.execute(queries.DATA_TYPE_COUNTS_SQL, {'user_id': user_id})
+            data_counts = cur.fetchall()
         
-        cur.close()
-        conn.close()
+            cur.close()
+        
+        emotion_breakdown = attach_emotion_breakdowns(recent_analysis)
+        
+        # Include points earned here that the accumulator has not written yet;
+        # read after the query so a flush in between can't count them twice
+        if metrics:
+            metrics = dict(metrics)
+            pending_points, pending_mood = metrics_accumulator.pending(user_id)
+            metrics['growth_points'] += pending_points
+            if pending_mood is not None:
+                metrics['mood_score'] = pending_mood
         
         # Calculate garden progress
         total_data_points = sum([row['count'] for row in data_counts]) if data_counts else 0
@@ -378,7 +924,8 @@ def get_dashboard_data(user_id):
                 'energy_streak': 0,
                 'mood_score': 0.5
             },
-            'recent_analysis': [dict(row) for row in recent_analysis],
+            'recent_analysis': recent_analysis,
+            'emotion_breakdown': emotion_breakdown,
             'data_counts': [dict(row) for row in data_counts],
             'garden_status': {
                 'current_flower': 'Resilience Rose',
@@ -387,7 +934,12 @@ def get_dashboard_data(user_id):
             }
         }
         
-        return jsonify(dashboard_data), 200
+        body = app.json.dumps(dashboard_data)
+        dashboard_cache.set_if_current(cache_key, body, generation)
+        
+        response = Response(body, status=200, mimetype='application/json')
+        response.headers['X-Cache'] = 'MISS'
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -403,57 +955,46 @@ def submit_text_message():
         if not message or not user_id:
             return jsonify({'error': 'Missing required fields'}), 400
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
+        with db_connection() as conn:
+            if not conn:
+                return jsonify({'error': 'Database connection failed'}), 500
             
-        cur = conn.cursor()
+            cur = conn.cursor()
         
-        # Store message
-        cur.execute(
-            "INSERT INTO user_data (user_id, data_type, content) VALUES (%s, %s, %s) RETURNING id",
-            (user_id, f'text_{message_type}', message)
-        )
-        data_id = cur.fetchone()['id']
+            # Store message
+            cur.execute(
+                "INSERT INTO user_data (user_id, data_type, content) VALUES (%s, %s, %s) RETURNING id",
+                (user_id, f'text_{message_type}', message)
+            )
+            data_id = cur.fetchone()['id']
         
-        # Analyze sentiment
-        analysis_result = analyze_text_sentiment(message)
+            # Analyze sentiment
+            analysis_result = analyze_text_sentiment(message)
         
-        # Determine risk level
-        sentiment_score = analysis_result['sentiment_score']
-        if sentiment_score < 0.3:
-            risk_level = 'high'
-        elif sentiment_score < 0.6:
-            risk_level = 'medium'
-        else:
-            risk_level = 'low'
+            sentiment_score = analysis_result['sentiment_score']
+            risk_level = determine_risk_level(sentiment_score)
         
-        # Store analysis results
-        cur.execute(
-            """INSERT INTO analysis_results 
-               (user_id, data_id, sentiment_score, emotion_detected, risk_level, confidence_score) 
-               VALUES (%s, %s, %s, %s, %s, %s)""",
-            (user_id, data_id, sentiment_score, analysis_result['emotion'], 
-             risk_level, analysis_result['confidence'])
-        )
+            # Store analysis results
+            cur.execute(
+                """INSERT INTO analysis_results 
+                   (user_id, data_id, sentiment_score, emotion_detected, risk_level, confidence_score, emotion_scores) 
+                   VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+                (user_id, data_id, sentiment_score, analysis_result['emotion'], 
+                 risk_level, analysis_result['confidence'], emotion_vectors.pack(analysis_result.get('emotion_scores')))
+            )
+            rollups.record(cur, user_id, f'text_{message_type}', sentiment=sentiment_score, risk_level=risk_level)
         
-        # Update user metrics
+            conn.commit()
+            cur.close()
         points_earned = 10
-        cur.execute(
-            """UPDATE health_metrics 
-               SET growth_points = growth_points + %s, mood_score = %s
-               WHERE user_id = %s""",
-            (points_earned, sentiment_score, user_id)
-        )
-        
-        conn.commit()
-        cur.close()
-        conn.close()
+        metrics_accumulator.add(user_id, points_earned, sentiment_score)
+        invalidate_dashboard(user_id)
         
         return jsonify({
             'status': 'processed',
             'data_id': data_id,
             'analysis': analysis_result,
+            'emotion_breakdown': generate_emotion_breakdown(analysis_result),
             'risk_level': risk_level,
             'points_earned': points_earned
         }), 201
@@ -461,10 +1002,25 @@ def submit_text_message():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def store_voice_blob(stream):
+    """File a streamed upload in the blob store and register it; returns (path, upload info)"""
+    upload = stream.info()
+    filepath, upload['stored'] = voice_blobs.adopt(stream)
+    with db_connection() as conn:
+        if not conn:
+            raise RuntimeError('Database connection failed')
+        cur = conn.cursor()
+        blob_store.register(cur, upload, filepath)
+        conn.commit()
+        cur.close()
+    return filepath, upload
+
 @app.route('/api/voice-message', methods=['POST'])
 def upload_voice_message():
-    """Upload and analyze voice message"""
+    """Upload a voice message and queue it for analysis"""
     try:
+        # Streamed into the blob store's directory, so filing it is a rename
+        request.stream_files_to(voice_blobs.root, app.config['VOICE_UPLOAD_MAX_BYTES'])
         if 'voice_file' not in request.files:
             return jsonify({'error': 'No voice file provided'}), 400
         
@@ -474,56 +1030,20 @@ def upload_voice_message():
         if not file.filename or not user_id:
             return jsonify({'error': 'Missing required fields'}), 400
         
-        # Save voice file
-        filename = secure_filename(f"voice_{user_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.wav")
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], 'voice', filename)
-        file.save(filepath)
+        filepath, upload = store_voice_blob(file.stream)
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
-            
-        cur = conn.cursor()
-        
-        # Store voice data
-        cur.execute(
-            "INSERT INTO user_data (user_id, data_type, file_path) VALUES (%s, %s, %s) RETURNING id",
-            (user_id, 'voice_message', filepath)
-        )
-        data_id = cur.fetchone()['id']
-        
-        # Analyze voice
-        voice_analysis = analyze_voice_features(filepath)
-        
-        # Store analysis
-        cur.execute(
-            """INSERT INTO analysis_results 
-               (user_id, data_id, sentiment_score, emotion_detected, confidence_score) 
-               VALUES (%s, %s, %s, %s, %s)""",
-            (user_id, data_id, voice_analysis['mood_score'], 
-             voice_analysis['mood'], 0.7)
-        )
-        
-        # Update metrics
-        points_earned = 15
-        cur.execute(
-            """UPDATE health_metrics 
-               SET growth_points = growth_points + %s
-               WHERE user_id = %s""",
-            (points_earned, user_id)
-        )
-        
-        conn.commit()
-        cur.close()
-        conn.close()
+        # Analysis runs in the background; poll the job for the result
+        job_id = job_queue.submit('voice_message', {'user_id': user_id, 'file_path': filepath, **upload})
         
         return jsonify({
-            'status': 'processed',
-            'data_id': data_id,
-            'analysis': voice_analysis,
-            'points_earned': points_earned
-        }), 201
-        
+            'status': 'queued',
+            'job_id': job_id,
+            'status_url': f'/api/jobs/{job_id}',
+            'upload': upload
+        }), 202
+        
+    except RequestEntityTooLarge:
+        return jsonify({'error': f"Voice file too large (max {app.config['VOICE_UPLOAD_MAX_BYTES']} bytes)"}), 413
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -539,55 +1059,41 @@ def submit_family_feedback():
         if not feedback_text or not user_id:
             return jsonify({'error': 'Missing required fields'}), 400
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
+        with db_connection() as conn:
+            if not conn:
+                return jsonify({'error': 'Database connection failed'}), 500
             
-        cur = conn.cursor()
-        
-        # Store feedback
-        cur.execute(
-            "INSERT INTO user_data (user_id, data_type, content) VALUES (%s, %s, %s) RETURNING id",
-            (user_id, f'feedback_{relationship}', feedback_text)
-        )
-        data_id = cur.fetchone()['id']
+            cur = conn.cursor()
         
-        # Analyze feedback sentiment
-        analysis = analyze_text_sentiment(feedback_text)
+            # Store feedback
+            cur.execute(
+                "INSERT INTO user_data (user_id, data_type, content) VALUES (%s, %s, %s) RETURNING id",
+                (user_id, f'feedback_{relationship}', feedback_text)
+            )
+            data_id = cur.fetchone()['id']
         
-        # Family feedback gets higher weight
-        weight_multiplier = 1.5 if relationship == 'family' else 1.0
-        weighted_sentiment = min(analysis['sentiment_score'] * weight_multiplier, 1.0)
+            # Analyze feedback sentiment
+            analysis = analyze_text_sentiment(feedback_text)
         
-        # Determine risk level
-        if weighted_sentiment < 0.3:
-            risk_level = 'high'
-        elif weighted_sentiment < 0.6:
-            risk_level = 'medium'
-        else:
-            risk_level = 'low'
+            weighted_sentiment = weighted_feedback_sentiment(relationship, analysis['sentiment_score'])
         
-        # Store analysis
-        cur.execute(
-            """INSERT INTO analysis_results 
-               (user_id, data_id, sentiment_score, emotion_detected, risk_level, confidence_score) 
-               VALUES (%s, %s, %s, %s, %s, %s)""",
-            (user_id, data_id, weighted_sentiment, analysis['emotion'], 
-             risk_level, analysis['confidence'])
-        )
+            risk_level = determine_risk_level(weighted_sentiment)
         
-        # Update metrics
-        points_earned = 20
-        cur.execute(
-            """UPDATE health_metrics 
-               SET growth_points = growth_points + %s, mood_score = %s
-               WHERE user_id = %s""",
-            (points_earned, weighted_sentiment, user_id)
-        )
+            # Store analysis
+            cur.execute(
+                """INSERT INTO analysis_results 
+                   (user_id, data_id, sentiment_score, emotion_detected, risk_level, confidence_score, emotion_scores) 
+                   VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+                (user_id, data_id, weighted_sentiment, analysis['emotion'], 
+                 risk_level, analysis['confidence'], emotion_vectors.pack(analysis.get('emotion_scores')))
+            )
+            rollups.record(cur, user_id, f'feedback_{relationship}', sentiment=weighted_sentiment, risk_level=risk_level)
         
-        conn.commit()
-        cur.close()
-        conn.close()
+            conn.commit()
+            cur.close()
+        points_earned = 20
+        metrics_accumulator.add(user_id, points_earned, weighted_sentiment)
+        invalidate_dashboard(user_id)
         
         return jsonify({
             'status': 'feedback_processed',
@@ -606,91 +1112,89 @@ def create_mock_data(user_id):
     try:
         mock_data = generate_mock_data(user_id)
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
-            
-        cur = conn.cursor()
-        
-        total_sentiment = 0
-        count = 0
+        # Use mock sentiment for consistency
+        items = [{'text': conv['text'], 'data_type': 'mock_conversation', 'sentiment': conv['sentiment']}
+                 for conv in mock_data['conversations']]
+        items += [{'text': feedback['text'], 'data_type': 'mock_family_feedback', 'sentiment': feedback['sentiment']}
+                  for feedback in mock_data['family_feedback']]
         
-        # Process conversations
-        for conv in mock_data['conversations']:
-            # Store data
-            cur.execute(
-                "INSERT INTO user_data (user_id, data_type, content) VALUES (%s, %s, %s) RETURNING id",
-                (user_id, 'mock_conversation', conv['text'])
-            )
-            data_id = cur.fetchone()['id']
-            
-            # Use mock sentiment for consistency
-            analysis = analyze_text_sentiment(conv['text'])
-            sentiment_score = conv.get('sentiment', analysis['sentiment_score'])
-            
-            # Determine risk level
-            if sentiment_score < 0.3:
-                risk_level = 'high'
-            elif sentiment_score < 0.6:
-                risk_level = 'medium'
-            else:
-                risk_level = 'low'
-            
-            # Store analysis
-            cur.execute(
-                """INSERT INTO analysis_results 
-                   (user_id, data_id, sentiment_score, emotion_detected, risk_level, confidence_score) 
-                   VALUES (%s, %s, %s, %s, %s, %s)""",
-                (user_id, data_id, sentiment_score, analysis['emotion'], 
-                 risk_level, analysis['confidence'])
-            )
+        with db_connection() as conn:
+            if not conn:
+                return jsonify({'error': 'Database connection failed'}), 500
             
-            total_sentiment += sentiment_score
-            count += 1
+            cur = conn.cursor()
+            result = ingest_texts(cur, user_id, items, points_per_item=10, check_in=True)
+            conn.commit()
+            cur.close()
+        metrics_accumulator.add(user_id, result['points_earned'], result['avg_sentiment'])
+        invalidate_dashboard(user_id)
         
-        # Process family feedback
-        for feedback in mock_data['family_feedback']:
-            cur.execute(
-                "INSERT INTO user_data (user_id, data_type, content) VALUES (%s, %s, %s) RETURNING id",
-                (user_id, 'mock_family_feedback', feedback['text'])
-            )
-            data_id = cur.fetchone()['id']
-            
-            analysis = analyze_text_sentiment(feedback['text'])
-            sentiment_score = feedback.get('sentiment', analysis['sentiment_score'])
-            
-            cur.execute(
-                """INSERT INTO analysis_results 
-                   (user_id, data_id, sentiment_score, emotion_detected, confidence_score) 
-                   VALUES (%s, %s, %s, %s, %s)""",
-                (user_id, data_id, sentiment_score, analysis['emotion'], analysis['confidence'])
-            )
-            
-            total_sentiment += sentiment_score
-            count += 1
+        avg_sentiment = result['avg_sentiment']
         
-        # Update user metrics
-        avg_sentiment = total_sentiment / count if count > 0 else 0.5
-        energy_level = max(1, min(5, int(avg_sentiment * 5)))
+        return jsonify({
+            'message': 'Mock data generated and processed successfully',
+            'data_points': len(items),
+            'avg_sentiment': avg_sentiment,
+            'energy_level': max(1, min(5, int(avg_sentiment * 5))),
+            'total_points_earned': result['points_earned']
+        }), 201
         
-        cur.execute(
-            """UPDATE health_metrics 
-               SET energy_level = %s, mood_score = %s, growth_points = growth_points + %s,
-                   check_ins = check_ins + 1, energy_streak = energy_streak + 1
-               WHERE user_id = %s""",
-            (energy_level, avg_sentiment, count * 10, user_id)
-        )
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/users/<int:user_id>/bulk-ingest', methods=['POST'])
+def bulk_ingest(user_id):
+    """Ingest many text entries for a user in one request (e.g. journal backfills)
+
+    Body: {"items": [{"text": "...", "type": "journal", "created_at": "2024-01-31T09:00:00"}],
+           "type": "journal", "check_in": false}
+    Plain strings are accepted in ``items`` as well.
+    """
+    try:
+        data = request.get_json()
+        raw_items = data.get('items') or []
+        default_type = data.get('type', 'bulk_import')
         
-        conn.commit()
-        cur.close()
-        conn.close()
+        if not raw_items:
+            return jsonify({'error': 'Missing required fields'}), 400
+        if len(raw_items) > app.config['BULK_INGEST_MAX_ITEMS']:
+            return jsonify({'error': f"Too many items (max {app.config['BULK_INGEST_MAX_ITEMS']})"}), 413
+        
+        items = []
+        for raw in raw_items:
+            if isinstance(raw, str):
+                raw = {'text': raw}
+            if not raw.get('text'):
+                return jsonify({'error': 'Every item needs non-empty text'}), 400
+            items.append({
+                'text': raw['text'],
+                'data_type': f"text_{raw.get('type', default_type)}",
+                'created_at': raw.get('created_at')
+            })
+        
+        with db_connection() as conn:
+            if not conn:
+                return jsonify({'error': 'Database connection failed'}), 500
+            
+            cur = conn.cursor()
+            check_in = bool(data.get('check_in'))
+            result = ingest_texts(cur, user_id, items, check_in=check_in)
+            conn.commit()
+            cur.close()
+        metrics_accumulator.add(user_id, result['points_earned'], result['avg_sentiment'])
+        invalidate_dashboard(user_id)
+        
+        risk_counts = {}
+        for analysis in result['analyses']:
+            risk_counts[analysis['risk_level']] = risk_counts.get(analysis['risk_level'], 0) + 1
         
         return jsonify({
-            'message': 'Mock data generated and processed successfully',
-            'data_points': count,
-            'avg_sentiment': avg_sentiment,
-            'energy_level': energy_level,
-            'total_points_earned': count * 10
+            'status': 'processed',
+            'count': len(items),
+            'data_ids': result['data_ids'],
+            'avg_sentiment': result['avg_sentiment'],
+            'risk_levels': risk_counts,
+            'points_earned': result['points_earned']
         }), 201
         
     except Exception as e:
@@ -706,33 +1210,24 @@ def update_energy(user_id):
         if not energy_level or not (1 <= energy_level <= 5):
             return jsonify({'error': 'Invalid energy level'}), 400
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
+        with db_connection() as conn:
+            if not conn:
+                return jsonify({'error': 'Database connection failed'}), 500
             
-        cur = conn.cursor()
-        
-        # Get current metrics
-        cur.execute(
-            "SELECT energy_streak, check_ins FROM health_metrics WHERE user_id = %s ORDER BY created_at DESC LIMIT 1",
-            (user_id,)
-        )
-        current_metrics = cur.fetchone()
-        
-        new_streak = (current_metrics['energy_streak'] + 1) if current_metrics else 1
-        new_checkins = (current_metrics['check_ins'] + 1) if current_metrics else 1
+            cur = conn.cursor()
+            # Rollups before health_metrics, the same lock order as check-ins
+            rollups.record_energy(cur, user_id, energy_level)
         
-        # Update metrics
-        cur.execute(
-            """UPDATE health_metrics 
-               SET energy_level = %s, energy_streak = %s, check_ins = %s, growth_points = growth_points + 5
-               WHERE user_id = %s""",
-            (energy_level, new_streak, new_checkins, user_id)
-        )
+            # Increment in place and read the result back, so concurrent
+            # check-ins can't both read the same streak and lose one
+            cur.execute(queries.ENERGY_CHECK_IN_SQL, {'energy_level': energy_level, 'user_id': user_id})
+            current_metrics = cur.fetchone()
+            new_streak = current_metrics['energy_streak'] if current_metrics else 1
+            new_checkins = current_metrics['check_ins'] if current_metrics else 1
         
-        conn.commit()
-        cur.close()
-        conn.close()
+            conn.commit()
+            cur.close()
+        invalidate_dashboard(user_id)
         
         return jsonify({
             'message': 'Energy updated successfully',
@@ -760,27 +1255,23 @@ def complete_powerup(user_id):
         
         points = point_rewards.get(activity_type, 10)
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
+        with db_connection() as conn:
+            if not conn:
+                return jsonify({'error': 'Database connection failed'}), 500
             
-        cur = conn.cursor()
-        
-        # Update growth points
-        cur.execute(
-            "UPDATE health_metrics SET growth_points = growth_points + %s WHERE user_id = %s",
-            (points, user_id)
-        )
+            cur = conn.cursor()
         
-        # Log the activity
-        cur.execute(
-            "INSERT INTO user_data (user_id, data_type, content) VALUES (%s, %s, %s)",
-            (user_id, 'activity', f"Completed {activity_type} power-up")
-        )
+            # Log the activity
+            cur.execute(
+                "INSERT INTO user_data (user_id, data_type, content) VALUES (%s, %s, %s)",
+                (user_id, 'activity', f"Completed {activity_type} power-up")
+            )
+            rollups.record(cur, user_id, 'activity')
         
-        conn.commit()
-        cur.close()
-        conn.close()
+            conn.commit()
+            cur.close()
+        metrics_accumulator.add(user_id, points)
+        invalidate_dashboard(user_id)
         
         return jsonify({
             'message': f'{activity_type} power-up completed!',
@@ -792,105 +1283,138 @@ def complete_powerup(user_id):
 
 # ========== CHAT SESSION ROUTES ==========
 
+def encode_session_cursor(session_date, session_id):
+    raw = f"{session_date.isoformat()}|{session_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_session_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+    session_date, session_id = raw.rsplit('|', 1)
+    return datetime.fromisoformat(session_date), int(session_id)
+
 @app.route('/api/chat/sessions', methods=['GET'])
 def get_chat_sessions():
-    """Get all chat sessions"""
+    """Get chat sessions, newest first, one page at a time
+
+    Query params: limit, cursor (from next_cursor), therapist_id, patient_id,
+    status, from / to (ISO dates on session_date) and fields (comma
+    separated subset of queries.CHAT_SESSION_FIELDS).
+    """
     try:
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
+        limit = request.args.get('limit', app.config['CHAT_SESSIONS_PAGE_SIZE'], type=int)
+        limit = max(1, min(limit, app.config['CHAT_SESSIONS_MAX_PAGE_SIZE']))
+        
+        fields = queries.DEFAULT_CHAT_SESSION_FIELDS
+        if request.args.get('fields'):
+            fields = [field.strip() for field in request.args['fields'].split(',') if field.strip()]
+            unknown = [field for field in fields if field not in queries.CHAT_SESSION_FIELDS]
+            if unknown:
+                return jsonify({'error': f"Unknown fields: {', '.join(unknown)}"}), 400
+        
+        filters = []
+        params = {'limit': limit + 1}
+        for arg in ('therapist_id', 'patient_id'):
+            if request.args.get(arg):
+                filters.append(arg)
+                params[arg] = request.args.get(arg, type=int)
+        if request.args.get('status'):
+            filters.append('status')
+            params['status'] = request.args['status']
+        for arg in ('from', 'to'):
+            if request.args.get(arg):
+                filters.append(arg)
+                params[arg] = datetime.fromisoformat(request.args[arg])
+        if request.args.get('cursor'):
+            try:
+                params['cursor_date'], params['cursor_id'] = decode_session_cursor(request.args['cursor'])
+            except Exception:
+                return jsonify({'error': 'Invalid cursor'}), 400
+            filters.append('cursor')
+        
+        with db_connection() as conn:
+            if not conn:
+                return jsonify({'error': 'Database connection failed'}), 500
             
-        cur = conn.cursor()
+            cur = conn.cursor()
         
-        cur.execute("""
-            SELECT 
-                cs.id as session_id,
-                u.id as patient_id,
-                u.name as patient_name,
-                u.email,
-                cs.session_date,
-                cs.duration_minutes,
-                cs.status,
-                cs.primary_emotion,
-                cs.emotion_confidence,
-                COUNT(cm.id) as message_count
-            FROM chat_sessions cs
-            JOIN users u ON cs.patient_id = u.id
-            LEFT JOIN chat_messages cm ON cs.id = cm.session_id
-            GROUP BY cs.id, u.id, u.name, u.email, cs.session_date, cs.duration_minutes, cs.status, cs.primary_emotion, cs.emotion_confidence
-            ORDER BY cs.session_date DESC
-        """)
+            cur.execute(queries.chat_sessions_sql(fields, filters), params)
         
-        sessions = [dict(row) for row in cur.fetchall()]
+            rows = cur.fetchall()
         
-        cur.close()
-        conn.close()
+            cur.close()
         
-        return jsonify({'sessions': sessions}), 200
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = None
+        if has_more:
+            next_cursor = encode_session_cursor(rows[-1]['_cursor_date'], rows[-1]['_cursor_id'])
+        sessions = [{field: row[field] for field in fields} for row in rows]
+        
+        return jsonify({
+            'sessions': sessions,
+            'next_cursor': next_cursor,
+            'has_more': has_more
+        }), 200
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameter: {e}'}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/chat/session/<int:session_id>', methods=['GET'])
 def get_chat_session(session_id):
-    """Get specific chat session with messages and emotions"""
+    """Get specific chat session with messages and emotions
+
+    Query params: ``view=summary`` returns only the session and its emotion
+    summary; ``limit=N`` returns just the latest N messages / history rows.
+    """
     try:
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
+        summary_only = request.args.get('view') == 'summary'
+        limit = request.args.get('limit', type=int)
+        
+        with db_connection() as conn:
+            if not conn:
+                return jsonify({'error': 'Database connection failed'}), 500
             
-        cur = conn.cursor()
+            cur = conn.cursor()
         
-        # Get session details
-        cur.execute("""
-            SELECT 
-                cs.*,
-                u.name as patient_name,
-                u.email,
-                hm.energy_level,
-                hm.mood_score
-            FROM chat_sessions cs
-            JOIN users u ON cs.patient_id = u.id
-            LEFT JOIN health_metrics hm ON u.id = hm.user_id
-            WHERE cs.id = %s
-        """, (session_id,))
+            # Get session details
+            cur.execute(queries.CHAT_SESSION_SQL, {'session_id': session_id})
         
-        session = cur.fetchone()
-        if not session:
-            return jsonify({'error': 'Session not found'}), 404
+            session = cur.fetchone()
+            if not session:
+                return jsonify({'error': 'Session not found'}), 404
         
-        # Get chat messages
-        cur.execute("""
-            SELECT 
-                cm.*,
-                ea.sentiment_score,
-                ea.emotion_detected,
-                ea.confidence_score
-            FROM chat_messages cm
-            LEFT JOIN emotion_analysis ea ON cm.id = ea.message_id
-            WHERE cm.session_id = %s
-            ORDER BY cm.timestamp ASC
-        """, (session_id,))
+            summary = session_summary.get_summary(cur, session_id)
+            conn.commit()
+            # Average emotion distribution, from the running sums in the summary row
+            session_breakdown = summary['emotion_breakdown'] if summary else None
+            
+            if summary_only:
+                cur.close()
+                return jsonify({
+                    'session': dict(session),
+                    'summary': summary,
+                    'emotion_breakdown': session_breakdown
+                }), 200
         
-        messages = [dict(row) for row in cur.fetchall()]
+            # Get chat messages (latest first when limited, returned oldest first)
+            cur.execute(queries.CHAT_MESSAGES_SQL, {'session_id': session_id, 'limit': limit})
         
-        # Get emotion history for the session
-        cur.execute("""
-            SELECT 
-                eh.*,
-                cm.content as message_content
-            FROM emotion_history eh
-            JOIN chat_messages cm ON eh.message_id = cm.id
-            WHERE eh.session_id = %s
-            ORDER BY eh.timestamp DESC
-        """, (session_id,))
+            messages = [dict(row) for row in cur.fetchall()]
+            attach_emotion_breakdowns(messages)
         
-        emotion_history = [dict(row) for row in cur.fetchall()]
+            # Get emotion history for the session, including live call
+            # estimates, which have no message
+            cur.execute(queries.SESSION_EMOTION_HISTORY_SQL, {'session_id': session_id, 'limit': limit})
         
-        cur.close()
-        conn.close()
+            emotion_history = [dict(row) for row in cur.fetchall()]
+        
+            cur.close()
         
         return jsonify({
             'session': dict(session),
+            'summary': summary,
+            'emotion_breakdown': session_breakdown,
             'messages': messages,
             'emotion_history': emotion_history
         }), 200
@@ -909,52 +1433,77 @@ def send_chat_message(session_id):
         if not message_content or not sender_type:
             return jsonify({'error': 'Missing required fields'}), 400
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
-            
-        cur = conn.cursor()
-        
-        # Insert message
-        cur.execute("""
-            INSERT INTO chat_messages (session_id, sender_type, sender_id, content, timestamp)
-            VALUES (%s, %s, %s, %s, NOW())
-            RETURNING id
-        """, (session_id, sender_type, sender_id, message_content))
-        
-        message_id = cur.fetchone()['id']
-        
-        # Analyze emotion for patient messages
+        # Analyze emotion for patient messages before taking the session's row lock
         analysis_result = None
         if sender_type == 'patient':
-            analysis = analyze_text_sentiment(message_content)
-            
-            # Store emotion analysis
-            cur.execute("""
-                INSERT INTO emotion_analysis 
-                (message_id, sentiment_score, emotion_detected, confidence_score)
-                VALUES (%s, %s, %s, %s)
-            """, (message_id, analysis['sentiment_score'], analysis['emotion'], analysis['confidence']))
+            analysis_result = analyze_text_sentiment(message_content)
+        
+        with db_connection() as conn:
+            if not conn:
+                return jsonify({'error': 'Database connection failed'}), 500
             
-            # Update session primary emotion
+            cur = conn.cursor()
+        
+            # Maintained counter so session listings never aggregate messages;
+            # it also numbers this message for the event stream
+            cur.execute(queries.NEXT_MESSAGE_SEQ_SQL, {'session_id': session_id})
+            session_row = cur.fetchone()
+            if not session_row:
+                conn.rollback()
+                cur.close()
+                return jsonify({'error': 'Session not found'}), 404
+            session_seq = session_row['message_count']
+        
+            # Insert message
             cur.execute("""
-                UPDATE chat_sessions 
-                SET primary_emotion = %s, emotion_confidence = %s
-                WHERE id = %s
-            """, (analysis['emotion'], analysis['confidence'], session_id))
+                INSERT INTO chat_messages (session_id, sender_type, sender_id, content, timestamp, session_seq)
+                VALUES (%s, %s, %s, %s, NOW(), %s)
+                RETURNING id, timestamp
+            """, (session_id, sender_type, sender_id, message_content, session_seq))
+        
+            message_row = cur.fetchone()
+            message_id = message_row['id']
+        
+            if analysis_result is not None:
+                # Store emotion analysis
+                cur.execute("""
+                    INSERT INTO emotion_analysis 
+                    (message_id, sentiment_score, emotion_detected, confidence_score, emotion_scores)
+                    VALUES (%s, %s, %s, %s, %s)
+                """, (message_id, analysis_result['sentiment_score'], analysis_result['emotion'], analysis_result['confidence'],
+                      emotion_vectors.pack(analysis_result.get('emotion_scores'))))
             
-            # Add to emotion history
-            cur.execute("""
-                INSERT INTO emotion_history 
-                (session_id, message_id, emotion, confidence, timestamp)
-                VALUES (%s, %s, %s, %s, NOW())
-            """, (session_id, message_id, analysis['emotion'], analysis['confidence']))
+                # Fold into the running session summary and keep the
+                # session's primary emotion as the dominant one so far
+                summary = session_summary.record_message(cur, session_id, analysis_result)
+                cur.execute("""
+                    UPDATE chat_sessions 
+                    SET primary_emotion = %s, emotion_confidence = %s
+                    WHERE id = %s
+                """, (summary['dominant_emotion'], summary['dominant_confidence'], session_id))
             
-            analysis_result = analysis
-        
-        conn.commit()
-        cur.close()
-        conn.close()
+                # Add to emotion history
+                cur.execute("""
+                    INSERT INTO emotion_history 
+                    (session_id, message_id, emotion, confidence, timestamp)
+                    VALUES (%s, %s, %s, %s, NOW())
+                """, (session_id, message_id, analysis_result['emotion'], analysis_result['confidence']))
+        
+            # Reaches live subscribers in every process once this commits
+            notify_session_event(cur, session_id, 'message', {
+                'message': {
+                    'id': message_id,
+                    'session_id': session_id,
+                    'sender_type': sender_type,
+                    'sender_id': sender_id,
+                    'content': message_content,
+                    'timestamp': message_row['timestamp']
+                },
+                'analysis': analysis_result
+            }, session_seq)
+        
+            conn.commit()
+            cur.close()
         
         return jsonify({
             'message_id': message_id,
@@ -964,6 +1513,207 @@ def send_chat_message(session_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def load_session_events(session_id, after_seq, limit=None):
+    """Rebuild 'message' events after a session sequence number from the database"""
+    with db_connection() as conn:
+        if not conn:
+            raise RuntimeError('Database connection failed')
+        cur = conn.cursor()
+        cur.execute(queries.SESSION_EVENTS_SQL, {
+            'session_id': session_id,
+            'after_seq': after_seq,
+            'limit': limit or app.config['SSE_BACKFILL_LIMIT']
+        })
+        rows = cur.fetchall()
+        cur.close()
+    
+    events = []
+    for row in rows:
+        analysis = None
+        if row['emotion_detected'] is not None:
+            analysis = {
+                'sentiment_score': row['sentiment_score'],
+                'emotion': row['emotion_detected'],
+                'confidence': row['confidence_score']
+            }
+        message = {key: row[key] for key in ('id', 'session_id', 'sender_type', 'sender_id', 'content', 'timestamp')}
+        events.append({'id': row['session_seq'], 'type': 'message', 'data': {'message': message, 'analysis': analysis}})
+    return events
+
+def load_session_event(session_id, session_seq):
+    """Data of one 'message' event (for notifications too large to carry it)"""
+    events = load_session_events(session_id, session_seq - 1, limit=1)
+    if events and events[0]['id'] == session_seq:
+        return events[0]['data']
+    return None
+
+@app.route('/api/chat/session/<int:session_id>/stream', methods=['GET'])
+def stream_chat_session(session_id):
+    """Server-Sent Events stream of new messages with their emotion analysis,
+    plus 'voice' estimates while the call's live audio is being analyzed
+
+    Message event ids number the session's messages in commit order.
+    Resume with the Last-Event-ID header (sent automatically by EventSource
+    on reconnect) or ?last_event_id=<event id>; missed messages are
+    replayed before live events. Voice estimates only reach streams served
+    by the process analyzing the call.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({'error': 'Invalid last event id'}), 400
+    
+    # Subscribe before backfilling so nothing committed in between is lost
+    subscriber = session_events.subscribe(session_id)
+    backlog = []
+    if last_event_id is not None:
+        backlog = session_events.replay(session_id, last_event_id)
+        if backlog is None:
+            try:
+                backlog = load_session_events(session_id, last_event_id)
+            except Exception as e:
+                session_events.unsubscribe(session_id, subscriber)
+                return jsonify({'error': str(e)}), 500
+    
+    keepalive = app.config['SSE_KEEPALIVE_SECONDS']
+    
+    def generate():
+        sent = last_event_id
+        try:
+            yield 'retry: 3000\n\n'
+            for event in backlog:
+                yield format_sse(event)
+                sent = event['id']
+            while True:
+                try:
+                    event = subscriber.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                if event['id'] is not None:
+                    if sent is not None and event['id'] <= sent:
+                        continue  # already delivered by the backlog
+                    if sent is not None and event['id'] > sent + 1:
+                        # Dropped while this client was slow or the listener reconnected
+                        for missed in fill_event_gap(session_id, sent, event['id']):
+                            yield format_sse(missed)
+                    sent = event['id']
+                yield format_sse(event)
+        finally:
+            session_events.unsubscribe(session_id, subscriber)
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+def fill_event_gap(session_id, after_seq, before_seq):
+    try:
+        return [event for event in load_session_events(session_id, after_seq) if event['id'] < before_seq]
+    except Exception as e:
+        logging.error(f"Could not backfill events {after_seq}-{before_seq} of session {session_id}: {e}")
+        return []
+
+def save_live_estimates(session_id, started, estimates):
+    """Write a batch of live window estimates to emotion_history in one statement
+
+    The mood comes from a feature heuristic with no confidence of its own,
+    so confidence stays NULL and the window's voiced_ratio is kept instead.
+    """
+    with db_connection() as conn:
+        if not conn:
+            raise RuntimeError('Database connection failed')
+        cur = conn.cursor()
+        execute_values(cur, """
+            INSERT INTO emotion_history (session_id, emotion, voiced_ratio, timestamp) VALUES %s
+        """, [(session_id, estimate['mood'], estimate['voiced_ratio'],
+                started + timedelta(seconds=estimate['offset'])) for estimate in estimates])
+        conn.commit()
+        cur.close()
+
+@app.route('/api/chat/session/<int:session_id>/live-audio', methods=['POST'])
+def stream_live_audio(session_id):
+    """Mood estimates from live call audio, streamed back while the call goes on
+
+    The request body is raw mono PCM (?format=s16le|f32le, ?sample_rate=16000)
+    sent with chunked transfer encoding for as long as the call lasts. Each
+    response line is the JSON estimate for one overlapping window; the same
+    estimates go to the session's Server-Sent Events stream as 'voice'
+    events and are saved to emotion_history in batches.
+    """
+    sample_format = request.args.get('format', 's16le')
+    sample_rate = request.args.get('sample_rate', 16000, type=int)
+    if sample_format not in live_audio.SAMPLE_FORMATS:
+        return jsonify({'error': f"Unknown format (use one of {', '.join(live_audio.SAMPLE_FORMATS)})"}), 400
+    if not sample_rate or not 8000 <= sample_rate <= 48000:
+        return jsonify({'error': 'sample_rate must be between 8000 and 48000'}), 400
+    
+    try:
+        with db_connection() as conn:
+            if not conn:
+                return jsonify({'error': 'Database connection failed'}), 500
+            cur = conn.cursor()
+            cur.execute(queries.SESSION_STATUS_SQL, {'session_id': session_id})
+            session = cur.fetchone()
+            cur.close()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    if not session:
+        return jsonify({'error': 'Session not found'}), 404
+    if session['status'] != 'active':
+        return jsonify({'error': 'Session is not active'}), 409
+    
+    analyzer = live_audio.LiveVoiceAnalyzer(
+        sample_rate, sample_format,
+        window_seconds=app.config['LIVE_AUDIO_WINDOW_SECONDS'],
+        hop_seconds=app.config['LIVE_AUDIO_HOP_SECONDS'],
+        buffer_seconds=app.config['LIVE_AUDIO_BUFFER_SECONDS']
+    )
+    if not live_calls.start(session_id, analyzer):
+        return jsonify({'error': 'Session already has a live audio stream, or the server is at its limit'}), 409
+    
+    # Read the body from the generator, as it arrives, rather than up front
+    stream = request.stream
+    started = datetime.now()
+    read_bytes = app.config['LIVE_AUDIO_READ_BYTES']
+    flush_seconds = app.config['LIVE_AUDIO_FLUSH_SECONDS']
+    
+    def flush(pending):
+        try:
+            save_live_estimates(session_id, started, pending)
+        except Exception as e:
+            logging.error(f"Could not save live estimates for session {session_id}: {e}")
+    
+    def generate():
+        pending = []
+        last_flush = time.monotonic()
+        try:
+            while True:
+                chunk = stream.read(read_bytes)
+                if not chunk:
+                    break
+                for estimate in analyzer.feed(chunk):
+                    session_events.publish(session_id, 'voice', estimate)
+                    pending.append(estimate)
+                    yield json.dumps(estimate) + '\n'
+                if pending and time.monotonic() - last_flush >= flush_seconds:
+                    flush(pending)
+                    pending = []
+                    last_flush = time.monotonic()
+            yield json.dumps({'done': True, **analyzer.stats()}) + '\n'
+        finally:
+            if pending:
+                flush(pending)
+    
+    response = Response(generate(), mimetype='application/x-ndjson', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Also runs when the client is gone before the generator ever started
+    response.call_on_close(lambda: live_calls.finish(session_id))
+    return response
+
 @app.route('/api/chat/session/start', methods=['POST'])
 def start_chat_session():
     """Start a new chat session"""
@@ -972,25 +1722,24 @@ def start_chat_session():
         patient_id = data.get('patient_id', 1)
         therapist_id = data.get('therapist_id', 1)
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
+        with db_connection() as conn:
+            if not conn:
+                return jsonify({'error': 'Database connection failed'}), 500
             
-        cur = conn.cursor()
+            cur = conn.cursor()
         
-        # Create new chat session
-        cur.execute("""
-            INSERT INTO chat_sessions 
-            (patient_id, therapist_id, session_date, status)
-            VALUES (%s, %s, NOW(), 'active')
-            RETURNING id
-        """, (patient_id, therapist_id))
+            # Create new chat session
+            cur.execute("""
+                INSERT INTO chat_sessions 
+                (patient_id, therapist_id, session_date, status)
+                VALUES (%s, %s, NOW(), 'active')
+                RETURNING id
+            """, (patient_id, therapist_id))
         
-        session_id = cur.fetchone()['id']
+            session_id = cur.fetchone()['id']
         
-        conn.commit()
-        cur.close()
-        conn.close()
+            conn.commit()
+            cur.close()
         
         return jsonify({
             'session_id': session_id,
@@ -1007,31 +1756,30 @@ def end_chat_session(session_id):
         data = request.get_json()
         duration = data.get('duration_minutes', 25)
         
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
+        with db_connection() as conn:
+            if not conn:
+                return jsonify({'error': 'Database connection failed'}), 500
             
-        cur = conn.cursor()
+            cur = conn.cursor()
         
-        # Update session status
-        cur.execute("""
-            UPDATE chat_sessions 
-            SET status = 'completed', duration_minutes = %s, end_time = NOW()
-            WHERE id = %s
-        """, (duration, session_id))
+            # Update session status
+            cur.execute("""
+                UPDATE chat_sessions 
+                SET status = 'completed', duration_minutes = %s, end_time = NOW()
+                WHERE id = %s
+            """, (duration, session_id))
         
-        # Generate SOAP note
-        soap_note = generate_soap_note(session_id, cur)
+            # Generate SOAP note
+            soap_note = generate_soap_note(session_id, cur)
         
-        # Store SOAP note
-        cur.execute("""
-            INSERT INTO soap_notes (session_id, content, generated_at)
-            VALUES (%s, %s, NOW())
-        """, (session_id, soap_note))
+            # Store SOAP note
+            cur.execute("""
+                INSERT INTO soap_notes (session_id, content, generated_at)
+                VALUES (%s, %s, NOW())
+            """, (session_id, soap_note))
         
-        conn.commit()
-        cur.close()
-        conn.close()
+            conn.commit()
+            cur.close()
         
         return jsonify({
             'session_id': session_id,
@@ -1043,8 +1791,9 @@ def end_chat_session(session_id):
 
 @app.route('/api/chat/voice-analysis', methods=['POST'])
 def analyze_voice_call():
-    """Analyze voice call for real-time emotion detection"""
+    """Upload a voice call recording and queue it for emotion analysis"""
     try:
+        request.stream_files_to(voice_blobs.root, app.config['CALL_UPLOAD_MAX_BYTES'])
         if 'audio_file' not in request.files:
             return jsonify({'error': 'No audio file provided'}), 400
         
@@ -1054,113 +1803,134 @@ def analyze_voice_call():
         if not file.filename or not session_id:
             return jsonify({'error': 'Missing required fields'}), 400
         
-        # Save audio file
-        filename = secure_filename(f"call_{session_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.wav")
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], 'calls', filename)
-        file.save(filepath)
-        
-        # Analyze voice
-        voice_analysis = analyze_voice_features(filepath)
-        
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
-            
-        cur = conn.cursor()
-        
-        # Store voice analysis
-        cur.execute("""
-            INSERT INTO user_data (user_id, data_type, file_path, content)
-            VALUES ((SELECT patient_id FROM chat_sessions WHERE id = %s), 'voice_call', %s, %s)
-            RETURNING id
-        """, (session_id, filepath, f"Voice call analysis: {voice_analysis['mood']}"))
-        
-        data_id = cur.fetchone()['id']
-        
-        # Store analysis results
-        cur.execute("""
-            INSERT INTO analysis_results 
-            (user_id, data_id, sentiment_score, emotion_detected, confidence_score)
-            VALUES ((SELECT patient_id FROM chat_sessions WHERE id = %s), %s, %s, %s, %s)
-        """, (session_id, data_id, voice_analysis['mood_score'], voice_analysis['mood'], 0.8))
+        filepath, upload = store_voice_blob(file.stream)
         
-        conn.commit()
-        cur.close()
-        conn.close()
+        job_id = job_queue.submit('voice_call', {'session_id': session_id, 'file_path': filepath, **upload})
         
         return jsonify({
-            'analysis': voice_analysis,
-            'status': 'analyzed'
-        }), 200
+            'status': 'queued',
+            'job_id': job_id,
+            'status_url': f'/api/jobs/{job_id}',
+            'upload': upload
+        }), 202
+    except RequestEntityTooLarge:
+        return jsonify({'error': f"Recording too large (max {app.config['CALL_UPLOAD_MAX_BYTES']} bytes)"}), 413
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """Poll the progress / result of a background analysis job"""
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    job.pop('payload', None)
+    return jsonify(job), 200
+
 @app.route('/api/users/<int:user_id>/analytics', methods=['GET'])
 def get_analytics(user_id):
-    """Get analytics data for charts and insights"""
+    """Get analytics data for charts and insights (served from daily rollups)"""
     try:
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
+        with db_connection() as conn:
+            if not conn:
+                return jsonify({'error': 'Database connection failed'}), 500
             
-        cur = conn.cursor()
-        
-        # Get mood trends over last 30 days
-        cur.execute("""
-            SELECT DATE(ar.created_at) as date, AVG(ar.sentiment_score) as avg_mood
-            FROM analysis_results ar
-            WHERE ar.user_id = %s AND ar.created_at >= NOW() - INTERVAL '30 days'
-            GROUP BY DATE(ar.created_at)
-            ORDER BY date
-        """, (user_id,))
-        mood_trends = [{'date': str(row['date']), 'avg_mood': float(row['avg_mood'])} for row in cur.fetchall()]
-        
-        # Get energy levels over time
-        cur.execute("""
-            SELECT DATE(created_at) as date, energy_level
-            FROM health_metrics 
-            WHERE user_id = %s AND created_at >= NOW() - INTERVAL '30 days'
-            ORDER BY created_at
-        """, (user_id,))
-        energy_trends = [dict(row) for row in cur.fetchall()]
-        
-        # Get data type distribution
-        cur.execute("""
-            SELECT data_type, COUNT(*) as count
-            FROM user_data 
-            WHERE user_id = %s
-            GROUP BY data_type
-        """, (user_id,))
-        data_distribution = [dict(row) for row in cur.fetchall()]
-        
-        # Get risk level distribution
-        cur.execute("""
-            SELECT risk_level, COUNT(*) as count
-            FROM analysis_results 
-            WHERE user_id = %s AND risk_level IS NOT NULL
-            GROUP BY risk_level
-        """, (user_id,))
-        risk_distribution = [dict(row) for row in cur.fetchall()]
-        
-        cur.close()
-        conn.close()
+            cur = conn.cursor()
+            analytics = rollups.load_analytics(cur, user_id, days=30)
+            cur.close()
         
-        return jsonify({
-            'mood_trends': mood_trends,
-            'energy_trends': energy_trends,
-            'data_distribution': data_distribution,
-            'risk_distribution': risk_distribution
-        }), 200
+        return jsonify(analytics), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.cli.command('rebuild-rollups')
+@click.option('--user-id', type=int, default=None, help='Only rebuild this user (default: everyone)')
+def rebuild_rollups_command(user_id):
+    """Recompute user_daily_rollups from the raw tables (backfill / repair)"""
+    with db_connection() as conn:
+        if not conn:
+            raise click.ClickException('Database connection failed')
+        cur = conn.cursor()
+        written = rollups.rebuild(cur, user_id)
+        conn.commit()
+        cur.close()
+    click.echo(f"Rebuilt {written} daily rollup rows")
+
+@app.cli.command('gc-voice-blobs')
+@click.option('--grace', type=float, default=None, help='Keep blobs used within this many seconds (default: VOICE_BLOB_GC_GRACE)')
+def gc_voice_blobs_command(grace):
+    """Delete stored voice audio that no user_data row references any more"""
+    with db_connection() as conn:
+        if not conn:
+            raise click.ClickException('Database connection failed')
+        cur = conn.cursor()
+        removed, freed = blob_store.collect_garbage(
+            cur, voice_blobs, app.config['VOICE_BLOB_GC_GRACE'] if grace is None else grace)
+        conn.commit()
+        cur.close()
+    click.echo(f"Removed {removed} voice blobs, freed {freed / 1e6:.1f} MB")
+
+@app.cli.command('db-upgrade')
+@click.option('--target', type=int, default=None, help='Stop after this migration version')
+def db_upgrade_command(target):
+    """Apply pending schema migrations"""
+    with db_connection() as conn:
+        if not conn:
+            raise click.ClickException('Database connection failed')
+        applied = migrate.upgrade(conn, target=target)
+    click.echo(f"Applied {len(applied)} migration(s)" + (f": {', '.join(map(str, applied))}" if applied else ''))
+
+@app.cli.command('db-status')
+def db_status_command():
+    """List schema migrations and whether they have been applied"""
+    with db_connection() as conn:
+        if not conn:
+            raise click.ClickException('Database connection failed')
+        migrations = migrate.status(conn)
+    for migration in migrations:
+        state = migration['applied_at'] or 'pending'
+        if migration['modified']:
+            state = f"{state} (file modified since)"
+        click.echo(f"{migration['version']:04d}_{migration['name']}: {state}")
+
+@app.cli.command('db-check-indexes')
+@click.option('--users', type=int, default=500, help='Users to seed (inside a rolled back transaction)')
+@click.option('--verbose', is_flag=True, help='Print every plan, not only failures')
+def db_check_indexes_command(users, verbose):
+    """Fail if any route query plans a sequential scan on a seeded dataset"""
+    with db_connection() as conn:
+        if not conn:
+            raise click.ClickException('Database connection failed')
+        results = migrate.check_indexes(conn, users=users)
+    failures = [result for result in results if result['seq_scans']]
+    for result in results:
+        if verbose or result['seq_scans']:
+            mark = 'FAIL' if result['seq_scans'] else 'ok'
+            click.echo(f"[{mark}] {result['route']}: {result['query'][:100]}")
+            for node in result['plan_nodes']:
+                click.echo(f"    {node}")
+    if failures:
+        raise click.ClickException(f"{len(failures)} of {len(results)} queries use a sequential scan")
+    click.echo(f"All {len(results)} route queries use index scans")
+
+def upgrade_schema():
+    """Apply pending migrations at startup"""
+    with db_connection() as conn:
+        if not conn:
+            return
+        applied = migrate.upgrade(conn)
+        if applied:
+            print(f"Applied schema migrations: {', '.join(map(str, applied))}")
+
 # Initialize database tables on startup (optional - for testing)
 def init_db():
     """Initialize database with sample data if empty"""
     try:
-        conn = get_db_connection()
-        if conn:
+        with db_connection() as conn:
+            if not conn:
+                return
             cur = conn.cursor()
             
             # Check if we have users
@@ -1195,17 +1965,20 @@ def init_db():
                     (session_id, 'therapist', 1, "That's wonderful to hear about the gardening and reconnecting with your friend. These are excellent coping strategies. Have you been practicing any of the mindfulness techniques we discussed in our last session?")
                 ]
                 
-                for msg in sample_messages:
+                for seq, msg in enumerate(sample_messages, 1):
                     cur.execute("""
-                        INSERT INTO chat_messages (session_id, sender_type, sender_id, content, timestamp)
-                        VALUES (%s, %s, %s, %s, NOW())
-                    """, msg)
+                        INSERT INTO chat_messages (session_id, sender_type, sender_id, content, timestamp, session_seq)
+                        VALUES (%s, %s, %s, %s, NOW(), %s)
+                    """, msg + (seq,))
+                cur.execute(
+                    "UPDATE chat_sessions SET message_count = %s WHERE id = %s",
+                    (len(sample_messages), session_id)
+                )
                 
                 conn.commit()
                 print("Sample data created successfully!")
             
             cur.close()
-            conn.close()
     except Exception as e:
         print(f"Error initializing database: {e}")
 
@@ -1224,8 +1997,18 @@ if __name__ == '__main__':
     print("Make sure PostgreSQL is running and database is created")
     print("Backend will run on http://localhost:5000")
     
+    # Open the minimum number of pooled connections up front
+    db_pool.prefill()
+    upgrade_schema()
+    
     # Initialize sample data (optional)
     # init_db()
     
+    # The reloader re-runs this file in a child that serves; the watcher
+    # process only restarts it and must not pick up jobs itself
+    debug = True
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_services()
+
     # Run the app
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    app.run(debug=debug, host='0.0.0.0', port=5000)
\ No newline at end of file
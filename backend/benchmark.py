@@ -0,0 +1,571 @@
+# benchmark.py - Seeded load test for the Flask API
+"""Drive every API route with a concurrent request mix and record latencies.
+
+    python benchmark.py run --users 200 --concurrency 16 --duration 30 --output results/base.json
+    python benchmark.py run --models real --mix therapist
+    python benchmark.py compare results/base.json results/new.json --threshold 10
+
+``run`` creates a throwaway database next to DATABASE_URL's, starts the app
+in a separate server process against it (applying migrations and seeding a
+synthetic dataset), warms up, drops the database again and then reports p50/p95/p99 latency, requests per second and DB statements
+per request for each endpoint. ``--models stub`` swaps the transformer
+pipelines for deterministic stand-ins with a fixed per-batch delay so runs
+are comparable on any machine; ``--models real`` loads the real models.
+"""
+import io
+import os
+import sys
+import json
+import time
+import logging
+import uuid
+import wave
+import random
+import platform
+import threading
+import subprocess
+import tempfile
+import urllib.request
+import urllib.error
+from datetime import datetime
+
+import click
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SENTIMENT_LABELS = ['negative', 'neutral', 'positive']
+EMOTION_LABELS = ['anger', 'disgust', 'fear', 'joy', 'neutral', 'sadness', 'surprise']
+
+SAMPLE_PHRASES = [
+    "I had a really good day with my family",
+    "Feeling anxious about work again",
+    "Slept badly and I'm exhausted",
+    "Went for a walk and it helped a lot",
+    "I don't know why everything feels so heavy lately",
+    "Talked to a friend and felt understood",
+    "The new routine is working, I feel calmer",
+    "I keep worrying about money",
+]
+
+# Relative weights of each scenario per named mix
+MIXES = {
+    'patient': {
+        'dashboard': 30, 'analytics': 8, 'text_message': 12, 'family_feedback': 4, 'energy': 8,
+        'powerup': 8, 'voice_message': 2, 'bulk_ingest': 1, 'mock_data': 1, 'job_status': 3,
+        'create_user': 1, 'health': 1, 'metrics': 1
+    },
+    'therapist': {
+        'chat_sessions': 15, 'chat_sessions_therapist': 10, 'chat_session': 20, 'chat_summary': 8,
+        'chat_message': 20, 'chat_stream': 2, 'session_start': 2, 'session_end': 2,
+        'voice_analysis': 1, 'live_audio': 2, 'job_status': 2, 'analytics': 4, 'health': 1, 'metrics': 1
+    },
+    'mixed': {
+        'dashboard': 20, 'analytics': 6, 'text_message': 8, 'family_feedback': 3, 'energy': 5,
+        'powerup': 5, 'voice_message': 1, 'bulk_ingest': 1, 'mock_data': 1, 'create_user': 1,
+        'chat_sessions': 6, 'chat_sessions_therapist': 4, 'chat_session': 10, 'chat_summary': 4,
+        'chat_message': 10, 'chat_stream': 1, 'session_start': 1, 'session_end': 1,
+        'voice_analysis': 1, 'live_audio': 1, 'job_status': 2, 'health': 1, 'metrics': 1
+    }
+}
+
+
+# ========== STUB MODELS ==========
+
+def _stub_pick(text, labels):
+    return labels[sum(map(ord, text)) % len(labels)]
+
+def build_stub_pipeline(labels, latency_ms):
+    """Pipeline stand-in: deterministic labels, ``latency_ms`` of work per call"""
+    def pipeline(texts, top_k=1, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        time.sleep(latency_ms / 1000.0)
+        results = []
+        for text in texts:
+            chosen = _stub_pick(text, labels)
+            if top_k is None:
+                rest = (1.0 - 0.7) / (len(labels) - 1)
+                results.append([{'label': label, 'score': 0.7 if label == chosen else rest} for label in labels])
+            else:
+                results.append({'label': chosen, 'score': 0.7})
+        return results[0] if single else results
+    return pipeline
+
+
+# ========== REQUEST SCENARIOS ==========
+
+def _wav_bytes(seconds=1.0, sr=16000):
+    t = np.arange(int(seconds * sr)) / sr
+    tone = (0.2 * np.sin(2 * np.pi * 180 * t) * 32767).astype('<i2')
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sr)
+        f.writeframes(tone.tobytes())
+    return buffer.getvalue()
+
+def _pcm_chunks(seconds=3.0, sr=16000, chunk_seconds=0.25):
+    """Raw s16le call audio as a list of chunks (sent with chunked transfer encoding)"""
+    t = np.arange(int(seconds * sr)) / sr
+    pcm = (0.2 * np.sin(2 * np.pi * 180 * t) * 32767).astype('<i2').tobytes()
+    step = int(chunk_seconds * sr) * 2
+    return [pcm[i:i + step] for i in range(0, len(pcm), step)]
+
+def _multipart(fields, files):
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name, value in fields.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, content) in files.items():
+        body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                   f'Content-Type: audio/wav\r\n\r\n'.encode())
+        body.write(content)
+        body.write(b'\r\n')
+    body.write(f'--{boundary}--\r\n'.encode())
+    return body.getvalue(), f'multipart/form-data; boundary={boundary}'
+
+
+class Workload:
+    """Builds requests for each scenario from the seeded ids.
+
+    Also tracks ids created during the run (sessions to end or stream call
+    audio into, jobs to poll), shared by all worker threads.
+    """
+
+    def __init__(self, seeded, audio_seconds=1.0):
+        self.user_ids = seeded['user_ids']
+        self.session_ids = seeded['session_ids']
+        self.therapist_ids = seeded['therapist_ids']
+        self.audio = _wav_bytes(audio_seconds)
+        self.call_audio = _pcm_chunks()
+        self._lock = threading.Lock()
+        self._open_sessions = []
+        self._job_ids = []
+
+    def _text(self, rng):
+        return f"{rng.choice(SAMPLE_PHRASES)} ({rng.randrange(1_000_000)})"
+
+    def build(self, scenario, rng):
+        """Return (endpoint name, method, path, body, content type, options) or None to skip"""
+        user_id = rng.choice(self.user_ids)
+        session_id = rng.choice(self.session_ids)
+
+        if scenario == 'health':
+            return 'GET /api/health', 'GET', '/api/health', None
+        if scenario == 'metrics':
+            return 'GET /api/metrics', 'GET', '/api/metrics', None
+        if scenario == 'create_user':
+            return 'POST /api/users', 'POST', '/api/users', {
+                'name': 'Bench user', 'email': f'bench-{uuid.uuid4().hex}@example.invalid'}
+        if scenario == 'dashboard':
+            return 'GET /api/users/<id>/dashboard', 'GET', f'/api/users/{user_id}/dashboard', None
+        if scenario == 'analytics':
+            return 'GET /api/users/<id>/analytics', 'GET', f'/api/users/{user_id}/analytics', None
+        if scenario == 'text_message':
+            return 'POST /api/text-message', 'POST', '/api/text-message', {
+                'user_id': user_id, 'message': self._text(rng), 'type': 'manual_input'}
+        if scenario == 'family_feedback':
+            return 'POST /api/family-feedback', 'POST', '/api/family-feedback', {
+                'user_id': user_id, 'feedback': self._text(rng), 'relationship': rng.choice(['family', 'friend'])}
+        if scenario == 'energy':
+            return 'POST /api/users/<id>/energy', 'POST', f'/api/users/{user_id}/energy', {
+                'energy_level': rng.randint(1, 5)}
+        if scenario == 'powerup':
+            return 'POST /api/users/<id>/powerups', 'POST', f'/api/users/{user_id}/powerups', {
+                'activity_type': rng.choice(['breathing', 'gratitude', 'connection'])}
+        if scenario == 'mock_data':
+            return 'POST /api/generate-mock-data/<id>', 'POST', f'/api/generate-mock-data/{user_id}', {}
+        if scenario == 'bulk_ingest':
+            return 'POST /api/users/<id>/bulk-ingest', 'POST', f'/api/users/{user_id}/bulk-ingest', {
+                'items': [self._text(rng) for _ in range(20)], 'type': 'journal'}
+        if scenario == 'voice_message':
+            return 'POST /api/voice-message', 'POST', '/api/voice-message', _multipart(
+                {'user_id': user_id}, {'voice_file': ('bench.wav', self.audio)})
+        if scenario == 'chat_sessions':
+            return 'GET /api/chat/sessions', 'GET', '/api/chat/sessions?limit=20', None
+        if scenario == 'chat_sessions_therapist':
+            return ('GET /api/chat/sessions?therapist_id', 'GET',
+                    f'/api/chat/sessions?limit=20&therapist_id={rng.choice(self.therapist_ids)}', None)
+        if scenario == 'chat_session':
+            return 'GET /api/chat/session/<id>', 'GET', f'/api/chat/session/{session_id}?limit=50', None
+        if scenario == 'chat_summary':
+            return ('GET /api/chat/session/<id>?view=summary', 'GET',
+                    f'/api/chat/session/{session_id}?view=summary', None)
+        if scenario == 'chat_message':
+            sender_type = rng.choice(['patient', 'therapist'])
+            return 'POST /api/chat/session/<id>/message', 'POST', f'/api/chat/session/{session_id}/message', {
+                'content': self._text(rng), 'sender_type': sender_type,
+                'sender_id': user_id if sender_type == 'patient' else 1}
+        if scenario == 'chat_stream':
+            # Time to the first replayed event, then disconnect
+            return ('GET /api/chat/session/<id>/stream', 'GET',
+                    f'/api/chat/session/{session_id}/stream?last_event_id=0', None, {'stream': True})
+        if scenario == 'session_start':
+            return 'POST /api/chat/session/start', 'POST', '/api/chat/session/start', {
+                'patient_id': user_id, 'therapist_id': rng.choice(self.therapist_ids)}
+        if scenario == 'session_end':
+            with self._lock:
+                if not self._open_sessions:
+                    return None
+                started = self._open_sessions.pop()
+            return 'POST /api/chat/session/<id>/end', 'POST', f'/api/chat/session/{started}/end', {
+                'duration_minutes': rng.randint(10, 50)}
+        if scenario == 'voice_analysis':
+            return 'POST /api/chat/voice-analysis', 'POST', '/api/chat/voice-analysis', _multipart(
+                {'session_id': session_id}, {'audio_file': ('bench.wav', self.audio)})
+        if scenario == 'live_audio':
+            # One call at a time per session; the session goes back once the call ends
+            with self._lock:
+                if not self._open_sessions:
+                    return None
+                started = self._open_sessions.pop()
+            return ('POST /api/chat/session/<id>/live-audio', 'POST',
+                    f'/api/chat/session/{started}/live-audio?format=s16le&sample_rate=16000',
+                    (self.call_audio, 'application/octet-stream'), {'call_session': started})
+        if scenario == 'job_status':
+            with self._lock:
+                if not self._job_ids:
+                    return None
+                job_id = rng.choice(self._job_ids)
+            return 'GET /api/jobs/<id>', 'GET', f'/api/jobs/{job_id}', None
+        raise ValueError(f"Unknown scenario {scenario}")
+
+    def observe(self, name, payload, options=None):
+        """Remember ids created by a response for later scenarios"""
+        if options and options.get('call_session'):
+            with self._lock:
+                self._open_sessions.append(options['call_session'])
+        if not isinstance(payload, dict):
+            return
+        with self._lock:
+            if payload.get('job_id'):
+                self._job_ids.append(payload['job_id'])
+                del self._job_ids[:-1000]
+            if name == 'POST /api/chat/session/start' and payload.get('session_id'):
+                self._open_sessions.append(payload['session_id'])
+
+
+# ========== DRIVER ==========
+
+def send(base_url, method, path, body=None, stream=False, timeout=60):
+    """Issue one request; returns (status, db statement count, parsed JSON or None)"""
+    headers = {}
+    data = None
+    if isinstance(body, tuple):
+        data, headers['Content-Type'] = body
+    elif body is not None:
+        data = json.dumps(body).encode()
+        headers['Content-Type'] = 'application/json'
+    req = urllib.request.Request(base_url + path, data=data, method=method, headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            queries = response.headers.get('X-DB-Queries')
+            if stream:
+                # Read up to the end of the first event
+                while response.readline() not in (b'\n', b''):
+                    pass
+                payload = None
+            else:
+                raw = response.read()
+                content_type = response.headers.get('Content-Type') or ''
+                if raw and 'ndjson' in content_type:
+                    payload = [json.loads(line) for line in raw.splitlines() if line]
+                else:
+                    payload = json.loads(raw) if raw and 'json' in content_type else None
+            return response.status, int(queries) if queries else None, payload
+    except urllib.error.HTTPError as e:
+        queries = e.headers.get('X-DB-Queries')
+        e.read()
+        return e.code, int(queries) if queries else None, None
+
+
+def drive(base_url, workload, weights, concurrency, duration, warmup, seed):
+    """Run ``concurrency`` workers for ``warmup + duration`` seconds; returns samples and window"""
+    scenarios = list(weights)
+    cumulative = list(np.cumsum([weights[s] for s in scenarios]))
+    started = time.perf_counter()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+    samples = []
+    samples_lock = threading.Lock()
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        local = []
+        while time.perf_counter() < stop_at:
+            scenario = scenarios[int(np.searchsorted(cumulative, rng.random() * cumulative[-1], side='right'))]
+            spec = workload.build(scenario, rng)
+            if spec is None:
+                continue
+            name, method, path, body = spec[:4]
+            options = spec[4] if len(spec) > 4 else {}
+            t0 = time.perf_counter()
+            try:
+                status, queries, payload = send(base_url, method, path, body, stream=options.get('stream', False))
+            except Exception:
+                status, queries, payload = None, None, None
+            latency = time.perf_counter() - t0
+            workload.observe(name, payload, options)
+            if t0 >= measure_from:
+                local.append((name, status, latency, queries))
+        with samples_lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    measured = max(time.perf_counter() - measure_from, 1e-9)
+    return samples, measured
+
+
+def summarize(samples, measured_seconds):
+    """Per-endpoint and overall latency/throughput statistics"""
+    def stats(rows):
+        latencies = np.array([row[2] for row in rows]) * 1000.0
+        queries = [row[3] for row in rows if row[3] is not None]
+        errors = sum(1 for row in rows if row[1] is None or row[1] >= 400)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        return {
+            'requests': len(rows),
+            'errors': errors,
+            'rps': round(len(rows) / measured_seconds, 2),
+            'latency_ms': {
+                'mean': round(float(latencies.mean()), 3),
+                'p50': round(float(p50), 3),
+                'p95': round(float(p95), 3),
+                'p99': round(float(p99), 3),
+                'max': round(float(latencies.max()), 3)
+            },
+            'db_queries': {
+                'mean': round(float(np.mean(queries)), 2),
+                'max': int(max(queries))
+            } if queries else None
+        }
+
+    by_endpoint = {}
+    for row in samples:
+        by_endpoint.setdefault(row[0], []).append(row)
+    return {
+        'overall': stats(samples) if samples else None,
+        'endpoints': {name: stats(rows) for name, rows in sorted(by_endpoint.items())}
+    }
+
+
+def create_database(dsn):
+    """Create an empty, uniquely named database on the server ``dsn`` points at; returns its DSN"""
+    import psycopg2
+    from psycopg2 import extensions, sql
+
+    name = f'bench_{uuid.uuid4().hex[:12]}'
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(name)))
+    finally:
+        conn.close()
+    return extensions.make_dsn(dsn, dbname=name)
+
+
+def drop_database(dsn, bench_dsn):
+    """Drop the database created by create_database (its server must have exited)"""
+    import psycopg2
+    from psycopg2 import extensions, sql
+
+    name = extensions.parse_dsn(bench_dsn)['dbname']
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("DROP DATABASE IF EXISTS {}").format(sql.Identifier(name)))
+    finally:
+        conn.close()
+
+
+def _git_revision():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=BACKEND_DIR, text=True).strip()
+        dirty = bool(subprocess.check_output(['git', 'status', '--porcelain'], cwd=BACKEND_DIR, text=True).strip())
+        return {'commit': commit, 'dirty': dirty}
+    except Exception:
+        return {'commit': None, 'dirty': None}
+
+
+def print_report(result):
+    click.echo(f"{'endpoint':<44} {'reqs':>6} {'err':>4} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'queries':>7}")
+    rows = list(result['endpoints'].items()) + [('TOTAL', result['overall'])]
+    for name, row in rows:
+        if row is None:
+            continue
+        queries = row['db_queries']['mean'] if row['db_queries'] else '-'
+        latency = row['latency_ms']
+        click.echo(f"{name:<44} {row['requests']:>6} {row['errors']:>4} {row['rps']:>8} "
+                   f"{latency['p50']:>8} {latency['p95']:>8} {latency['p99']:>8} {queries:>7}")
+
+
+# ========== CLI ==========
+
+@click.group()
+def cli():
+    """API load test and benchmark tools"""
+
+
+@cli.command()
+@click.option('--port', type=int, default=0)
+@click.option('--models', type=click.Choice(['stub', 'real']), default='stub')
+@click.option('--stub-latency-ms', type=float, default=5.0)
+@click.option('--users', type=int, default=200)
+@click.option('--entries-per-user', type=int, default=40)
+@click.option('--sessions-per-user', type=int, default=3)
+@click.option('--messages-per-session', type=int, default=20)
+def serve(port, models, stub_latency_ms, users, entries_per_user, sessions_per_user, messages_per_session):
+    """(internal) Seed the database and serve the app; prints one JSON line when ready"""
+    os.environ['QUERY_COUNT_HEADER'] = '1'
+    os.environ['MODEL_LOADING'] = 'eager'  # loaded by start_background_services below
+    sys.path.insert(0, BACKEND_DIR)
+    import app as backend
+    import migrate
+    from models import PipelineAnalyzer
+    from werkzeug.serving import make_server
+
+    if models == 'stub':
+        backend.model_loader.factories = {
+            'analyzer': lambda: PipelineAnalyzer(build_stub_pipeline(SENTIMENT_LABELS, stub_latency_ms),
+                                                 build_stub_pipeline(EMOTION_LABELS, stub_latency_ms))
+        }
+    backend.start_background_services()
+    if not backend.model_loader.is_ready:
+        raise click.ClickException(f"Models failed to load: {backend.model_loader.error}")
+
+    backend.upgrade_schema()
+    with backend.db_connection() as conn:
+        if not conn:
+            raise click.ClickException('Database connection failed')
+        cur = conn.cursor()
+        seeded = migrate.seed_dataset(cur, f'bench-{uuid.uuid4().hex[:12]}', users, entries_per_user,
+                                      sessions_per_user, messages_per_session)
+        conn.commit()
+        cur.close()
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)  # no per-request access log
+    server = make_server('127.0.0.1', port, backend.app, threaded=True)
+    print(json.dumps({'port': server.server_port, 'seeded': seeded}), flush=True)
+    server.serve_forever()
+
+
+@cli.command()
+@click.option('--models', type=click.Choice(['stub', 'real']), default='stub', help='Stand-in or real transformer pipelines')
+@click.option('--stub-latency-ms', type=float, default=5.0, help='Simulated model time per batch in stub mode')
+@click.option('--mix', type=click.Choice(sorted(MIXES)), default='mixed', help='Request mix to replay')
+@click.option('--users', type=int, default=200, help='Users to seed')
+@click.option('--entries-per-user', type=int, default=40, help='Text entries (with analyses) per seeded user')
+@click.option('--sessions-per-user', type=int, default=3, help='Chat sessions per seeded user')
+@click.option('--messages-per-session', type=int, default=20, help='Messages per seeded chat session')
+@click.option('--concurrency', type=int, default=8, help='Concurrent client threads')
+@click.option('--duration', type=float, default=30.0, help='Measured seconds')
+@click.option('--warmup', type=float, default=5.0, help='Unmeasured seconds before measuring')
+@click.option('--seed', type=int, default=1, help='Random seed for the request sequence')
+@click.option('--output', type=click.Path(dir_okay=False), default=None, help='Write JSON results here')
+def run(models, stub_latency_ms, mix, users, entries_per_user, sessions_per_user, messages_per_session,
+        concurrency, duration, warmup, seed, output):
+    """Seed a throwaway database, start the API and measure it under load"""
+    if not os.environ.get('DATABASE_URL'):
+        raise click.ClickException('Set DATABASE_URL to the server to benchmark against')
+    workdir = tempfile.mkdtemp(prefix='bench-')
+    command = [
+        sys.executable, os.path.abspath(__file__), 'serve', '--models', models,
+        '--stub-latency-ms', str(stub_latency_ms), '--users', str(users),
+        '--entries-per-user', str(entries_per_user), '--sessions-per-user', str(sessions_per_user),
+        '--messages-per-session', str(messages_per_session)
+    ]
+    bench_dsn = create_database(os.environ['DATABASE_URL'])
+    click.echo(f"Seeding {users} users and starting the API ({models} models) in {workdir}...")
+    server = subprocess.Popen(command, cwd=workdir, stdout=subprocess.PIPE, text=True,
+                              env={**os.environ, 'DATABASE_URL': bench_dsn})
+    try:
+        ready = None
+        for line in server.stdout:
+            if line.startswith('{'):
+                ready = json.loads(line)
+                break
+        if ready is None:
+            raise click.ClickException('API server exited before it was ready')
+        # Keep draining the server's output so it never blocks on a full pipe
+        threading.Thread(target=lambda: server.stdout.read(), daemon=True).start()
+
+        base_url = f"http://127.0.0.1:{ready['port']}"
+        workload = Workload(ready['seeded'])
+        click.echo(f"Driving {mix} mix with {concurrency} clients for {warmup:g}s warmup + {duration:g}s...")
+        samples, measured = drive(base_url, workload, MIXES[mix], concurrency, duration, warmup, seed)
+        _, _, server_stats = send(base_url, 'GET', '/api/health')
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+        drop_database(os.environ['DATABASE_URL'], bench_dsn)
+
+    result = {
+        'meta': {
+            **_git_revision(),
+            'timestamp': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'measured_seconds': round(measured, 3),
+            'config': {
+                'models': models, 'stub_latency_ms': stub_latency_ms if models == 'stub' else None,
+                'mix': mix, 'users': users, 'entries_per_user': entries_per_user,
+                'sessions_per_user': sessions_per_user, 'messages_per_session': messages_per_session,
+                'concurrency': concurrency, 'duration': duration, 'warmup': warmup, 'seed': seed
+            }
+        },
+        **summarize(samples, measured),
+        'server': server_stats
+    }
+    print_report(result)
+    if output:
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(result, f, indent=2, default=str)
+        click.echo(f"Results written to {output}")
+
+
+@cli.command()
+@click.argument('baseline', type=click.Path(exists=True, dir_okay=False))
+@click.argument('candidate', type=click.Path(exists=True, dir_okay=False))
+@click.option('--metric', type=click.Choice(['p50', 'p95', 'p99', 'mean']), default='p95')
+@click.option('--threshold', type=float, default=None, help='Exit non-zero if any endpoint slows down by more than this percent')
+def compare(baseline, candidate, metric, threshold):
+    """Diff two saved results per endpoint"""
+    with open(baseline) as f:
+        old = json.load(f)
+    with open(candidate) as f:
+        new = json.load(f)
+
+    click.echo(f"{'endpoint':<44} {'old ' + metric:>10} {'new ' + metric:>10} {'change':>8} {'old rps':>8} {'new rps':>8}")
+    regressions = []
+    for name in sorted(set(old['endpoints']) | set(new['endpoints'])):
+        before = old['endpoints'].get(name)
+        after = new['endpoints'].get(name)
+        if not before or not after:
+            click.echo(f"{name:<44} {'only in ' + ('candidate' if after else 'baseline'):>21}")
+            continue
+        a = before['latency_ms'][metric]
+        b = after['latency_ms'][metric]
+        change = (b - a) / a * 100.0 if a else 0.0
+        if threshold is not None and change > threshold:
+            regressions.append(name)
+        click.echo(f"{name:<44} {a:>10} {b:>10} {change:>+7.1f}% {before['rps']:>8} {after['rps']:>8}")
+    if regressions:
+        raise click.ClickException(f"{metric} regressed by more than {threshold}% on: {', '.join(regressions)}")
+
+
+if __name__ == '__main__':
+    cli()
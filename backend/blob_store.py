@@ -0,0 +1,115 @@
+# blob_store.py - Content-addressed storage and memoized analysis for voice uploads
+import os
+import json
+import time
+import logging
+
+REGISTER_SQL = """
+INSERT INTO voice_blobs (sha256, file_path, size_bytes, duration)
+VALUES (%(sha256)s, %(file_path)s, %(size)s, %(duration)s)
+ON CONFLICT (sha256) DO UPDATE SET last_used_at = NOW()
+"""
+
+CACHED_ANALYSIS_SQL = "SELECT analysis FROM voice_blobs WHERE sha256 = %(sha256)s AND analysis_version = %(version)s"
+
+
+class BlobStore:
+    """Uploads filed under ``root/ab/cd/<sha256><suffix>``.
+
+    Two levels of two hex digits keep any one directory to a few hundred
+    entries even with millions of blobs. Identical content always maps to
+    the same path, so a re-upload costs a hash and a rename check instead
+    of another copy on disk.
+    """
+
+    def __init__(self, root, suffix='.wav'):
+        self.root = root
+        self.suffix = suffix
+
+    def path_for(self, sha256):
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256 + self.suffix)
+
+    def adopt(self, upload):
+        """File a finished ``StreamedUpload``; returns (path, stored) where
+        ``stored`` is False when identical content was already there"""
+        path = self.path_for(upload.sha256)
+        if os.path.exists(path):
+            upload.discard()
+            # Tell gc that the blob is in use again before its row is updated
+            os.utime(path)
+            return path, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Racing uploads of the same content rename identical bytes; either wins
+        upload.commit(path)
+        return path, True
+
+    def iter_paths(self):
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith(self.suffix):
+                    yield os.path.join(directory, filename)
+
+
+def register(cur, upload, file_path):
+    """Ensure the blob has a row (``upload`` is ``StreamedUpload.info()``).
+
+    It counts as referenced once a ``user_data`` row pointing at
+    ``file_path`` is inserted; the triggers from migration 0007 do that.
+    """
+    cur.execute(REGISTER_SQL, {**upload, 'file_path': file_path})
+
+
+def cached_analysis(cur, sha256, version):
+    """The memoized analysis of this content by ``version``, or None"""
+    cur.execute(CACHED_ANALYSIS_SQL, {'sha256': sha256, 'version': version})
+    row = cur.fetchone()
+    return row['analysis'] if row else None
+
+
+def store_analysis(cur, sha256, analysis, version):
+    cur.execute(
+        "UPDATE voice_blobs SET analysis = %s::jsonb, analysis_version = %s WHERE sha256 = %s",
+        (json.dumps(analysis), version, sha256)
+    )
+
+
+def collect_garbage(cur, store, grace_seconds=3600):
+    """Delete blobs nobody references any more, plus files that never got a row.
+
+    Anything used within ``grace_seconds`` is kept, so an upload whose
+    analysis job has not registered it yet is never removed.
+    Returns (blobs removed, bytes freed).
+    """
+    cutoff = time.time() - grace_seconds
+    cur.execute("""
+        SELECT sha256, file_path, size_bytes FROM voice_blobs
+        WHERE ref_count <= 0 AND last_used_at < NOW() - make_interval(secs => %s)
+        FOR UPDATE SKIP LOCKED
+    """, (grace_seconds,))
+    removed, freed = 0, 0
+    for row in cur.fetchall():
+        try:
+            if os.path.getmtime(row['file_path']) >= cutoff:
+                continue  # re-uploaded since; its job will reference it
+            os.remove(row['file_path'])
+        except FileNotFoundError:
+            pass
+        cur.execute("DELETE FROM voice_blobs WHERE sha256 = %s", (row['sha256'],))
+        removed += 1
+        freed += row['size_bytes']
+
+    cur.execute("SELECT file_path FROM voice_blobs")
+    known = {row['file_path'] for row in cur.fetchall()}
+    for path in store.iter_paths():
+        if path in known:
+            continue
+        try:
+            if os.path.getmtime(path) < cutoff:
+                freed += os.path.getsize(path)
+                os.remove(path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+    if removed:
+        logging.info(f"Removed {removed} unreferenced voice blobs ({freed} bytes)")
+    return removed, freed
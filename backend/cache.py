@@ -0,0 +1,186 @@
+# cache.py - Bounded LRU/TTL cache with an optional on-disk tier
+import threading
+import time
+import json
+import hashlib
+import sqlite3
+import logging
+import unicodedata
+from collections import OrderedDict
+
+
+def normalize_text(text):
+    """Normalize text before hashing so trivially different inputs share a key"""
+    text = unicodedata.normalize('NFC', text or '')
+    return ' '.join(text.split())
+
+def content_key(text, namespace=''):
+    """Content-addressed key: hash of the namespace (e.g. model identity) and normalized text"""
+    digest = hashlib.sha256()
+    digest.update(namespace.encode('utf-8'))
+    digest.update(b'\x00')
+    digest.update(normalize_text(text).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after ``ttl`` seconds.
+
+    Values must be JSON serializable when ``disk_path`` is set; the disk tier
+    is a small SQLite file that survives restarts and is consulted on a
+    memory miss.
+
+    Invalidation counters are kept per hash bucket rather than per key, so
+    they take fixed memory; invalidating a key also voids in-flight fills of
+    the few other keys in its bucket, which just skip caching that once.
+    """
+
+    GENERATION_BUCKETS = 4096
+
+    def __init__(self, max_entries=10000, ttl=3600, disk_path=None, disk_max_entries=100000):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl) if ttl else None
+        self.disk_max_entries = int(disk_max_entries)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._generations = [0] * self.GENERATION_BUCKETS
+        self._disk = None
+        self._disk_writes = 0
+        if disk_path:
+            self._open_disk(disk_path)
+
+    def _open_disk(self, path):
+        try:
+            self._disk = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+        except Exception as e:
+            logging.error(f"Error opening disk cache at {path}: {e}")
+            self._disk = None
+
+    def _expiry(self):
+        return time.time() + self.ttl if self.ttl else None
+
+    def get(self, key, default=None):
+        """Return the cached value or ``default``"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return value
+                del self._entries[key]
+                self._expirations += 1
+
+            if self._disk is not None:
+                row = self._disk.execute(
+                    "SELECT value, expires_at FROM cache_entries WHERE key = ?", (key,)
+                ).fetchone()
+                if row and (row[1] is None or row[1] > now):
+                    value = json.loads(row[0])
+                    self._store(key, value, row[1])
+                    self._disk_hits += 1
+                    return value
+                if row:
+                    self._disk.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+                    self._expirations += 1
+
+            self._misses += 1
+            return default
+
+    def set(self, key, value):
+        """Insert or replace a value, evicting least recently used entries"""
+        with self._lock:
+            self._set_locked(key, value)
+
+    def delete(self, key):
+        """Drop a key from both tiers"""
+        with self._lock:
+            self._delete_locked(key)
+
+    def generation(self, key):
+        """Invalidation counter for ``key``; read it before computing a value to cache"""
+        with self._lock:
+            return self._generations[self._bucket(key)]
+
+    def invalidate(self, key):
+        """Delete ``key`` and make in-flight fills that started earlier a no-op"""
+        with self._lock:
+            self._generations[self._bucket(key)] += 1
+            self._delete_locked(key)
+
+    def set_if_current(self, key, value, generation):
+        """Store ``value`` only if ``key`` was not invalidated since ``generation``"""
+        # Checked and stored under one hold, so an invalidate cannot slip in between
+        with self._lock:
+            if self._generations[self._bucket(key)] != generation:
+                return False
+            self._set_locked(key, value)
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM cache_entries")
+
+    def stats(self):
+        """Hit/miss/eviction counters"""
+        lookups = self._hits + self._disk_hits + self._misses
+        return {
+            'size': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl,
+            'hits': self._hits,
+            'disk_hits': self._disk_hits,
+            'misses': self._misses,
+            'evictions': self._evictions,
+            'expirations': self._expirations,
+            'hit_rate': round((self._hits + self._disk_hits) / lookups, 4) if lookups else 0.0,
+            'disk_tier': self._disk is not None
+        }
+
+    def _bucket(self, key):
+        return hash(key) % len(self._generations)
+
+    def _set_locked(self, key, value):
+        expires_at = self._expiry()
+        self._store(key, value, expires_at)
+        if self._disk is not None:
+            self._disk.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at)
+            )
+            self._disk_writes += 1
+            if self._disk_writes % 1000 == 0:
+                self._prune_disk()
+
+    def _delete_locked(self, key):
+        self._entries.pop(key, None)
+        if self._disk is not None:
+            self._disk.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+    def _store(self, key, value, expires_at):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def _prune_disk(self):
+        self._disk.execute("DELETE FROM cache_entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+        self._disk.execute(
+            """DELETE FROM cache_entries WHERE key IN (
+                   SELECT key FROM cache_entries ORDER BY expires_at DESC LIMIT -1 OFFSET ?)""",
+            (self.disk_max_entries,)
+        )
@@ -0,0 +1,261 @@
+# db.py - Thread-safe PostgreSQL connection pool
+import threading
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.extras import RealDictCursor
+
+
+_query_counts = threading.local()
+
+
+def reset_query_count():
+    """Start counting statements for the current thread (e.g. per request)"""
+    _query_counts.value = 0
+
+
+def query_count():
+    """Statements executed by the current thread since the last reset"""
+    return getattr(_query_counts, 'value', 0)
+
+
+class CountingCursor(RealDictCursor):
+    """RealDictCursor that counts every statement sent from the current thread"""
+
+    def execute(self, query, vars=None):
+        _query_counts.value = getattr(_query_counts, 'value', 0) + 1
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        _query_counts.value = getattr(_query_counts, 'value', 0) + 1
+        return super().executemany(query, vars_list)
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection became available within the checkout timeout"""
+
+
+class ConnectionPool:
+    """Pool of psycopg2 connections shared by all Flask worker threads.
+
+    Connections are opened on demand up to ``max_size``; callers beyond that
+    wait up to ``checkout_timeout`` seconds. Idle connections are validated
+    with ``SELECT 1`` on checkout once they have been idle for more than
+    ``health_check_interval`` seconds (0 checks on every checkout), and
+    surplus idle connections above ``min_size`` are closed after
+    ``max_idle`` seconds.
+    """
+
+    def __init__(self, connect, min_size=1, max_size=10, checkout_timeout=5.0,
+                 health_check_interval=30.0, max_idle=300.0):
+        self._connect = connect
+        self.min_size = max(0, int(min_size))
+        self.max_size = max(1, int(max_size), self.min_size)
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self.max_idle = max_idle
+        self._idle = deque()  # (conn, returned_at)
+        self._size = 0
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._closed = False
+
+        # Metrics
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._health_check_failures = 0
+        self._peak_in_use = 0
+
+    def prefill(self):
+        """Open ``min_size`` connections up front (best effort)"""
+        opened = []
+        try:
+            while self._size + len(opened) < self.min_size:
+                opened.append(self._connect())
+        except Exception as e:
+            logging.error(f"Error pre-filling connection pool: {e}")
+        with self._cond:
+            for conn in opened:
+                self._idle.append((conn, time.monotonic()))
+                self._size += 1
+                self._created += 1
+            self._cond.notify_all()
+
+    def getconn(self, timeout=None):
+        """Check out a healthy connection, waiting if the pool is saturated"""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        started = time.perf_counter()
+        deadline = time.monotonic() + timeout
+        waited = False
+
+        while True:
+            conn = None
+            idle_since = None
+            with self._cond:
+                if self._closed:
+                    raise psycopg2.InterfaceError("connection pool is closed")
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(f"no database connection available after {timeout}s")
+                    waited = True
+                    self._cond.wait(remaining)
+                if self._idle:
+                    conn, idle_since = self._idle.pop()
+                self._size += 0 if conn else 1
+                self._in_use += 1
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._in_use -= 1
+                        self._cond.notify()
+                    raise
+                self._created += 1
+            elif not self._is_healthy(conn, idle_since):
+                self._health_check_failures += 1
+                self._discard(conn)
+                continue
+
+            wait = time.perf_counter() - started
+            with self._cond:
+                self._checkouts += 1
+                self._peak_in_use = max(self._peak_in_use, self._in_use)
+                if waited:
+                    self._waits += 1
+                self._wait_seconds += wait
+                self._max_wait_seconds = max(self._max_wait_seconds, wait)
+            return conn
+
+    def putconn(self, conn, discard=False):
+        """Return a connection; broken or dirty connections are closed instead"""
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                discard = True
+        if discard or conn.closed:
+            self._discard(conn)
+            return
+
+        now = time.monotonic()
+        to_close = []
+        with self._cond:
+            self._in_use -= 1
+            if self._closed:
+                self._size -= 1
+                to_close.append(conn)
+            else:
+                self._idle.append((conn, now))
+                # Trim connections idle longer than max_idle, keeping min_size open
+                while (self._idle and self._size > self.min_size
+                       and now - self._idle[0][1] > self.max_idle):
+                    to_close.append(self._idle.popleft()[0])
+                    self._size -= 1
+            self._cond.notify()
+        for stale in to_close:
+            self._close_quietly(stale)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a ``with`` block.
+
+        The connection is always returned to the pool; an exception inside
+        the block rolls back the open transaction first.
+        """
+        with self.lease(self.getconn()) as conn:
+            yield conn
+
+    @contextmanager
+    def lease(self, conn):
+        """Return ``conn`` (taken with ``getconn``) when the block exits.
+
+        An exception inside the block rolls back the open transaction and is
+        re-raised as is; if the rollback fails too, the connection is broken
+        and gets closed instead of going back to the pool.
+        """
+        discard = False
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            self._close_quietly(conn)
+
+    def stats(self):
+        """Pool size, saturation and wait-time metrics"""
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'saturation': round(self._in_use / self.max_size, 4),
+                'peak_in_use': self._peak_in_use,
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'timeouts': self._timeouts,
+                'wait_seconds_total': round(self._wait_seconds, 6),
+                'wait_seconds_avg': round(self._wait_seconds / self._checkouts, 6) if self._checkouts else 0.0,
+                'wait_seconds_max': round(self._max_wait_seconds, 6),
+                'created': self._created,
+                'discarded': self._discarded,
+                'health_check_failures': self._health_check_failures
+            }
+
+    def _is_healthy(self, conn, idle_since):
+        if conn.closed:
+            return False
+        if idle_since is not None and time.monotonic() - idle_since < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, conn):
+        with self._cond:
+            self._size -= 1
+            self._in_use -= 1
+            self._discarded += 1
+            self._cond.notify()
+        self._close_quietly(conn)
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
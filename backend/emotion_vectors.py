@@ -0,0 +1,58 @@
+# emotion_vectors.py - Fixed-order emotion probability vectors stored as packed float32
+import numpy as np
+
+# Class order of the emotion model; stored vectors always use this order
+EMOTION_LABELS = ('anger', 'disgust', 'fear', 'joy', 'neutral', 'sadness', 'surprise')
+EMOTION_COLORS = {
+    'anger': 'bg-red-500', 'disgust': 'bg-green-600', 'fear': 'bg-purple-500', 'joy': 'bg-green-500',
+    'neutral': 'bg-gray-500', 'sadness': 'bg-blue-500', 'surprise': 'bg-yellow-500'
+}
+
+DTYPE = np.dtype('<f4')
+VECTOR_BYTES = len(EMOTION_LABELS) * DTYPE.itemsize  # 28 bytes per analysis
+_INDEX = {label: i for i, label in enumerate(EMOTION_LABELS)}
+
+
+def from_scores(scores):
+    """Vector from a {label: probability} dict; labels outside EMOTION_LABELS are ignored"""
+    vector = np.zeros(len(EMOTION_LABELS), dtype=DTYPE)
+    for label, score in scores.items():
+        index = _INDEX.get(label.lower())
+        if index is not None:
+            vector[index] = score
+    return vector
+
+
+def pack(scores):
+    """bytea value for an analysis' ``emotion_scores`` (None when there are none)"""
+    if not scores:
+        return None
+    return from_scores(scores).tobytes()
+
+
+def unpack_many(blobs):
+    """(n, labels) matrix from stored vectors, skipping NULLs, without a per-row loop"""
+    present = [blob for blob in blobs if blob is not None]
+    if not present:
+        return np.zeros((0, len(EMOTION_LABELS)), dtype=DTYPE)
+    return np.frombuffer(b''.join(present), dtype=DTYPE).reshape(-1, len(EMOTION_LABELS))
+
+
+def breakdowns(matrix):
+    """Chart breakdown per row: [{'emotion', 'percentage', 'color'}, ...] sorted descending"""
+    matrix = matrix.astype(np.float64)
+    totals = matrix.sum(axis=1, keepdims=True)
+    percentages = np.round(100.0 * matrix / np.where(totals > 0, totals, 1.0), 1)
+    order = np.argsort(-percentages, axis=1, kind='stable')
+    return [
+        [{'emotion': EMOTION_LABELS[i].title(), 'percentage': float(row[i]), 'color': EMOTION_COLORS[EMOTION_LABELS[i]]}
+         for i in indices]
+        for row, indices in zip(percentages, order)
+    ]
+
+
+def mean_breakdown(matrix):
+    """Breakdown of the average distribution over all rows (None when there are none)"""
+    if not len(matrix):
+        return None
+    return breakdowns(matrix.mean(axis=0, keepdims=True))[0]
@@ -0,0 +1,198 @@
+# events.py - In-process publish/subscribe for live chat session updates
+import json
+import queue
+import time
+import select
+import logging
+import threading
+from collections import deque, OrderedDict
+
+
+# Postgres channel carrying chat message events between server processes
+NOTIFY_CHANNEL = 'session_events'
+# NOTIFY rejects payloads of 8000 bytes or more; larger events send only their ids
+NOTIFY_PAYLOAD_LIMIT = 7900
+
+
+class SessionEventBroker:
+    """Fans out chat session events to Server-Sent Events subscribers.
+
+    The broker only reaches subscribers in its own process. Message events
+    are sent with ``notify`` inside the writing transaction and published
+    here by a ``NotifyListener``, so every process sees them, in commit
+    order. Events published directly (live call estimates) stay local.
+
+    Each session keeps a bounded buffer of recent events so a reconnecting
+    client can resume from the last event id it saw without touching the
+    database; older gaps are left to the caller to backfill. A buffer is
+    dropped once nobody is subscribed and its newest event is older than
+    ``replay_window`` seconds, so ended sessions don't accumulate.
+    """
+
+    def __init__(self, buffer_size=200, subscriber_queue_size=1000, replay_window=300):
+        self.buffer_size = buffer_size
+        self.subscriber_queue_size = subscriber_queue_size
+        self.replay_window = replay_window
+        self._lock = threading.Lock()
+        self._buffers = OrderedDict()  # session_id -> (time of newest event, deque of events), oldest first
+        self._subscribers = {}         # session_id -> set of queues
+        self._published = 0
+        self._dropped = 0
+
+    def publish(self, session_id, event_type, data, event_id=None):
+        """Send an event to everyone watching ``session_id``"""
+        event = {'id': event_id, 'type': event_type, 'data': data}
+        with self._lock:
+            if event_id is not None:
+                _, buffer = self._buffers.pop(session_id, (None, None))
+                if buffer is None:
+                    buffer = deque(maxlen=self.buffer_size)
+                buffer.append(event)
+                self._buffers[session_id] = (time.monotonic(), buffer)
+            self._expire_buffers()
+            subscribers = list(self._subscribers.get(session_id, ()))
+            self._published += 1
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                # Slow client; it will resync from the buffer/DB on reconnect
+                self._dropped += 1
+
+    def subscribe(self, session_id):
+        subscriber = queue.Queue(maxsize=self.subscriber_queue_size)
+        with self._lock:
+            self._subscribers.setdefault(session_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, session_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(session_id)
+            if subscribers:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[session_id]
+            self._expire_buffers()
+
+    def replay(self, session_id, last_event_id):
+        """Buffered events newer than ``last_event_id``.
+
+        Returns None when the buffer no longer reaches back that far, meaning
+        the caller has to backfill from the database.
+        """
+        with self._lock:
+            _, buffer = self._buffers.get(session_id, (None, ()))
+            buffer = list(buffer)
+        # Only trustworthy if the client's last event is still buffered
+        if not buffer or buffer[0]['id'] > last_event_id:
+            return None
+        return [event for event in buffer if event['id'] > last_event_id]
+
+    def _expire_buffers(self):
+        # Called with the lock held; buffers are ordered by their newest event
+        cutoff = time.monotonic() - self.replay_window
+        for session_id, (updated, _) in list(self._buffers.items()):
+            if updated > cutoff:
+                break
+            if session_id not in self._subscribers:
+                del self._buffers[session_id]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'sessions': len(self._buffers),
+                'subscribers': sum(len(s) for s in self._subscribers.values()),
+                'published': self._published,
+                'dropped': self._dropped
+            }
+
+
+def notify(cur, session_id, event_type, data, event_id):
+    """Queue an event for every process's broker. Postgres delivers it
+    when the transaction commits, in commit order, and drops it on rollback."""
+    event = {'session_id': session_id, 'id': event_id, 'type': event_type, 'data': data}
+    payload = json.dumps(event, default=_json_default)
+    if len(payload.encode('utf-8')) > NOTIFY_PAYLOAD_LIMIT:
+        payload = json.dumps({**event, 'data': None})
+    cur.execute("SELECT pg_notify(%s, %s)", (NOTIFY_CHANNEL, payload))
+
+
+class NotifyListener:
+    """Publishes events sent with ``notify`` into the local broker.
+
+    Holds one dedicated connection LISTENing on ``NOTIFY_CHANNEL`` and
+    reconnects after ``reconnect_delay`` seconds if it drops. Events missed
+    while disconnected show up to streams as a gap in the ids, which they
+    backfill from the database. ``load_event(session_id, event_id)``
+    rebuilds the data of events too large to send inline.
+    """
+
+    def __init__(self, connect, broker, load_event, reconnect_delay=5.0, poll_interval=1.0):
+        self.connect = connect
+        self.broker = broker
+        self.load_event = load_event
+        self.reconnect_delay = reconnect_delay
+        self.poll_interval = poll_interval
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='event-listener', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            conn = None
+            try:
+                conn = self.connect()
+                conn.autocommit = True
+                cur = conn.cursor()
+                cur.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                cur.close()
+                while not self._stopped.is_set():
+                    if not select.select([conn], [], [], self.poll_interval)[0]:
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._deliver(conn.notifies.pop(0).payload)
+            except Exception as e:
+                logging.warning(f"Session event listener disconnected: {e}")
+                self._stopped.wait(self.reconnect_delay)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+    def _deliver(self, payload):
+        try:
+            event = json.loads(payload)
+            data = event['data']
+            if data is None:
+                data = self.load_event(event['session_id'], event['id'])
+                if data is None:
+                    return
+            self.broker.publish(event['session_id'], event['type'], data, event_id=event['id'])
+        except Exception as e:
+            logging.error(f"Dropped session event {payload[:200]!r}: {e}")
+
+
+def _json_default(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+def format_sse(event, default=_json_default):
+    """Serialize an event in text/event-stream format"""
+    lines = []
+    if event.get('id') is not None:
+        lines.append(f"id: {event['id']}")
+    if event.get('type'):
+        lines.append(f"event: {event['type']}")
+    payload = json.dumps(event.get('data'), default=default)
+    lines.extend(f"data: {line}" for line in payload.splitlines() or [''])
+    return '\n'.join(lines) + '\n\n'
@@ -0,0 +1,128 @@
+# inference.py - Micro-batching scheduler for the transformer pipelines
+import threading
+import queue
+import time
+import logging
+from concurrent.futures import Future
+
+
+class BatchInferenceScheduler:
+    """Gathers analysis requests from all worker threads into micro-batches.
+
+    Callers get a Future back for their own text. A background thread
+    drains the queue, waits at most ``max_wait_ms`` for a batch to fill up to
+    ``max_batch_size`` and hands the whole batch to ``run_batch``, which must
+    return one result per text in the same order. With ``concurrency`` > 1
+    that many threads form batches, so several can be in flight at once
+    (e.g. one per inference worker process).
+    """
+
+    def __init__(self, run_batch, max_batch_size=16, max_wait_ms=10, concurrency=1):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.concurrency = max(1, int(concurrency))
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers = []
+        self._stopped = False
+        self._batches = 0
+        self._items = 0
+        self._largest_batch = 0
+
+    def start(self):
+        """Start the batching threads if they are not running yet"""
+        if len(self._workers) == self.concurrency and all(worker.is_alive() for worker in self._workers):
+            return
+        with self._lock:
+            self._workers = [worker for worker in self._workers if worker.is_alive()]
+            self._stopped = False
+            while len(self._workers) < self.concurrency:
+                worker = threading.Thread(target=self._run, name=f'inference-batcher-{len(self._workers)}', daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def stop(self):
+        """Stop the batching threads after the queued work is done"""
+        with self._lock:
+            self._stopped = True
+            for _ in self._workers:
+                self._queue.put(None)
+
+    def submit(self, text):
+        """Queue a single text and return a Future for its analysis"""
+        future = Future()
+        self.start()
+        self._queue.put((text, future))
+        return future
+
+    def submit_many(self, texts):
+        """Queue several texts at once, returning one Future per text"""
+        return [self.submit(text) for text in texts]
+
+    def analyze(self, text, timeout=None):
+        """Blocking helper used by the request handlers"""
+        return self.submit(text).result(timeout=timeout)
+
+    def stats(self):
+        """Counters for the health endpoint"""
+        return {
+            'batches': self._batches,
+            'items': self._items,
+            'avg_batch_size': round(self._items / self._batches, 2) if self._batches else 0,
+            'largest_batch': self._largest_batch,
+            'queued': self._queue.qsize(),
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'concurrency': self.concurrency
+        }
+
+    def _collect(self):
+        """Block for the first request, then fill the batch until full or timed out"""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Re-queue the stop marker so the loop exits after this batch
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                if self._stopped:
+                    return
+                continue
+
+            # Skip callers that gave up (cancelled futures)
+            batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            texts = [text for text, _ in batch]
+            try:
+                results = self.run_batch(texts)
+                if len(results) != len(texts):
+                    raise RuntimeError(f"run_batch returned {len(results)} results for {len(texts)} texts")
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                logging.error(f"Error running inference batch: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+
+            with self._lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._largest_batch = max(self._largest_batch, len(batch))
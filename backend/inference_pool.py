@@ -0,0 +1,200 @@
+# inference_pool.py - Forked worker processes sharing the loaded models copy-on-write
+import os
+import queue
+import threading
+import time
+import logging
+import multiprocessing
+
+
+PARENT_CHECK_INTERVAL = 1.0  # seconds between checks that the parent is still alive
+
+
+def _worker_main(analyzer, conn, index, threads, cpus, parent_pid, inherited):
+    """Child process loop: receive a batch of texts, send back the analyzer's output"""
+    # Pipes to the other workers came along with the fork; holding them open
+    # would keep those workers from noticing the parent has gone
+    for other in inherited:
+        other.close()
+    if cpus and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # already fixed in the parent
+    except ImportError:
+        pass  # stand-in analyzers (benchmarks) need no torch
+
+    while True:
+        try:
+            if not conn.poll(PARENT_CHECK_INTERVAL):
+                if os.getppid() != parent_pid:
+                    return  # parent was killed without closing the pipe
+                continue
+            texts = conn.recv()
+        except (EOFError, OSError):
+            return  # parent went away
+        if texts is None:
+            return
+        try:
+            conn.send(('ok', analyzer(texts)))
+        except Exception as e:
+            conn.send(('error', f"{type(e).__name__}: {e}"))
+
+
+class InferenceProcessPool:
+    """Runs analyzer batches in forked worker processes.
+
+    The parent loads the models once and ``start`` forks ``workers``
+    children, which share the weights copy-on-write instead of each loading
+    their own. Every worker has its own interpreter and its own
+    ``threads_per_worker`` torch intra-op threads (optionally pinned to a
+    disjoint set of CPUs), so batches run in parallel without contending for
+    one GIL or one thread pool. ``run`` blocks the calling thread until a
+    worker is free and has answered; the pipe wait releases the GIL.
+
+    Forking is only safe while the parent is not running inference itself,
+    which is why the pool takes the analyzer before any batch has been run,
+    and while no other thread holds a lock the child would inherit, so
+    ``start`` refuses to run once other threads exist. Replacing a dead
+    worker has to fork from the running server anyway; that is rare and the
+    child only touches its pipe and the analyzer.
+    """
+
+    def __init__(self, workers=2, threads_per_worker=0, pin_cpus=False, timeout=60):
+        self.workers = max(1, int(workers))
+        cpu_count = os.cpu_count() or 1
+        self.threads_per_worker = int(threads_per_worker) or max(1, cpu_count // self.workers)
+        self.pin_cpus = pin_cpus
+        self.timeout = timeout
+        self._analyzer = None
+        self._context = multiprocessing.get_context('fork')
+        self._slots = [None] * self.workers   # index -> (process, parent end of the pipe)
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()  # counters are updated by every calling thread
+        self._batches = 0
+        self._errors = 0
+        self._restarts = 0
+        self._busy_seconds = 0.0
+
+    def start(self, analyzer):
+        """Fork the workers around an already-loaded analyzer"""
+        if threading.active_count() > 1:
+            raise RuntimeError("Inference workers must be forked before other threads start; "
+                               "load the models eagerly at startup")
+        with self._lock:
+            self._analyzer = analyzer
+            for index in range(self.workers):
+                self._spawn(index)
+        logging.info(f"Started {self.workers} inference workers with {self.threads_per_worker} threads each")
+
+    def _cpus_for(self, index):
+        if not self.pin_cpus or not hasattr(os, 'sched_getaffinity'):
+            return None
+        cpus = sorted(os.sched_getaffinity(0))
+        per_worker = max(1, len(cpus) // self.workers)
+        start = (index * per_worker) % len(cpus)
+        return set(cpus[start:start + per_worker])
+
+    def _spawn(self, index):
+        parent_conn, child_conn = self._context.Pipe()
+        inherited = [slot[1] for slot in self._slots if slot is not None] + [parent_conn]
+        process = self._context.Process(
+            target=_worker_main,
+            args=(self._analyzer, child_conn, index, self.threads_per_worker, self._cpus_for(index),
+                  os.getpid(), inherited),
+            name=f'inference-worker-{index}',
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        self._slots[index] = (process, parent_conn)
+        self._idle.put(index)
+
+    @property
+    def is_running(self):
+        return self._analyzer is not None
+
+    def run(self, texts):
+        """Analyze one batch in the next free worker"""
+        if self._analyzer is None:
+            raise RuntimeError('Inference workers are not running')
+        index = self._idle.get(timeout=self.timeout)
+        process, conn = self._slots[index]
+        if not process.is_alive():
+            # Died while idle (e.g. OOM-killed): replace it before handing it work
+            self._replace(index)
+            index = self._idle.get(timeout=self.timeout)
+            process, conn = self._slots[index]
+        started = time.perf_counter()
+        try:
+            conn.send(list(texts))
+            if not conn.poll(self.timeout):
+                raise TimeoutError(f"Inference worker {index} did not answer within {self.timeout}s")
+            status, payload = conn.recv()
+        except Exception:
+            # A worker that died or hung mid-batch is replaced rather than reused
+            with self._stats_lock:
+                self._errors += 1
+            self._replace(index)
+            raise
+        self._idle.put(index)
+        with self._stats_lock:
+            self._busy_seconds += time.perf_counter() - started
+            if status == 'ok':
+                self._batches += 1
+            else:
+                self._errors += 1
+        if status != 'ok':
+            raise RuntimeError(f"Inference worker {index} failed: {payload}")
+        return payload
+
+    def _replace(self, index):
+        with self._lock:
+            process, conn = self._slots[index]
+            conn.close()
+            if process.is_alive():
+                process.kill()
+            process.join(timeout=5)
+            with self._stats_lock:
+                self._restarts += 1
+            logging.warning(f"Restarting inference worker {index}")
+            self._spawn(index)
+
+    def stop(self):
+        with self._lock:
+            for slot in self._slots:
+                if slot is None:
+                    continue
+                process, conn = slot
+                try:
+                    conn.send(None)
+                except OSError:
+                    pass
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.kill()
+            self._slots = [None] * self.workers
+            self._idle = queue.Queue()
+            self._analyzer = None
+
+    def stats(self):
+        """Counters for the health endpoint"""
+        alive = sum(1 for slot in self._slots if slot is not None and slot[0].is_alive())
+        with self._stats_lock:
+            batches, errors, restarts, busy_seconds = self._batches, self._errors, self._restarts, self._busy_seconds
+        return {
+            'workers': self.workers,
+            'alive': alive,
+            'idle': self._idle.qsize(),
+            'threads_per_worker': self.threads_per_worker,
+            'pinned': bool(self.pin_cpus),
+            'batches': batches,
+            'errors': errors,
+            'restarts': restarts,
+            'busy_seconds': round(busy_seconds, 3)
+        }
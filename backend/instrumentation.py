@@ -0,0 +1,216 @@
+# instrumentation.py - Per-request phase timings, Prometheus metrics and Server-Timing
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from flask.json.provider import DefaultJSONProvider
+
+from db import CountingCursor
+
+# Prometheus client defaults, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+_NULL_SPAN = nullcontext()
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values"""
+
+    def __init__(self, name, help_text, label_names, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            label_text = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            prefix = label_text + ',' if label_text else ''
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {values[-1]}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {values[-2]:.6f}')
+            lines.append(f'{self.name}_count{{{label_text}}} {values[-1]}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Instrumentation:
+    """Times the phases of each request (db, inference, serialize, ...).
+
+    Code marks a phase with ``with instrumentation.span('db'):``; spans add
+    up per request in a thread-local and feed Prometheus histograms when the
+    request finishes. When disabled, ``span`` returns a shared no-op context
+    and no hooks are installed, so the cost is one attribute check.
+    """
+
+    def __init__(self, enabled=True, server_timing=False):
+        self.enabled = enabled
+        self.server_timing = server_timing and enabled
+        self._local = threading.local()
+        self._gauges = []
+        self.request_duration = Histogram(
+            'app_request_duration_seconds', 'Request handling time', ('endpoint', 'method', 'status'))
+        self.phase_duration = Histogram(
+            'app_request_phase_seconds', 'Time spent per phase within a request', ('endpoint', 'phase'))
+        self.db_queries = Histogram(
+            'app_request_db_queries', 'Database statements per request', ('endpoint',),
+            buckets=(0, 1, 2, 3, 4, 6, 8, 12, 16, 25, 50, 100))
+
+    # ----- spans -----
+
+    def span(self, phase):
+        """Context manager adding elapsed time to ``phase`` of the current request"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return self._span(phase)
+
+    @contextmanager
+    def _span(self, phase):
+        phases = getattr(self._local, 'phases', None)
+        if phases is None or phase in self._local.open:
+            # Outside a request, or nested in the same phase (counted by the outer span)
+            yield
+            return
+        self._local.open.add(phase)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self._local.open.discard(phase)
+            total, count = phases.get(phase, (0.0, 0))
+            phases[phase] = (total + elapsed, count + 1)
+
+    def timed(self, phase):
+        """Decorator form of ``span``; leaves the function untouched when disabled"""
+        def decorate(func):
+            if not self.enabled:
+                return func
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self._span(phase):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    # ----- request lifecycle -----
+
+    def begin_request(self):
+        if not self.enabled:
+            return
+        self._local.phases = {}
+        self._local.open = set()
+        self._local.started = time.perf_counter()
+
+    def end_request(self, endpoint, method, status, db_queries=None):
+        """Record the finished request; returns its phases as {name: (seconds, count)}"""
+        phases = getattr(self._local, 'phases', None)
+        if not self.enabled or phases is None:
+            return {}
+        total = time.perf_counter() - self._local.started
+        self._local.phases = None
+        phases['total'] = (total, 1)
+
+        self.request_duration.observe((endpoint, method, str(status)), total)
+        for phase, (seconds, _) in phases.items():
+            if phase != 'total':
+                self.phase_duration.observe((endpoint, phase), seconds)
+        if db_queries is not None:
+            self.db_queries.observe((endpoint,), db_queries)
+        return phases
+
+    @staticmethod
+    def server_timing_value(phases, db_queries=None):
+        """Format phases for the Server-Timing response header"""
+        entries = []
+        for phase, (seconds, count) in phases.items():
+            entry = f"{phase};dur={seconds * 1000.0:.2f}"
+            if phase == 'db' and db_queries is not None:
+                entry += f';desc="{db_queries} queries"'
+            elif count > 1:
+                entry += f';desc="{count} calls"'
+            entries.append(entry)
+        return ', '.join(entries)
+
+    # ----- exposition -----
+
+    def add_gauges(self, collect):
+        """Register ``collect() -> [(name, help, {labels}, value), ...]`` sampled at scrape time.
+
+        Names ending in ``_total`` are exposed as counters, the rest as gauges.
+        """
+        self._gauges.append(collect)
+
+    def render_prometheus(self):
+        lines = []
+        for histogram in (self.request_duration, self.phase_duration, self.db_queries):
+            lines.extend(histogram.render())
+
+        # Samples of one metric must be contiguous, so group by name first
+        grouped = {}
+        for collect in self._gauges:
+            for name, help_text, labels, value in collect():
+                if value is not None:
+                    grouped.setdefault(name, (help_text, []))[1].append((labels, value))
+        for name, (help_text, samples) in grouped.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {'counter' if name.endswith('_total') else 'gauge'}")
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+    # ----- integrations -----
+
+    def cursor_factory(self):
+        """Cursor class for new connections: timed when enabled, plain counting otherwise"""
+        if not self.enabled:
+            return CountingCursor
+        instrumentation = self
+
+        class InstrumentedCursor(CountingCursor):
+            def execute(self, query, vars=None):
+                with instrumentation.span('db'):
+                    return super().execute(query, vars)
+
+            def executemany(self, query, vars_list):
+                with instrumentation.span('db'):
+                    return super().executemany(query, vars_list)
+
+        return InstrumentedCursor
+
+    def json_provider(self, app):
+        """JSON provider whose serialization time is recorded as the 'serialize' phase"""
+        instrumentation = self
+
+        class TimedJSONProvider(DefaultJSONProvider):
+            def dumps(self, obj, **kwargs):
+                with instrumentation.span('serialize'):
+                    return super().dumps(obj, **kwargs)
+
+        return TimedJSONProvider(app)
@@ -0,0 +1,217 @@
+# jobs.py - Local background job queue for slow analysis work
+import os
+import json
+import fcntl
+import time
+import uuid
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobQueue:
+    """Runs analysis jobs on a worker pool and persists their state on disk.
+
+    Handlers are registered per job kind and called as
+    ``handler(payload, report_progress)``; whatever they return becomes the
+    job result. Each job is a small JSON file in ``state_dir`` so status
+    survives restarts, and jobs that were still queued or running when the
+    process stopped are picked up again by ``resume``.
+
+    Several processes may share ``state_dir`` (e.g. gunicorn workers). A job
+    only runs in the process holding the ``flock`` on its ``<id>.lock`` file;
+    the kernel drops the lock when that process dies, so a crashed job can be
+    claimed again by the next ``resume``.
+
+    A resumed job runs again from the start, so handlers must tolerate
+    running twice. The payload carries the job's ``job_id`` for them to
+    recognize work that was already committed. Finished jobs are deleted
+    ``retention`` seconds after they end, checked at startup and then at
+    most every ``prune_interval`` seconds as jobs are submitted.
+    """
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+
+    def __init__(self, state_dir, workers=2, retention=86400, prune_interval=3600):
+        self.state_dir = state_dir
+        self.retention = retention
+        self.prune_interval = prune_interval
+        self.handlers = {}
+        self._last_prune = time.time()
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._claims = {}
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix='job-worker')
+
+    def register(self, kind, handler):
+        self.handlers[kind] = handler
+
+    def submit(self, kind, payload):
+        """Queue a job and return its id immediately"""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = uuid.uuid4().hex
+        job = {
+            'id': job_id,
+            'kind': kind,
+            'status': self.QUEUED,
+            'progress': 0.0,
+            'stage': 'queued',
+            'payload': {**payload, 'job_id': job_id},
+            'result': None,
+            'error': None,
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None
+        }
+        self._claim(job_id)
+        with self._lock:
+            self._jobs[job['id']] = job
+        self._save(job)
+        self._executor.submit(self._run, job['id'])
+        if time.time() - self._last_prune >= self.prune_interval:
+            self._last_prune = time.time()
+            self._executor.submit(self.prune)
+        return job['id']
+
+    def get(self, job_id):
+        """Current state of a job (from memory, or from disk after a restart)"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return dict(job)
+        return self._load(job_id)
+
+    def resume(self):
+        """Re-queue unfinished jobs left on disk and drop expired ones"""
+        self.prune()
+        resumed = 0
+        for job in self._stored_jobs():
+            if job['status'] in (self.COMPLETED, self.FAILED) or job['kind'] not in self.handlers:
+                continue
+            job_id = job['id']
+            if not self._claim(job_id):
+                continue  # Another process is running it
+            # Re-read under the claim: the previous holder may have just finished it
+            job = self._load(job_id)
+            if job is None or job['status'] in (self.COMPLETED, self.FAILED):
+                self._release(job_id)
+                continue
+            job['payload'].setdefault('job_id', job['id'])
+            job.update(status=self.QUEUED, progress=0.0, stage='requeued')
+            with self._lock:
+                self._jobs[job['id']] = job
+            self._save(job)
+            self._executor.submit(self._run, job['id'])
+            resumed += 1
+        return resumed
+
+    def prune(self):
+        """Delete the state of jobs that finished more than ``retention`` seconds ago"""
+        removed = 0
+        now = time.time()
+        for job in self._stored_jobs():
+            if job['status'] in (self.COMPLETED, self.FAILED) and job.get('finished_at') \
+                    and now - job['finished_at'] > self.retention:
+                self._remove(job['id'])
+                removed += 1
+        return removed
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job['status']] = counts.get(job['status'], 0) + 1
+        return counts
+
+    def _run(self, job_id):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(status=self.RUNNING, started_at=time.time(), stage='running')
+        self._save(job)
+
+        def report_progress(progress, stage=None):
+            with self._lock:
+                job['progress'] = round(min(max(progress, 0.0), 1.0), 3)
+                if stage:
+                    job['stage'] = stage
+            self._save(job)
+
+        try:
+            result = self.handlers[job['kind']](job['payload'], report_progress)
+            with self._lock:
+                job.update(status=self.COMPLETED, progress=1.0, stage='done', result=result)
+        except Exception as e:
+            logging.error(f"Job {job_id} ({job['kind']}) failed: {e}")
+            with self._lock:
+                job.update(status=self.FAILED, stage='failed', error=str(e))
+        job['finished_at'] = time.time()
+        self._save(job)
+
+        # Finished jobs stay readable from disk; keep memory bounded
+        with self._lock:
+            self._jobs.pop(job_id, None)
+        self._release(job_id)
+
+    def _claim(self, job_id):
+        """Take the job's lock file; False if another process holds it"""
+        os.makedirs(self.state_dir, exist_ok=True)
+        fd = os.open(os.path.join(self.state_dir, f"{job_id}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        with self._lock:
+            self._claims[job_id] = fd
+        return True
+
+    def _release(self, job_id):
+        with self._lock:
+            fd = self._claims.pop(job_id, None)
+        if fd is None:
+            return
+        try:
+            os.remove(os.path.join(self.state_dir, f"{job_id}.lock"))
+        except OSError:
+            pass
+        os.close(fd)
+
+    def _stored_jobs(self):
+        if not os.path.isdir(self.state_dir):
+            return
+        for name in os.listdir(self.state_dir):
+            if name.endswith('.json'):
+                job = self._load(name[:-5])
+                if job is not None:
+                    yield job
+
+    def _path(self, job_id):
+        return os.path.join(self.state_dir, f"{job_id}.json")
+
+    def _save(self, job):
+        with self._lock:
+            data = json.dumps(job, default=str)
+        tmp_path = self._path(job['id']) + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(job['id']))
+
+    def _load(self, job_id):
+        # Job ids are uuid4 hex; never build paths from anything else
+        if not job_id or not all(c in '0123456789abcdef' for c in job_id):
+            return None
+        try:
+            with open(self._path(job_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _remove(self, job_id):
+        try:
+            os.remove(self._path(job_id))
+        except OSError:
+            pass
@@ -0,0 +1,215 @@
+# lexicon.py - Rule-based sentiment/emotion scoring used when the models are unavailable
+import os
+import re
+import math
+import logging
+
+LEXICON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lexicons')
+# VADER's general-purpose lexicon (MIT, see lexicons/VADER_LICENSE.txt), then
+# the wellbeing terms, which override it and tag terms with emotions
+DEFAULT_LEXICON_PATHS = [os.path.join(LEXICON_DIR, 'vader_lexicon.txt'), os.path.join(LEXICON_DIR, 'wellbeing.tsv')]
+
+# Words or punctuation; apostrophes stay inside words so "don't" is one token
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)*|[.!?;:,]")
+CLAUSE_BREAKS = {'.', '!', '?', ';', ':', ',', 'but', 'however', 'although', 'though'}
+# After a contrast word the following clause dominates (VADER's "but" rule)
+CONTRASTS = {'but', 'however'}
+CONTRAST_BEFORE = 0.5
+CONTRAST_AFTER = 1.5
+
+NEGATIONS = {
+    'not', 'no', 'never', 'nothing', 'nobody', 'none', 'neither', 'nor', 'without', 'cannot',
+    'dont', 'cant', 'wont', 'isnt', 'arent', 'wasnt', 'werent', 'didnt', 'doesnt', 'hasnt',
+    'havent', 'hadnt', 'shouldnt', 'wouldnt', 'couldnt', 'aint', 'hardly', 'barely'
+}
+NEGATION_SCOPE = 3        # tokens after a negation that it applies to
+NEGATION_SCALAR = -0.74   # VADER's factor for a negated positive term
+# Verbs that take the negation themselves: in "can't stop crying" or "don't
+# want to go" the words after them are not negated
+NEGATION_BLOCKERS = {
+    'stop', 'stopped', 'stopping', 'quit', 'help', 'helped', 'want', 'wanted', 'wanna', 'keep', 'kept'
+}
+# "never so/this/such ..." intensifies rather than negates ("never felt so alone")
+NEGATION_INTENSIFIERS = {'so', 'this', 'such'}
+
+# Additive change in a term's magnitude from a preceding intensifier
+BOOSTERS = {
+    'very': 0.293, 'really': 0.293, 'so': 0.293, 'extremely': 0.293, 'incredibly': 0.293,
+    'totally': 0.293, 'absolutely': 0.293, 'completely': 0.293, 'super': 0.293, 'deeply': 0.293,
+    'truly': 0.293, 'utterly': 0.293, 'too': 0.2, 'quite': 0.15,
+    'slightly': -0.293, 'somewhat': -0.293, 'kinda': -0.293, 'sorta': -0.293, 'little': -0.2,
+    'bit': -0.2, 'mildly': -0.293, 'fairly': -0.15
+}
+BOOSTER_SCOPE = 2         # tokens after an intensifier that it can still modify
+
+NORMALIZATION_ALPHA = 15  # compound = total / sqrt(total^2 + alpha), as in VADER
+NEUTRAL_THRESHOLD = 0.05
+
+
+def tokenize(text):
+    """Lowercased word/punctuation tokens from one regex pass"""
+    return TOKEN_PATTERN.findall((text or '').lower().replace('’', "'"))
+
+
+class Lexicon:
+    """Precompiled term/phrase table scored in a single pass over the tokens.
+
+    Terms are stored in a token trie so multi-word phrases are matched
+    longest-first at each position with plain dict lookups; words only match
+    whole tokens, never substrings.
+    """
+
+    def __init__(self, entries=None):
+        self._trie = {}
+        self.size = 0
+        self.max_phrase_length = 1
+        for term, valence, emotion in entries or ():
+            self.add(term, valence, emotion)
+
+    def add(self, term, valence, emotion=None):
+        tokens = tokenize(term)
+        if not tokens or any(token in CLAUSE_BREAKS for token in tokens):
+            return False
+        node = self._trie
+        for token in tokens:
+            node = node.setdefault(token, {})
+        if None not in node:
+            self.size += 1
+        node[None] = (float(valence), emotion or None)
+        self.max_phrase_length = max(self.max_phrase_length, len(tokens))
+        return True
+
+    @classmethod
+    def load(cls, paths):
+        """Build a lexicon from files in order; later files override earlier terms"""
+        lexicon = cls()
+        for path in paths:
+            before = lexicon.size
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    entry = parse_line(line)
+                    if entry:
+                        lexicon.add(*entry)
+            logging.info(f"Loaded {lexicon.size - before} new lexicon terms from {path}")
+        return lexicon
+
+    def _match(self, tokens, start):
+        """Longest term starting at ``start`` as (length, valence, emotion), or None"""
+        node = self._trie
+        best = None
+        for offset in range(min(self.max_phrase_length, len(tokens) - start)):
+            node = node.get(tokens[start + offset])
+            if node is None:
+                break
+            if None in node:
+                best = (offset + 1,) + node[None]
+        return best
+
+    def score(self, text):
+        """Compound polarity in [-1, 1] and per-emotion weights for ``text``"""
+        tokens = tokenize(text)
+        first_words = self._trie
+        total = 0.0
+        emotions = {}
+        weight = 1.0
+        negated_until = -1
+        negator = None
+        boost = 0.0
+        boost_until = -1
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            if token in CLAUSE_BREAKS:
+                negated_until = boost_until = -1
+                boost = 0.0
+                if token in CONTRASTS:
+                    total *= CONTRAST_BEFORE
+                    emotions = {key: value * CONTRAST_BEFORE for key, value in emotions.items()}
+                    weight = CONTRAST_AFTER
+                i += 1
+                continue
+            if i <= negated_until and token in NEGATION_BLOCKERS:
+                negated_until = -1
+                i += 1
+                continue
+            negation = token in NEGATIONS or token.endswith("n't")
+            if token not in first_words and not negation and token not in BOOSTERS:
+                i += 1
+                continue
+
+            match = self._match(tokens, i)
+            # Negations and intensifiers that are also single terms ("no",
+            # "super") act as modifiers; phrases starting with them still match
+            if match is None or (match[0] == 1 and (negation or token in BOOSTERS)):
+                if negation:
+                    negated_until = i + NEGATION_SCOPE
+                    negator = token
+                elif token in BOOSTERS:
+                    if i <= negated_until and negator == 'never' and token in NEGATION_INTENSIFIERS:
+                        negated_until = -1
+                    boost += BOOSTERS[token]
+                    boost_until = i + BOOSTER_SCOPE
+                i += 1
+                continue
+
+            length, valence, emotion = match
+            if boost and i <= boost_until and valence:
+                valence += math.copysign(boost, valence)
+            valence *= weight
+            if i <= negated_until:
+                # "not happy" leans negative, but "not sad" is no evidence of
+                # anything positive, so a negated negative counts as neutral
+                valence = valence * NEGATION_SCALAR if valence > 0 else 0.0
+            elif emotion:
+                # A negated term says little about which emotion is present
+                emotions[emotion] = emotions.get(emotion, 0.0) + abs(valence) + 0.1
+            total += valence
+            boost = 0.0
+            i += length
+
+        compound = total / math.sqrt(total * total + NORMALIZATION_ALPHA) if total else 0.0
+        return compound, emotions
+
+    def analyze(self, text):
+        """Analysis in the same shape as the model path returns"""
+        compound, emotions = self.score(text)
+        if compound >= NEUTRAL_THRESHOLD:
+            raw_sentiment = 'POSITIVE'
+        elif compound <= -NEUTRAL_THRESHOLD:
+            raw_sentiment = 'NEGATIVE'
+        else:
+            raw_sentiment = 'NEUTRAL'
+
+        if emotions:
+            emotion = max(emotions, key=emotions.get)
+        else:
+            emotion = {'POSITIVE': 'joy', 'NEGATIVE': 'sadness'}.get(raw_sentiment, 'neutral')
+
+        return {
+            'sentiment_score': round((compound + 1.0) / 2.0, 4),
+            'emotion': emotion,
+            'confidence': 0.6 if raw_sentiment == 'NEUTRAL' else round(min(0.95, 0.6 + 0.35 * abs(compound)), 4),
+            'raw_sentiment': raw_sentiment
+        }
+
+
+def parse_line(line):
+    """(term, valence, emotion) from a lexicon line, or None for comments/blank lines.
+
+    Accepts ``term<TAB>valence[<TAB>emotion]`` and the VADER format
+    ``term<TAB>mean<TAB>std<TAB>[ratings]`` (whose extra columns are ignored).
+    """
+    line = line.rstrip('\n')
+    if not line.strip() or line.lstrip().startswith('#'):
+        return None
+    fields = line.split('\t')
+    if len(fields) < 2:
+        return None
+    try:
+        valence = float(fields[1])
+    except ValueError:
+        return None
+    emotion = None
+    if len(fields) == 3 and fields[2].strip() and not fields[2].strip()[0].isdigit():
+        emotion = fields[2].strip()
+    return fields[0].strip(), valence, emotion
@@ -0,0 +1,137 @@
+# live_audio.py - Sliding-window mood estimates over live call audio
+import threading
+import numpy as np
+
+from voice_features import block_features, classify_mood, VoiceFeatureAccumulator, MOOD_SCORES
+
+# Raw PCM sample formats a live stream may use -> (dtype, scale to [-1, 1])
+SAMPLE_FORMATS = {
+    's16le': (np.dtype('<i2'), 1.0 / 32768.0),
+    'f32le': (np.dtype('<f4'), 1.0)
+}
+
+
+class AudioRingBuffer:
+    """The most recent ``capacity`` mono samples in a fixed circular array"""
+
+    def __init__(self, capacity):
+        self.capacity = int(capacity)
+        self.total = 0  # samples written since the start of the stream
+        self._data = np.zeros(self.capacity, dtype=np.float32)
+
+    def write(self, samples):
+        if len(samples) > self.capacity:
+            # Only the tail would survive anyway
+            self.total += len(samples) - self.capacity
+            samples = samples[-self.capacity:]
+        start = self.total % self.capacity
+        first = min(len(samples), self.capacity - start)
+        self._data[start:start + first] = samples[:first]
+        self._data[:len(samples) - first] = samples[first:]
+        self.total += len(samples)
+
+    @property
+    def oldest(self):
+        """Stream position of the oldest sample still held"""
+        return max(0, self.total - self.capacity)
+
+    def window(self, end, length):
+        """Contiguous copy of the samples at stream positions [end - length, end)"""
+        if end > self.total or end - length < self.oldest:
+            raise ValueError('Window is outside the buffered audio')
+        start = (end - length) % self.capacity
+        if start + length <= self.capacity:
+            return self._data[start:start + length].copy()
+        return np.concatenate((self._data[start:], self._data[:start + length - self.capacity]))
+
+
+class LiveVoiceAnalyzer:
+    """Mood estimates from overlapping windows of a live PCM stream.
+
+    Every ``hop_seconds`` of audio completes a ``window_seconds`` window,
+    which is run through the same frame features as uploaded files. The
+    work per window is fixed however long the call runs, and memory is the
+    ring buffer. If a client sends audio in bursts faster than windows can
+    be computed, windows that have already left the buffer are skipped
+    rather than queued, so estimates stay close to real time.
+    """
+
+    def __init__(self, sample_rate, sample_format='s16le', window_seconds=2.0, hop_seconds=0.5, buffer_seconds=10.0):
+        if sample_format not in SAMPLE_FORMATS:
+            raise ValueError(f"Unknown sample format {sample_format!r}, expected one of {tuple(SAMPLE_FORMATS)}")
+        self.sample_rate = int(sample_rate)
+        self.dtype, self.scale = SAMPLE_FORMATS[sample_format]
+        self.window = int(window_seconds * self.sample_rate)
+        self.hop = max(1, int(hop_seconds * self.sample_rate))
+        self.ring = AudioRingBuffer(max(int(buffer_seconds * self.sample_rate), self.window))
+        self.next_end = self.window
+        self.windows = 0
+        self.skipped = 0
+        self._remainder = b''
+
+    def feed(self, data):
+        """Add raw PCM bytes; returns an estimate for every window they complete"""
+        data = self._remainder + data
+        usable = len(data) - len(data) % self.dtype.itemsize
+        self._remainder = data[usable:]
+        samples = np.frombuffer(data[:usable], dtype=self.dtype).astype(np.float32)
+        if self.scale != 1.0:
+            samples *= self.scale
+        self.ring.write(samples)
+
+        estimates = []
+        while self.next_end <= self.ring.total:
+            if self.next_end - self.window < self.ring.oldest:
+                self.skipped += 1
+            else:
+                estimates.append(self.estimate(self.next_end))
+            self.next_end += self.hop
+        return estimates
+
+    def estimate(self, end):
+        accumulator = VoiceFeatureAccumulator(self.sample_rate)
+        accumulator.add(block_features(self.ring.window(end, self.window), self.sample_rate))
+        summary = accumulator.summary()
+        mood, energy_level = classify_mood(summary)
+        self.windows += 1
+        return {
+            'offset': round(end / self.sample_rate, 3),  # seconds into the call at the window's end
+            'mood': mood,
+            'mood_score': MOOD_SCORES[mood],
+            'energy_level': energy_level,
+            'voiced_ratio': summary['voiced_ratio'],
+            'pitch_mean_hz': summary['pitch_mean_hz'],
+            'rms_db': summary['rms_db']
+        }
+
+    def stats(self):
+        return {
+            'seconds': round(self.ring.total / self.sample_rate, 3),
+            'windows': self.windows,
+            'skipped': self.skipped
+        }
+
+
+class LiveCalls:
+    """The live audio streams open in this process, at most one per session"""
+
+    def __init__(self, max_calls=32):
+        self.max_calls = max_calls
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def start(self, session_id, analyzer):
+        """Register ``analyzer`` for the session; False if it is already live or the limit is reached"""
+        with self._lock:
+            if session_id in self._calls or len(self._calls) >= self.max_calls:
+                return False
+            self._calls[session_id] = analyzer
+            return True
+
+    def finish(self, session_id):
+        with self._lock:
+            self._calls.pop(session_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {'calls': len(self._calls), 'max_calls': self.max_calls}
@@ -0,0 +1,137 @@
+# metrics_accumulator.py - Coalesced growth point / mood writes to health_metrics
+import logging
+import threading
+from datetime import datetime
+from psycopg2.extras import execute_values
+
+# A mood only replaces one set later (by another process's accumulator)
+FLUSH_SQL = """
+UPDATE health_metrics hm
+SET growth_points = hm.growth_points + v.points,
+    mood_score = CASE WHEN v.mood_at >= COALESCE(hm.mood_updated_at, v.mood_at) THEN v.mood_score
+                      ELSE hm.mood_score END,
+    mood_updated_at = GREATEST(hm.mood_updated_at, v.mood_at)
+FROM (VALUES %s) AS v (user_id, points, mood_score, mood_at)
+WHERE hm.user_id = v.user_id
+"""
+
+# Taking the row locks in user order first means two processes flushing
+# overlapping users wait for each other instead of deadlocking
+LOCK_SQL = "SELECT 1 FROM health_metrics WHERE user_id = ANY(%(user_ids)s) ORDER BY user_id, id FOR UPDATE"
+
+
+class MetricsAccumulator:
+    """Buffers per-user growth point increments and the latest mood score.
+
+    Every write that earns points used to update the user's health_metrics
+    row inside its own transaction, so an active user's requests queued up
+    on that one row lock. Requests now call ``add`` after committing, and a
+    background thread writes everything gathered in the last ``interval``
+    seconds with a single UPDATE ... FROM (VALUES ...). Increments are
+    summed and the newest mood score wins, so the result is the same as
+    applying the writes one by one. Each mood carries the time it was
+    added, and the flush keeps whichever of it and the stored mood is newer,
+    so accumulators in several processes agree too. All mood writes go
+    through here for that reason. ``interval`` 0 writes through on every
+    ``add``. Points not yet flushed when the process dies are lost, so the
+    interval should stay short.
+    """
+
+    def __init__(self, connect, interval=1.0, on_flush=None):
+        self.connect = connect      # context manager yielding a connection (or None)
+        self.interval = interval
+        self.on_flush = on_flush    # called with the flushed user ids once committed
+        self._pending = {}          # user_id -> [points, mood_score or None, time the mood was added]
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._stopped = False
+        self._flushes = 0
+        self._rows = 0
+        self._increments = 0
+        self._failures = 0
+
+    def add(self, user_id, points=0, mood_score=None):
+        if user_id is None:
+            return
+        with self._lock:
+            entry = self._pending.setdefault(int(user_id), [0, None, None])
+            entry[0] += points
+            if mood_score is not None:
+                entry[1:] = [mood_score, datetime.now()]
+            self._increments += 1
+            if self._thread is None and self.interval > 0 and not self._stopped:
+                # Started on first use so forked workers each get their own
+                self._thread = threading.Thread(target=self._run, name='metrics-flusher', daemon=True)
+                self._thread.start()
+        if self.interval <= 0 or self._stopped:
+            self.flush()
+
+    def pending(self, user_id):
+        """(points, mood_score) added for the user but not written yet"""
+        with self._lock:
+            points, mood_score, _ = self._pending.get(int(user_id), (0, None, None))
+            return points, mood_score
+
+    def _run(self):
+        while not self._wake.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        """Write everything pending in one statement; returns the number of users written"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            rows = sorted((user_id, *entry) for user_id, entry in batch.items())
+            try:
+                with self.connect() as conn:
+                    if not conn:
+                        raise RuntimeError('Database connection failed')
+                    cur = conn.cursor()
+                    cur.execute(LOCK_SQL, {'user_ids': [row[0] for row in rows]})
+                    execute_values(cur, FLUSH_SQL, rows, template="(%s::int, %s::int, %s::real, %s::timestamp)", page_size=len(rows))
+                    conn.commit()
+                    cur.close()
+            except Exception as e:
+                self._failures += 1
+                logging.error(f"Could not flush health metrics for {len(rows)} users, will retry: {e}")
+                self._restore(batch)
+                return 0
+            self._flushes += 1
+            self._rows += len(rows)
+        if self.on_flush:
+            self.on_flush([row[0] for row in rows])
+        return len(rows)
+
+    def _restore(self, batch):
+        # Newer adds happened after the failed batch, so their mood score wins
+        with self._lock:
+            for user_id, (points, mood_score, mood_at) in batch.items():
+                entry = self._pending.setdefault(user_id, [0, None, None])
+                entry[0] += points
+                if entry[1] is None:
+                    entry[1:] = [mood_score, mood_at]
+
+    def stop(self):
+        """Stop the flusher and write what is left"""
+        self._stopped = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            'interval_seconds': self.interval,
+            'pending_users': pending,
+            'increments': self._increments,
+            'flushes': self._flushes,
+            'rows_written': self._rows,
+            'failures': self._failures,
+            'coalescing': round(self._increments / self._rows, 2) if self._rows else None
+        }
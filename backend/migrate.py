@@ -0,0 +1,313 @@
+# migrate.py - Versioned SQL migrations and an EXPLAIN-based index check
+import os
+import re
+import json
+import hashlib
+import logging
+
+import emotion_vectors
+import queries
+import rollups
+import blob_store
+import session_summary
+from metrics_accumulator import LOCK_SQL as METRICS_LOCK_SQL, FLUSH_SQL as METRICS_FLUSH_SQL
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE = re.compile(r'^(\d{4})_(\w+)\.sql$')
+MIGRATION_LOCK_ID = 727001  # pg_advisory_lock key so concurrent workers migrate one at a time
+
+SCHEMA_MIGRATIONS_SQL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    checksum TEXT NOT NULL,
+    applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+)
+"""
+
+
+def discover(directory=MIGRATIONS_DIR):
+    """Migration files as (version, name, path), ordered by version"""
+    migrations = []
+    for filename in os.listdir(directory):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+    migrations.sort()
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+
+def _read(path):
+    with open(path, encoding='utf-8') as f:
+        sql = f.read()
+    return sql, hashlib.sha256(sql.encode('utf-8')).hexdigest()
+
+
+def applied_migrations(cur):
+    cur.execute(SCHEMA_MIGRATIONS_SQL)
+    cur.execute("SELECT version, name, checksum, applied_at FROM schema_migrations ORDER BY version")
+    return {row['version']: row for row in cur.fetchall()}
+
+
+def status(conn, directory=MIGRATIONS_DIR):
+    """Every known migration with whether (and when) it was applied"""
+    cur = conn.cursor()
+    applied = applied_migrations(cur)
+    conn.commit()
+    cur.close()
+
+    result = []
+    for version, name, path in discover(directory):
+        _, checksum = _read(path)
+        row = applied.get(version)
+        result.append({
+            'version': version,
+            'name': name,
+            'applied_at': row['applied_at'] if row else None,
+            'modified': bool(row) and row['checksum'] != checksum
+        })
+    return result
+
+
+def upgrade(conn, target=None, directory=MIGRATIONS_DIR):
+    """Apply pending migrations in order, each in its own transaction.
+
+    Returns the versions applied. An applied migration whose file has since
+    changed is reported but never re-run; add a new migration instead.
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+    try:
+        applied = applied_migrations(cur)
+        conn.commit()
+
+        done = []
+        for version, name, path in discover(directory):
+            if target is not None and version > target:
+                break
+            sql, checksum = _read(path)
+            if version in applied:
+                if applied[version]['checksum'] != checksum:
+                    logging.warning(f"Migration {version:04d}_{name} changed after it was applied")
+                continue
+
+            logging.info(f"Applying migration {version:04d}_{name}")
+            try:
+                cur.execute(sql)
+                cur.execute(
+                    "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                    (version, name, checksum)
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            done.append(version)
+        return done
+    finally:
+        cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+        conn.commit()
+        cur.close()
+
+
+# ========== INDEX CHECK ==========
+
+# The statements each route runs (from queries.py and the helper modules),
+# as (route, sql, params). Parameters default to seeded rows in check_indexes;
+# ``params`` adds the rest with the values the route binds by default.
+ROUTE_QUERIES = [
+    ('GET /api/users/<id>/dashboard', queries.USER_SQL, {}),
+    ('GET /api/users/<id>/dashboard', queries.LATEST_HEALTH_METRICS_SQL, {}),
+    ('GET /api/users/<id>/dashboard', queries.RECENT_ANALYSIS_SQL, {}),
+    ('GET /api/users/<id>/dashboard', queries.DATA_TYPE_COUNTS_SQL, {}),
+    ('POST /api/users/<id>/energy', queries.ENERGY_CHECK_IN_SQL, {'energy_level': 3}),
+    # Growth points and mood scores from every route are written by the metrics flusher
+    ('metrics flush', METRICS_LOCK_SQL, {}),
+    ('metrics flush', METRICS_FLUSH_SQL.replace(
+        'VALUES %s', 'VALUES (%(user_id)s::int, 10::int, NULL::real, NULL::timestamp)'), {}),
+    ('POST text / feedback / voice', rollups.UPSERT_SQL.replace(
+        'VALUES %s', "VALUES (%(user_id)s, CURRENT_DATE, 0.5, 1, '{}'::jsonb, '{}'::jsonb)"), {}),
+    ('voice jobs', queries.JOB_ROW_SQL, {'job_id': 'index-check'}),
+    ('voice jobs', blob_store.CACHED_ANALYSIS_SQL, {'sha256': '0' * 64, 'version': '1'}),
+    ('GET /api/users/<id>/analytics', rollups.ANALYTICS_SQL, {'days': 30}),
+    ('GET /api/chat/sessions', queries.chat_sessions_sql(queries.DEFAULT_CHAT_SESSION_FIELDS, []),
+     {'limit': 51}),
+    ('GET /api/chat/sessions?therapist_id',
+     queries.chat_sessions_sql(queries.DEFAULT_CHAT_SESSION_FIELDS, ['therapist_id']), {'limit': 51}),
+    ('GET /api/chat/sessions?patient_id',
+     queries.chat_sessions_sql(queries.DEFAULT_CHAT_SESSION_FIELDS, ['patient_id']), {'limit': 51}),
+    ('GET /api/chat/session/<id>', queries.CHAT_SESSION_SQL, {}),
+    ('GET /api/chat/session/<id>', session_summary.GET_SQL, {}),
+    ('GET /api/chat/session/<id>', queries.CHAT_MESSAGES_SQL, {'limit': None}),
+    ('GET /api/chat/session/<id>', queries.SESSION_EMOTION_HISTORY_SQL, {'limit': None}),
+    ('POST /api/chat/session/<id>/message', queries.NEXT_MESSAGE_SEQ_SQL, {}),
+    ('POST /api/chat/session/<id>/message', session_summary.RECORD_SQL,
+     {'emotion': 'neutral', 'confidence': 0.7, 'sentiment': 0.5, 'scores': None}),
+    ('GET /api/chat/session/<id>/stream', queries.SESSION_EVENTS_SQL, {'after_seq': 0, 'limit': 500}),
+    ('POST /api/chat/session/<id>/live-audio', queries.SESSION_STATUS_SQL, {}),
+]
+
+# Tables that must never be sequentially scanned by the queries above
+CHECKED_TABLES = {
+    'users', 'health_metrics', 'user_data', 'analysis_results', 'chat_sessions',
+    'chat_messages', 'emotion_analysis', 'emotion_history', 'chat_session_summaries',
+    'user_daily_rollups'
+}
+
+# Synthetic users with metrics, entries, analyses, rollups and chat sessions.
+# Rows are tagged by an email prefix (``label``) so they can be found again.
+SEED_SQL = """
+INSERT INTO users (name, email)
+SELECT 'Seeded user ' || g, %(label)s || '-' || g || '@example.invalid' FROM generate_series(1, %(users)s) g;
+
+CREATE TEMP TABLE seeded_users ON COMMIT DROP AS
+SELECT id FROM users WHERE email LIKE %(label)s || '-%%@example.invalid';
+
+INSERT INTO health_metrics (user_id, energy_level, growth_points, created_at)
+SELECT u.id, 1 + g %% 5, g * 10, NOW() - g * INTERVAL '1 day'
+FROM seeded_users u, generate_series(1, 5) g;
+
+INSERT INTO user_data (user_id, data_type, content, created_at)
+SELECT u.id, (ARRAY['text_manual_input', 'text_journal', 'voice_message', 'activity'])[1 + g %% 4],
+       'seeded entry', NOW() - g * INTERVAL '1 hour'
+FROM seeded_users u, generate_series(1, %(entries_per_user)s) g;
+
+INSERT INTO analysis_results (user_id, data_id, sentiment_score, emotion_detected, risk_level, confidence_score,
+                              emotion_scores, created_at)
+SELECT ud.user_id, ud.id, random(), 'joy', 'low', 0.8, %(joy_scores)s, ud.created_at
+FROM user_data ud JOIN seeded_users u ON u.id = ud.user_id;
+
+INSERT INTO user_daily_rollups (user_id, day, mood_sum, mood_count)
+SELECT u.id, CURRENT_DATE - g, 1.0, 2 FROM seeded_users u, generate_series(0, 29) g;
+
+INSERT INTO chat_sessions (patient_id, therapist_id, session_date, status, message_count)
+SELECT u.id, 1 + (u.id + g) %% 50, NOW() - (u.id + g) * INTERVAL '1 hour', 'completed', %(messages_per_session)s
+FROM seeded_users u, generate_series(1, %(sessions_per_user)s) g;
+
+CREATE TEMP TABLE seeded_sessions ON COMMIT DROP AS
+SELECT cs.id FROM chat_sessions cs JOIN seeded_users u ON u.id = cs.patient_id;
+
+INSERT INTO chat_messages (session_id, sender_type, sender_id, content, timestamp, session_seq)
+SELECT s.id, CASE WHEN g %% 2 = 0 THEN 'patient' ELSE 'therapist' END, 1, 'seeded message',
+       NOW() - g * INTERVAL '1 minute', %(messages_per_session)s + 1 - g
+FROM seeded_sessions s, generate_series(1, %(messages_per_session)s) g;
+
+INSERT INTO emotion_analysis (message_id, sentiment_score, emotion_detected, confidence_score, emotion_scores)
+SELECT cm.id, 0.5, 'neutral', 0.7, %(neutral_scores)s
+FROM chat_messages cm JOIN seeded_sessions s ON s.id = cm.session_id
+WHERE cm.sender_type = 'patient';
+
+INSERT INTO emotion_history (session_id, message_id, emotion, confidence, timestamp)
+SELECT cm.session_id, cm.id, 'neutral', 0.7, cm.timestamp
+FROM chat_messages cm JOIN seeded_sessions s ON s.id = cm.session_id
+WHERE cm.sender_type = 'patient';
+
+INSERT INTO chat_session_summaries (
+    session_id, message_count, emotion_counts, emotion_confidence_sums, sentiment_sum, sentiment_sq_sum,
+    sentiment_ema, first_sentiment, last_sentiment, min_sentiment, max_sentiment, trajectory, emotion_score_sums)
+SELECT m.session_id, m.n, jsonb_build_object('neutral', m.n), jsonb_build_object('neutral', 0.7 * m.n),
+       0.5 * m.n, 0.25 * m.n, 0.5, 0.5, 0.5, 0.5, 0.5, array_fill(0.5::double precision, ARRAY[m.n::int]),
+       ARRAY(SELECT score * m.n FROM unnest(%(neutral_score_list)s::double precision[]) WITH ORDINALITY AS v (score, i)
+             ORDER BY i)
+FROM (
+    SELECT cm.session_id, COUNT(*) AS n
+    FROM chat_messages cm JOIN seeded_sessions s ON s.id = cm.session_id
+    WHERE cm.sender_type = 'patient'
+    GROUP BY cm.session_id
+) m;
+"""
+
+
+def seed_dataset(cur, label, users=500, entries_per_user=40, sessions_per_user=4, messages_per_session=20):
+    """Insert a synthetic dataset in the current transaction.
+
+    ``label`` must be unique per call (it becomes the email prefix). Returns
+    the seeded user, session and therapist ids; committing is up to the caller.
+    """
+    neutral_scores = {'neutral': 0.7, 'sadness': 0.15, 'joy': 0.1, 'fear': 0.05}
+    cur.execute(SEED_SQL, {
+        'label': label,
+        'users': users,
+        'entries_per_user': entries_per_user,
+        'sessions_per_user': sessions_per_user,
+        'messages_per_session': messages_per_session,
+        'joy_scores': emotion_vectors.pack({'joy': 0.8, 'neutral': 0.1, 'surprise': 0.05, 'sadness': 0.05}),
+        'neutral_scores': emotion_vectors.pack(neutral_scores),
+        'neutral_score_list': [float(value) for value in emotion_vectors.from_scores(neutral_scores)]
+    })
+    cur.execute("SELECT id FROM seeded_users ORDER BY id")
+    user_ids = [row['id'] for row in cur.fetchall()]
+    cur.execute("""
+        SELECT cs.id, cs.therapist_id FROM chat_sessions cs
+        JOIN seeded_sessions s ON s.id = cs.id ORDER BY cs.id
+    """)
+    sessions = cur.fetchall()
+    return {
+        'user_ids': user_ids,
+        'session_ids': [row['id'] for row in sessions],
+        'therapist_ids': sorted({row['therapist_id'] for row in sessions})
+    }
+
+
+def _plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from _plan_nodes(child)
+
+
+def _describe(node):
+    text = node['Node Type']
+    if node.get('Relation Name'):
+        text += f" on {node['Relation Name']}"
+    if node.get('Index Name'):
+        text += f" using {node['Index Name']}"
+    return text
+
+
+def check_indexes(conn, users=500, entries_per_user=40, sessions_per_user=4, messages_per_session=20,
+                  route_queries=ROUTE_QUERIES):
+    """EXPLAIN every route query against a seeded dataset and flag sequential scans.
+
+    The seed data and the planner statistics it produces live only inside
+    one transaction that is always rolled back (sequence values still advance).
+    Returns a list of {route, query, seq_scans, plan_nodes} dicts; a query
+    passes when ``seq_scans`` is empty.
+    """
+    cur = conn.cursor()
+    try:
+        seeded = seed_dataset(cur, 'index-check', users, entries_per_user, sessions_per_user, messages_per_session)
+        for table in sorted(CHECKED_TABLES):
+            cur.execute(f"ANALYZE {table}")
+
+        seeded_params = {
+            'user_id': seeded['user_ids'][0],
+            'user_ids': seeded['user_ids'][:2],
+            'patient_id': seeded['user_ids'][0],
+            'session_id': seeded['session_ids'][0],
+            'therapist_id': seeded['therapist_ids'][0]
+        }
+
+        results = []
+        for route, sql, params in route_queries:
+            cur.execute("EXPLAIN (FORMAT JSON) " + sql, {**seeded_params, **params})
+            plan = cur.fetchone()
+            plan = plan['QUERY PLAN'] if isinstance(plan, dict) else plan[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            nodes = list(_plan_nodes(plan[0]['Plan']))
+            results.append({
+                'route': route,
+                'query': ' '.join(sql.split()),
+                'seq_scans': sorted({node['Relation Name'] for node in nodes
+                                     if node['Node Type'] == 'Seq Scan'
+                                     and node.get('Relation Name') in CHECKED_TABLES}),
+                'plan_nodes': [_describe(node) for node in nodes
+                               if node.get('Relation Name') or node.get('Index Name')]
+            })
+        return results
+    finally:
+        conn.rollback()
+        cur.close()
@@ -0,0 +1,86 @@
+-- Core tables used by app.py. IF NOT EXISTS lets databases created by hand
+-- before migrations existed adopt this history without changes.
+
+CREATE TABLE IF NOT EXISTS users (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    email VARCHAR(255) UNIQUE,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS health_metrics (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    energy_level INTEGER DEFAULT 3,
+    growth_points INTEGER DEFAULT 0,
+    check_ins INTEGER DEFAULT 0,
+    energy_streak INTEGER DEFAULT 0,
+    mood_score REAL DEFAULT 0.5,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS user_data (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    data_type VARCHAR(64) NOT NULL,
+    content TEXT,
+    file_path TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS analysis_results (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    data_id INTEGER REFERENCES user_data(id) ON DELETE CASCADE,
+    sentiment_score REAL,
+    emotion_detected VARCHAR(64),
+    risk_level VARCHAR(16),
+    confidence_score REAL,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS chat_sessions (
+    id SERIAL PRIMARY KEY,
+    patient_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    therapist_id INTEGER,
+    session_date TIMESTAMP NOT NULL DEFAULT NOW(),
+    duration_minutes INTEGER,
+    status VARCHAR(32) NOT NULL DEFAULT 'active',
+    primary_emotion VARCHAR(64),
+    emotion_confidence REAL,
+    end_time TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS chat_messages (
+    id SERIAL PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES chat_sessions(id) ON DELETE CASCADE,
+    sender_type VARCHAR(32) NOT NULL,
+    sender_id INTEGER,
+    content TEXT NOT NULL,
+    timestamp TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS emotion_analysis (
+    id SERIAL PRIMARY KEY,
+    message_id INTEGER NOT NULL REFERENCES chat_messages(id) ON DELETE CASCADE,
+    sentiment_score REAL,
+    emotion_detected VARCHAR(64),
+    confidence_score REAL,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS emotion_history (
+    id SERIAL PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES chat_sessions(id) ON DELETE CASCADE,
+    message_id INTEGER REFERENCES chat_messages(id) ON DELETE CASCADE,
+    emotion VARCHAR(64),
+    confidence REAL,
+    timestamp TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS soap_notes (
+    id SERIAL PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES chat_sessions(id) ON DELETE CASCADE,
+    content TEXT NOT NULL,
+    generated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
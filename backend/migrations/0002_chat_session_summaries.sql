@@ -0,0 +1,17 @@
+-- Running per-session emotion aggregates maintained by session_summary.py
+
+CREATE TABLE IF NOT EXISTS chat_session_summaries (
+    session_id INTEGER PRIMARY KEY REFERENCES chat_sessions(id) ON DELETE CASCADE,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    emotion_counts JSONB NOT NULL DEFAULT '{}'::jsonb,
+    emotion_confidence_sums JSONB NOT NULL DEFAULT '{}'::jsonb,
+    sentiment_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    sentiment_sq_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    sentiment_ema DOUBLE PRECISION,
+    first_sentiment DOUBLE PRECISION,
+    last_sentiment DOUBLE PRECISION,
+    min_sentiment DOUBLE PRECISION,
+    max_sentiment DOUBLE PRECISION,
+    trajectory DOUBLE PRECISION[] NOT NULL DEFAULT '{}',
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
@@ -0,0 +1,7 @@
+-- Denormalized message counter for the session list, backfilled from chat_messages
+
+ALTER TABLE chat_sessions ADD COLUMN IF NOT EXISTS message_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE chat_sessions cs SET message_count = counts.n
+FROM (SELECT session_id, COUNT(*) AS n FROM chat_messages GROUP BY session_id) counts
+WHERE cs.id = counts.session_id;
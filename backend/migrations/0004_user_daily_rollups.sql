@@ -0,0 +1,19 @@
+-- Per-user daily aggregates maintained by rollups.py; run
+-- `flask --app app rebuild-rollups` once to backfill existing data.
+
+CREATE TABLE IF NOT EXISTS user_daily_rollups (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    mood_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    mood_count INTEGER NOT NULL DEFAULT 0,
+    data_type_counts JSONB NOT NULL DEFAULT '{}'::jsonb,
+    risk_counts JSONB NOT NULL DEFAULT '{}'::jsonb,
+    energy_level INTEGER,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (user_id, day)
+);
+
+CREATE OR REPLACE FUNCTION jsonb_add_counts(a JSONB, b JSONB) RETURNS JSONB AS $$
+    SELECT COALESCE(jsonb_object_agg(k, COALESCE((a ->> k)::int, 0) + COALESCE((b ->> k)::int, 0)), '{}'::jsonb)
+    FROM jsonb_object_keys(a || b) AS k
+$$ LANGUAGE SQL IMMUTABLE;
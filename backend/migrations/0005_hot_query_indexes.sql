@@ -0,0 +1,22 @@
+-- Composite indexes matching the filters/orderings in app.py.
+-- `flask --app app db-check-indexes` verifies the planner uses them.
+-- On a large live table, create the index by hand with CONCURRENTLY first;
+-- IF NOT EXISTS then makes this migration a no-op.
+
+-- Dashboard: recent analyses, latest metrics, counts by type
+CREATE INDEX IF NOT EXISTS idx_analysis_results_user_created ON analysis_results (user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_health_metrics_user_created ON health_metrics (user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_user_data_user_type ON user_data (user_id, data_type);
+
+-- Foreign key used by the analysis_results -> user_data join and cascades
+CREATE INDEX IF NOT EXISTS idx_analysis_results_data ON analysis_results (data_id);
+
+-- Chat session detail and live stream backfill
+CREATE INDEX IF NOT EXISTS idx_chat_messages_session_timestamp ON chat_messages (session_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_emotion_analysis_message ON emotion_analysis (message_id);
+CREATE INDEX IF NOT EXISTS idx_emotion_history_session_timestamp ON emotion_history (session_id, timestamp);
+
+-- Keyset pagination of /api/chat/sessions, unfiltered and per therapist/patient
+CREATE INDEX IF NOT EXISTS idx_chat_sessions_date_id ON chat_sessions (session_date, id);
+CREATE INDEX IF NOT EXISTS idx_chat_sessions_therapist_date_id ON chat_sessions (therapist_id, session_date, id);
+CREATE INDEX IF NOT EXISTS idx_chat_sessions_patient_date_id ON chat_sessions (patient_id, session_date, id);
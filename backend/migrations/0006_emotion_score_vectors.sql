@@ -0,0 +1,6 @@
+-- Full emotion probability distribution per analysis: float32 little-endian,
+-- one value per class in emotion_vectors.EMOTION_LABELS order (28 bytes).
+-- NULL for rows analyzed by the lexicon fallback or before this migration.
+
+ALTER TABLE analysis_results ADD COLUMN IF NOT EXISTS emotion_scores BYTEA;
+ALTER TABLE emotion_analysis ADD COLUMN IF NOT EXISTS emotion_scores BYTEA;
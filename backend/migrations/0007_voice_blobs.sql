@@ -0,0 +1,36 @@
+-- Content-addressed voice uploads maintained by blob_store.py. Identical audio
+-- is stored once under uploads/blobs/ab/cd/<sha256>.wav; user_data.file_path
+-- points at the blob and the triggers below keep ref_count in step with the
+-- user_data rows that reference it (including cascaded deletes). Blobs whose
+-- count drops to zero are removed by `flask --app app gc-voice-blobs`.
+
+CREATE TABLE IF NOT EXISTS voice_blobs (
+    sha256 CHAR(64) PRIMARY KEY,
+    file_path TEXT NOT NULL UNIQUE,
+    size_bytes BIGINT NOT NULL,
+    duration REAL,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    analysis JSONB,                 -- memoized voice_features result
+    analysis_version TEXT,          -- voice_features.FEATURES_VERSION that produced it
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    last_used_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_voice_blobs_unreferenced ON voice_blobs (last_used_at) WHERE ref_count = 0;
+
+CREATE OR REPLACE FUNCTION voice_blobs_count_refs() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') AND OLD.file_path IS NOT NULL THEN
+        UPDATE voice_blobs SET ref_count = ref_count - 1 WHERE file_path = OLD.file_path;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.file_path IS NOT NULL THEN
+        UPDATE voice_blobs SET ref_count = ref_count + 1, last_used_at = NOW() WHERE file_path = NEW.file_path;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS user_data_voice_blob_refs ON user_data;
+CREATE TRIGGER user_data_voice_blob_refs
+    AFTER INSERT OR DELETE OR UPDATE OF file_path ON user_data
+    FOR EACH ROW EXECUTE FUNCTION voice_blobs_count_refs();
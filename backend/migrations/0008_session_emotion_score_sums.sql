@@ -0,0 +1,15 @@
+-- Running sum of the emotion_scores vectors of a session's analyzed messages
+-- (emotion_vectors.EMOTION_LABELS order), so the session's average emotion
+-- breakdown is read from the summary row instead of every message. NULL until
+-- a message with a vector is recorded.
+
+ALTER TABLE chat_session_summaries ADD COLUMN IF NOT EXISTS emotion_score_sums DOUBLE PRECISION[];
+
+-- Summaries of sessions that already have vectors are rebuilt from their
+-- messages (including the new sums) the next time they are read
+DELETE FROM chat_session_summaries s
+WHERE EXISTS (
+    SELECT 1 FROM chat_messages cm
+    JOIN emotion_analysis ea ON cm.id = ea.message_id
+    WHERE cm.session_id = s.session_id AND ea.emotion_scores IS NOT NULL
+);
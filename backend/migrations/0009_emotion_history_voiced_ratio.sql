@@ -0,0 +1,8 @@
+-- Live call estimates (emotion_history rows without a message_id) record the
+-- share of voiced audio in their window, which is not a classifier
+-- confidence. Earlier estimates stored it in confidence; move it over.
+
+ALTER TABLE emotion_history ADD COLUMN IF NOT EXISTS voiced_ratio REAL;
+
+UPDATE emotion_history SET voiced_ratio = confidence, confidence = NULL
+WHERE message_id IS NULL AND voiced_ratio IS NULL;
@@ -0,0 +1,7 @@
+-- The background job that wrote a user_data row (jobs.py job id), so a job
+-- re-run after a crash finds its committed rows instead of inserting them
+-- (and awarding points) twice.
+
+ALTER TABLE user_data ADD COLUMN IF NOT EXISTS job_id TEXT;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_user_data_job_id ON user_data (job_id) WHERE job_id IS NOT NULL;
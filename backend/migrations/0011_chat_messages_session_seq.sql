@@ -0,0 +1,16 @@
+-- Per-session message numbers for the live event stream. New messages take
+-- theirs from chat_sessions.message_count while holding that row's lock,
+-- so they follow commit order (message ids come from a global sequence
+-- and do not).
+
+ALTER TABLE chat_messages ADD COLUMN IF NOT EXISTS session_seq INTEGER;
+
+UPDATE chat_messages cm SET session_seq = numbered.seq
+FROM (SELECT id, ROW_NUMBER() OVER (PARTITION BY session_id ORDER BY id) AS seq FROM chat_messages) numbered
+WHERE cm.id = numbered.id AND cm.session_seq IS NULL;
+
+UPDATE chat_sessions cs SET message_count = GREATEST(cs.message_count, m.last_seq)
+FROM (SELECT session_id, MAX(session_seq) AS last_seq FROM chat_messages GROUP BY session_id) m
+WHERE cs.id = m.session_id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_chat_messages_session_seq ON chat_messages (session_id, session_seq);
@@ -0,0 +1,5 @@
+-- When health_metrics.mood_score was last set. Mood scores are written in
+-- batches by each process's metrics accumulator, and a batch only replaces
+-- the stored mood if its own is newer, so a slow flush can't undo a later one.
+
+ALTER TABLE health_metrics ADD COLUMN IF NOT EXISTS mood_updated_at TIMESTAMP;
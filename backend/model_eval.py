@@ -0,0 +1,255 @@
+# model_eval.py - Accuracy vs latency comparison of analysis engines and precision modes
+"""Run the text analyzer on a labeled sample set in each engine and
+quantization mode and compare accuracy, latency and model size.
+
+    python model_eval.py compare
+    python model_eval.py compare --batch-sizes 1,16 --repeats 5 --threads 4 --output results/quant.json
+    python model_eval.py compare --modes none,shared-tokenizer:none,multihead:dynamic-int8 --multihead-path multihead_model
+    python model_eval.py compare --max-accuracy-drop 2.0
+
+A mode is ``[engine:]quantization`` (the engine defaults to ``pipelines``).
+The first mode (``none`` by default) is the reference: every other mode also
+reports how often its predictions agree with it, so a drop in accuracy can
+be told apart from labels the fp32 models already got wrong. Samples are
+``text<TAB>sentiment<TAB>emotion`` lines (see eval/labeled_messages.tsv).
+"""
+import gc
+import os
+import sys
+import json
+import time
+import platform
+from datetime import datetime
+
+import click
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SAMPLES = os.path.join(BACKEND_DIR, 'eval', 'labeled_messages.tsv')
+sys.path.insert(0, BACKEND_DIR)
+
+import models
+
+# Alternative label spellings the sentiment models use
+SENTIMENT_LABELS = {
+    'label_0': 'negative', 'neg': 'negative',
+    'label_1': 'neutral', 'neu': 'neutral',
+    'label_2': 'positive', 'pos': 'positive'
+}
+
+
+def load_samples(path):
+    samples = []
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            line = line.rstrip('\n')
+            if not line.strip() or line.startswith('#'):
+                continue
+            fields = line.split('\t')
+            if len(fields) != 3:
+                raise click.ClickException(f"{path}:{number}: expected text, sentiment and emotion")
+            samples.append({'text': fields[0], 'sentiment': fields[1].lower(), 'emotion': fields[2].lower()})
+    return samples
+
+
+def normalize_sentiment(label):
+    label = label.lower()
+    return SENTIMENT_LABELS.get(label, label)
+
+
+def macro_f1(expected, predicted):
+    scores = []
+    for label in sorted(set(expected)):
+        tp = sum(1 for e, p in zip(expected, predicted) if e == label and p == label)
+        fp = sum(1 for e, p in zip(expected, predicted) if e != label and p == label)
+        fn = sum(1 for e, p in zip(expected, predicted) if e == label and p != label)
+        precision = tp / (tp + fp) if tp + fp else 0.0
+        recall = tp / (tp + fn) if tp + fn else 0.0
+        scores.append(2 * precision * recall / (precision + recall) if precision + recall else 0.0)
+    return sum(scores) / len(scores) if scores else 0.0
+
+
+def accuracy(expected, predicted):
+    return sum(1 for e, p in zip(expected, predicted) if e == p) / len(expected) if expected else 0.0
+
+
+def parse_mode(mode):
+    """'engine:quantization' or bare 'quantization' -> (engine, quantization)"""
+    engine, _, quantization = mode.rpartition(':')
+    return engine or 'pipelines', quantization
+
+
+def time_analyzer(analyzer, texts, batch_size, repeats):
+    """Run the analyzer over ``texts`` in batches; returns (predictions, per-batch seconds)"""
+    batch_seconds = []
+    predictions = None
+    for _ in range(repeats):
+        run = []
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            t0 = time.perf_counter()
+            results = analyzer(batch)
+            batch_seconds.append((time.perf_counter() - t0, len(batch)))
+            run.extend(results)
+        predictions = run
+    return predictions, batch_seconds
+
+
+def latency_stats(batch_seconds):
+    per_message = np.array([seconds / size for seconds, size in batch_seconds]) * 1000.0
+    per_batch = np.array([seconds for seconds, _ in batch_seconds]) * 1000.0
+    total_seconds = sum(seconds for seconds, _ in batch_seconds)
+    total_messages = sum(size for _, size in batch_seconds)
+    return {
+        'per_message_ms': round(float(per_message.mean()), 3),
+        'batch_p50_ms': round(float(np.percentile(per_batch, 50)), 3),
+        'batch_p95_ms': round(float(np.percentile(per_batch, 95)), 3),
+        'messages_per_second': round(total_messages / total_seconds, 2) if total_seconds else None
+    }
+
+
+def evaluate_mode(mode, samples, batch_sizes, repeats, multihead_path=None):
+    click.echo(f"[{mode}] loading models...")
+    engine, quantization = parse_mode(mode)
+    t0 = time.perf_counter()
+    analyzer = models.build_text_analyzer(engine, quantization, multihead_path)
+    load_seconds = time.perf_counter() - t0
+    texts = [sample['text'] for sample in samples]
+
+    # One pass to fault in weights and let the allocator settle
+    time_analyzer(analyzer, texts[:max(batch_sizes)], max(batch_sizes), 1)
+
+    latency = {}
+    predictions = None
+    for batch_size in batch_sizes:
+        click.echo(f"[{mode}] timing batch size {batch_size} x {repeats}...")
+        run_predictions, batch_seconds = time_analyzer(analyzer, texts, batch_size, repeats)
+        latency[str(batch_size)] = latency_stats(batch_seconds)
+        predictions = predictions or run_predictions
+
+    result = {
+        'mode': mode,
+        'load_seconds': round(load_seconds, 2),
+        'model_mb': {name: round(models.model_size_bytes(module) / 1e6, 1)
+                     for name, module in analyzer.modules().items()},
+        'latency': latency,
+        'predictions': [
+            {'sentiment': normalize_sentiment(s['label']), 'emotion': e['label'].lower(),
+             'sentiment_confidence': round(float(s['score']), 4), 'emotion_confidence': round(float(e['score']), 4)}
+            for s, e in predictions
+        ]
+    }
+    del analyzer
+    gc.collect()
+    return result
+
+
+def score_mode(result, samples, reference=None):
+    predicted = result['predictions']
+    scores = {}
+    for task in ('sentiment', 'emotion'):
+        expected = [sample[task] for sample in samples]
+        labels = [p[task] for p in predicted]
+        scores[task] = {
+            'accuracy': round(100.0 * accuracy(expected, labels), 2),
+            'macro_f1': round(100.0 * macro_f1(expected, labels), 2)
+        }
+        if reference is not None:
+            reference_labels = [p[task] for p in reference['predictions']]
+            confidence = np.array([p[f'{task}_confidence'] for p in predicted])
+            reference_confidence = np.array([p[f'{task}_confidence'] for p in reference['predictions']])
+            scores[task]['agreement'] = round(100.0 * accuracy(reference_labels, labels), 2)
+            scores[task]['mean_confidence_delta'] = round(float(np.abs(confidence - reference_confidence).mean()), 4)
+    return scores
+
+
+def print_report(modes, batch_sizes):
+    header = f"{'mode':<28} {'sent acc':>8} {'emo acc':>8} {'agree s/e':>11} {'size MB':>8}"
+    for batch_size in batch_sizes:
+        header += f" {'ms/msg@' + str(batch_size):>11}"
+    click.echo(header)
+    for result in modes:
+        scores = result['scores']
+        agreement = '-'
+        if 'agreement' in scores['sentiment']:
+            agreement = f"{scores['sentiment']['agreement']:.0f}/{scores['emotion']['agreement']:.0f}"
+        size = sum(result['model_mb'].values())
+        line = (f"{result['mode']:<28} {scores['sentiment']['accuracy']:>8} {scores['emotion']['accuracy']:>8} "
+                f"{agreement:>11} {size:>8.1f}")
+        for batch_size in batch_sizes:
+            line += f" {result['latency'][str(batch_size)]['per_message_ms']:>11}"
+        click.echo(line)
+
+
+# ========== CLI ==========
+
+@click.group()
+def cli():
+    """Model accuracy and latency tools"""
+
+
+@cli.command()
+@click.option('--samples', type=click.Path(exists=True, dir_okay=False), default=DEFAULT_SAMPLES, help='Labeled TSV sample set')
+@click.option('--modes', default=','.join(models.QUANTIZATION_MODES),
+              help='Comma-separated [engine:]quantization modes; the first is the reference')
+@click.option('--multihead-path', type=click.Path(file_okay=False), default=None, help='Model built by multihead.py distill')
+@click.option('--batch-sizes', default='1,16', help='Comma-separated batch sizes to time')
+@click.option('--repeats', type=int, default=3, help='Timed passes over the sample set per batch size')
+@click.option('--threads', type=int, default=None, help='torch intra-op threads (default: torch decides)')
+@click.option('--output', type=click.Path(dir_okay=False), default=None, help='Write JSON results here')
+@click.option('--max-accuracy-drop', type=float, default=None, help='Exit non-zero if a mode loses more than this many accuracy points')
+def compare(samples, modes, multihead_path, batch_sizes, repeats, threads, output, max_accuracy_drop):
+    """Evaluate each precision mode on the labeled samples"""
+    mode_names = [mode.strip() for mode in modes.split(',') if mode.strip()]
+    unknown = [mode for mode in mode_names if parse_mode(mode)[0] not in models.ANALYSIS_ENGINES
+               or parse_mode(mode)[1] not in models.QUANTIZATION_MODES]
+    if unknown:
+        raise click.ClickException(f"Unknown modes {unknown}: engines are {models.ANALYSIS_ENGINES}, "
+                                   f"quantization modes {models.QUANTIZATION_MODES}")
+    sizes = [int(size) for size in batch_sizes.split(',')]
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+
+    labeled = load_samples(samples)
+    click.echo(f"{len(labeled)} labeled samples from {samples}")
+    results = []
+    for mode in mode_names:
+        result = evaluate_mode(mode, labeled, sizes, repeats, multihead_path)
+        result['scores'] = score_mode(result, labeled, results[0] if results else None)
+        results.append(result)
+    print_report(results, sizes)
+
+    if output:
+        import torch
+        report = {
+            'meta': {
+                'timestamp': datetime.now().isoformat(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'torch': torch.__version__,
+                'torch_threads': torch.get_num_threads(),
+                'samples': os.path.abspath(samples),
+                'config': {'modes': mode_names, 'batch_sizes': sizes, 'repeats': repeats,
+                           'multihead_path': multihead_path}
+            },
+            'modes': results
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        click.echo(f"Results written to {output}")
+
+    if max_accuracy_drop is not None:
+        reference = results[0]['scores']
+        for result in results[1:]:
+            for task in ('sentiment', 'emotion'):
+                drop = reference[task]['accuracy'] - result['scores'][task]['accuracy']
+                if drop > max_accuracy_drop:
+                    raise click.ClickException(
+                        f"{result['mode']} {task} accuracy dropped {drop:.2f} points (limit {max_accuracy_drop})")
+
+
+if __name__ == '__main__':
+    cli()
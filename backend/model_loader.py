@@ -0,0 +1,113 @@
+# model_loader.py - Lazy / background loading of the ML pipelines
+import threading
+import time
+import logging
+
+
+class ModelLoader:
+    """Loads a set of named models off the request path.
+
+    ``factories`` maps a model name to a zero-argument callable that builds
+    it. Loading happens once, either in a background thread (``start``) or on
+    first use (``ensure_loading``). Until every model is built the loader
+    reports ``warming`` and ``get`` returns None so callers can fall back.
+    """
+
+    COLD = 'cold'
+    WARMING = 'warming'
+    READY = 'ready'
+    FAILED = 'failed'
+    DISABLED = 'disabled'
+
+    def __init__(self, factories, on_ready=None):
+        self.factories = factories
+        self.on_ready = on_ready
+        self.state = self.COLD
+        self.error = None
+        self.models = {}
+        self.load_seconds = {}
+        self.started_at = None
+        self.ready_at = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Begin loading in a daemon thread (no-op if already started)"""
+        with self._lock:
+            if self.state != self.COLD:
+                return
+            self.state = self.WARMING
+            self.started_at = time.time()
+            self._thread = threading.Thread(target=self._load_all, name='model-loader', daemon=True)
+            self._thread.start()
+
+    def ensure_loading(self):
+        """Lazy mode: kick off loading the first time a model is needed"""
+        if self.state == self.COLD:
+            self.start()
+
+    def disable(self):
+        """Never load models; every caller uses the fallback"""
+        with self._lock:
+            self.state = self.DISABLED
+            self._ready.set()
+
+    def load_now(self):
+        """Load synchronously in the calling thread (eager mode)"""
+        with self._lock:
+            if self.state != self.COLD:
+                return
+            self.state = self.WARMING
+            self.started_at = time.time()
+        self._load_all()
+
+    def wait_ready(self, timeout=None):
+        """Block until loading finished (successfully or not)"""
+        self._ready.wait(timeout)
+        return self.is_ready
+
+    @property
+    def is_ready(self):
+        return self.state == self.READY
+
+    def get(self, name):
+        """Return a loaded model, or None while warming / after a failure"""
+        if self.state != self.READY:
+            return None
+        return self.models.get(name)
+
+    def status(self):
+        """Loading state and timings for the health endpoint"""
+        now = time.time()
+        elapsed = None
+        if self.started_at:
+            elapsed = round((self.ready_at or now) - self.started_at, 3)
+        return {
+            'state': self.state,
+            'models': list(self.models.keys()),
+            'load_seconds': self.load_seconds,
+            'total_load_seconds': elapsed,
+            'error': self.error
+        }
+
+    def _load_all(self):
+        try:
+            for name, factory in self.factories.items():
+                t0 = time.perf_counter()
+                self.models[name] = factory()
+                self.load_seconds[name] = round(time.perf_counter() - t0, 3)
+                logging.info(f"Loaded model {name} in {self.load_seconds[name]}s")
+            if self.on_ready:
+                self.on_ready(self.models)
+            self.state = self.READY
+            print("ML models loaded successfully!")
+        except Exception as e:
+            self.error = str(e)
+            self.state = self.FAILED
+            self.models = {}
+            print(f"Error loading ML models: {e}")
+            print("Using fallback sentiment analysis...")
+        finally:
+            self.ready_at = time.time()
+            self._ready.set()
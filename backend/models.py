@@ -0,0 +1,193 @@
+# models.py - Construction of the text analyzers, optionally quantized for CPU
+import io
+import os
+import logging
+
+SENTIMENT_MODEL = "cardiffnlp/twitter-roberta-base-sentiment-latest"
+EMOTION_MODEL = "j-hartmann/emotion-english-distilroberta-base"
+
+# none: fp32 as published; dynamic-int8: Linear weights stored as int8,
+# activations quantized on the fly (CPU only)
+QUANTIZATION_MODES = ('none', 'dynamic-int8')
+
+# pipelines: two transformers pipelines, each tokenizing on its own
+# shared-tokenizer: both models fed one tokenization (same RoBERTa BPE vocab)
+# multihead: one encoder pass feeding an emotion and a sentiment head (multihead.py)
+ANALYSIS_ENGINES = ('pipelines', 'shared-tokenizer', 'multihead')
+
+# RoBERTa has 514 position embeddings, two of which are reserved
+MAX_TOKENS = 512
+
+
+def model_identity(quantization='none', engine='pipelines', multihead_path=None):
+    """Cache-key component naming the models (and precision) behind a result"""
+    if engine == 'multihead':
+        # Results depend on the distilled head, so key on the build
+        import multihead
+        manifest = multihead.read_manifest(multihead_path or '') or {}
+        identity = f"multihead:{manifest.get('build_id', os.path.abspath(multihead_path or ''))}"
+    else:
+        identity = f"{SENTIMENT_MODEL}|{EMOTION_MODEL}"
+    if quantization != 'none':
+        identity += f"|{quantization}"
+    return identity
+
+
+def quantize_dynamic_int8(model):
+    """Replace the model's nn.Linear layers with dynamically quantized int8 versions.
+
+    Nearly all of a RoBERTa encoder's weights and FLOPs are in its Linear
+    layers, so this cuts their memory about 4x and speeds up CPU inference;
+    embeddings and LayerNorm stay fp32.
+    """
+    import torch
+    try:
+        from torch.ao.quantization import quantize_dynamic
+    except ImportError:  # torch < 1.10
+        from torch.quantization import quantize_dynamic
+
+    engines = torch.backends.quantized.supported_engines
+    if 'fbgemm' in engines:        # x86
+        torch.backends.quantized.engine = 'fbgemm'
+    elif 'qnnpack' in engines:     # ARM
+        torch.backends.quantized.engine = 'qnnpack'
+    model.eval()
+    return quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def build_pipeline(task, model_name, quantization='none'):
+    """A transformers pipeline for ``model_name`` on CPU at the requested precision"""
+    if quantization not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization mode {quantization!r}, expected one of {QUANTIZATION_MODES}")
+    from transformers import pipeline
+    analyzer = pipeline(task, model=model_name)
+    if quantization == 'dynamic-int8':
+        before = model_size_bytes(analyzer.model)
+        analyzer.model = quantize_dynamic_int8(analyzer.model)
+        logging.info(f"Quantized {model_name} to int8: "
+                     f"{before / 1e6:.1f} MB -> {model_size_bytes(analyzer.model) / 1e6:.1f} MB")
+    return analyzer
+
+
+def build_sentiment_pipeline(quantization='none'):
+    return build_pipeline("sentiment-analysis", SENTIMENT_MODEL, quantization)
+
+
+def build_emotion_pipeline(quantization='none'):
+    return build_pipeline("text-classification", EMOTION_MODEL, quantization)
+
+
+def top_label(labels, probabilities):
+    """Pipeline-style {'label', 'score'} for the most probable class"""
+    best = max(range(len(probabilities)), key=probabilities.__getitem__)
+    return {'label': labels[best], 'score': probabilities[best]}
+
+
+def distribution(labels, probabilities):
+    """``top_label`` plus every class probability under 'scores'"""
+    result = top_label(labels, probabilities)
+    result['scores'] = dict(zip(labels, probabilities))
+    return result
+
+
+def from_all_scores(class_scores):
+    """``distribution`` from a pipeline's top_k=None output for one text"""
+    return distribution([item['label'] for item in class_scores], [item['score'] for item in class_scores])
+
+
+def config_labels(model):
+    return [model.config.id2label[i] for i in range(model.config.num_labels)]
+
+
+class PipelineAnalyzer:
+    """Sentiment and emotion from two independent pipelines.
+
+    Calling it with a list of texts returns one (sentiment, emotion) pair of
+    pipeline-style results per text; the emotion result also carries the
+    probability of every class under 'scores'.
+    """
+
+    def __init__(self, sentiment, emotion):
+        self.sentiment = sentiment
+        self.emotion = emotion
+
+    def __call__(self, texts):
+        batch_size = len(texts)
+        sentiments = self.sentiment(texts, batch_size=batch_size, truncation=True)
+        # All class scores come out of the same forward pass as the top one
+        emotions = self.emotion(texts, batch_size=batch_size, truncation=True, top_k=None)
+        return [(sentiment, from_all_scores(emotion)) for sentiment, emotion in zip(sentiments, emotions)]
+
+    def modules(self):
+        return {'sentiment': self.sentiment.model, 'emotion': self.emotion.model}
+
+
+class SharedTokenizerAnalyzer:
+    """Both classifiers fed from a single tokenization of each batch.
+
+    The two models use the same RoBERTa BPE vocabulary, so encoding once
+    and handing the same tensors to both skips the second tokenizer pass
+    and guarantees both see identically truncated input.
+    """
+
+    def __init__(self, tokenizer, sentiment_model, emotion_model, max_length=MAX_TOKENS):
+        self.tokenizer = tokenizer
+        self.sentiment_model = sentiment_model.eval()
+        self.emotion_model = emotion_model.eval()
+        self.max_length = max_length
+        self.sentiment_labels = config_labels(sentiment_model)
+        self.emotion_labels = config_labels(emotion_model)
+
+    def encode(self, texts):
+        encoded = self.tokenizer(list(texts), padding=True, truncation=True,
+                                 max_length=self.max_length, return_tensors='pt')
+        return {'input_ids': encoded['input_ids'], 'attention_mask': encoded['attention_mask']}
+
+    def __call__(self, texts):
+        import torch
+        inputs = self.encode(texts)
+        with torch.inference_mode():
+            sentiments = self.sentiment_model(**inputs).logits.softmax(-1).tolist()
+            emotions = self.emotion_model(**inputs).logits.softmax(-1).tolist()
+        return [(top_label(self.sentiment_labels, s), distribution(self.emotion_labels, e))
+                for s, e in zip(sentiments, emotions)]
+
+    def modules(self):
+        return {'sentiment': self.sentiment_model, 'emotion': self.emotion_model}
+
+
+def load_shared_tokenizer_analyzer(quantization='none'):
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+    tokenizer = AutoTokenizer.from_pretrained(SENTIMENT_MODEL)
+    if AutoTokenizer.from_pretrained(EMOTION_MODEL).get_vocab() != tokenizer.get_vocab():
+        raise ValueError(f"{SENTIMENT_MODEL} and {EMOTION_MODEL} do not share a vocabulary")
+    sentiment_model = AutoModelForSequenceClassification.from_pretrained(SENTIMENT_MODEL)
+    emotion_model = AutoModelForSequenceClassification.from_pretrained(EMOTION_MODEL)
+    if quantization == 'dynamic-int8':
+        sentiment_model = quantize_dynamic_int8(sentiment_model)
+        emotion_model = quantize_dynamic_int8(emotion_model)
+    return SharedTokenizerAnalyzer(tokenizer, sentiment_model, emotion_model)
+
+
+def build_text_analyzer(engine='pipelines', quantization='none', multihead_path=None):
+    """Callable mapping a list of texts to (sentiment, emotion) results"""
+    if engine not in ANALYSIS_ENGINES:
+        raise ValueError(f"Unknown analysis engine {engine!r}, expected one of {ANALYSIS_ENGINES}")
+    if quantization not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization mode {quantization!r}, expected one of {QUANTIZATION_MODES}")
+    if engine == 'shared-tokenizer':
+        return load_shared_tokenizer_analyzer(quantization)
+    if engine == 'multihead':
+        import multihead
+        if not multihead_path:
+            raise ValueError("The multihead engine needs MULTIHEAD_MODEL_PATH (build it with multihead.py distill)")
+        return multihead.load_analyzer(multihead_path, quantization)
+    return PipelineAnalyzer(build_sentiment_pipeline(quantization), build_emotion_pipeline(quantization))
+
+
+def model_size_bytes(model):
+    """Serialized size of the model's weights (counts packed int8 weights too)"""
+    import torch
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
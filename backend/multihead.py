@@ -0,0 +1,261 @@
+# multihead.py - One encoder pass feeding both the emotion and the sentiment head
+"""Build and load the ``multihead`` analysis engine.
+
+    python multihead.py distill --texts corpus.txt --output multihead_model
+    python multihead.py distill --from-db 50000 --epochs 6 --output multihead_model
+
+The emotion model (DistilRoBERTa, 6 layers) becomes the shared encoder and
+keeps its own classification head, so emotion results are unchanged. A
+sentiment head of the same shape is trained on that encoder's features to
+reproduce the sentiment model's (RoBERTa-base, 12 layers) output
+distribution. The encoder stays frozen, so features are computed once and
+only the small head is trained. Serving then needs one 6-layer forward
+pass per batch instead of a 12-layer and a 6-layer one, with a single
+encoder resident in memory.
+"""
+import os
+import sys
+import json
+import copy
+import random
+import hashlib
+from datetime import datetime
+
+import click
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BACKEND_DIR)
+
+import models
+
+MANIFEST = 'multihead.json'
+HEAD_WEIGHTS = 'sentiment_head.pt'
+
+
+def read_manifest(path):
+    """The build's manifest, or None if ``path`` holds no multihead model"""
+    try:
+        with open(os.path.join(path, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def build_head(config, num_labels):
+    """Classification head shaped like the encoder's own (dense -> tanh -> projection on <s>)"""
+    from transformers.models.roberta.modeling_roberta import RobertaClassificationHead
+    head_config = copy.deepcopy(config)
+    head_config.num_labels = num_labels
+    return RobertaClassificationHead(head_config)
+
+
+class MultiHeadAnalyzer:
+    """Sentiment and emotion from a single tokenization and encoder pass"""
+
+    def __init__(self, tokenizer, model, sentiment_head, sentiment_labels, max_length=models.MAX_TOKENS):
+        self.tokenizer = tokenizer
+        self.model = model.eval()
+        self.sentiment_head = sentiment_head.eval()
+        self.max_length = max_length
+        self.sentiment_labels = sentiment_labels
+        self.emotion_labels = models.config_labels(model)
+
+    def encode(self, texts):
+        encoded = self.tokenizer(list(texts), padding=True, truncation=True,
+                                 max_length=self.max_length, return_tensors='pt')
+        return {'input_ids': encoded['input_ids'], 'attention_mask': encoded['attention_mask']}
+
+    def __call__(self, texts):
+        import torch
+        inputs = self.encode(texts)
+        with torch.inference_mode():
+            hidden = self.model.base_model(**inputs).last_hidden_state
+            emotions = self.model.classifier(hidden).softmax(-1).tolist()
+            sentiments = self.sentiment_head(hidden).softmax(-1).tolist()
+        return [(models.top_label(self.sentiment_labels, s), models.distribution(self.emotion_labels, e))
+                for s, e in zip(sentiments, emotions)]
+
+    def modules(self):
+        return {'encoder_and_emotion': self.model, 'sentiment_head': self.sentiment_head}
+
+
+def load_analyzer(path, quantization='none'):
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+    manifest = read_manifest(path)
+    if manifest is None:
+        raise ValueError(f"No multihead model at {path} (missing {MANIFEST})")
+    tokenizer = AutoTokenizer.from_pretrained(path)
+    model = AutoModelForSequenceClassification.from_pretrained(path)
+    head = build_head(model.config, len(manifest['sentiment_labels']))
+    head.load_state_dict(torch.load(os.path.join(path, HEAD_WEIGHTS), map_location='cpu'))
+    if quantization == 'dynamic-int8':
+        model = models.quantize_dynamic_int8(model)
+        head = models.quantize_dynamic_int8(head)
+    return MultiHeadAnalyzer(tokenizer, model, head, manifest['sentiment_labels'])
+
+
+# ========== DISTILLATION ==========
+
+def read_texts(paths):
+    """One text per line; for TSV files only the first column is used"""
+    texts = []
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                text = line.rstrip('\n').split('\t')[0].strip()
+                if text and not text.startswith('#'):
+                    texts.append(text)
+    return texts
+
+
+def read_db_texts(limit):
+    """Recent check-in, feedback and chat message texts from DATABASE_URL"""
+    import psycopg2
+    from reanalyze import DEFAULT_DATA_TYPES
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        cur = conn.cursor()
+        # The app stores texts as text_<type> and feedback_<relationship>
+        cur.execute("""
+            (SELECT content FROM user_data
+             WHERE data_type LIKE ANY(%(patterns)s) AND file_path IS NULL AND content <> ''
+             ORDER BY id DESC LIMIT %(limit)s)
+            UNION ALL
+            (SELECT content FROM chat_messages
+             WHERE content <> '' ORDER BY id DESC LIMIT %(limit)s)
+        """, {'limit': limit, 'patterns': DEFAULT_DATA_TYPES.split(',')})
+        return [row[0] for row in cur.fetchall()]
+    finally:
+        conn.close()
+
+
+def encode_batches(tokenizer, texts, batch_size):
+    for start in range(0, len(texts), batch_size):
+        encoded = tokenizer(texts[start:start + batch_size], padding=True, truncation=True,
+                            max_length=models.MAX_TOKENS, return_tensors='pt')
+        yield {'input_ids': encoded['input_ids'], 'attention_mask': encoded['attention_mask']}
+
+
+def compute_targets(tokenizer, student, teacher, texts, batch_size):
+    """Frozen-encoder <s> features and teacher sentiment logits for every text"""
+    import torch
+    features, logits = [], []
+    # no_grad rather than inference_mode: the features are inputs to training later
+    with torch.no_grad():
+        for done, inputs in enumerate(encode_batches(tokenizer, texts, batch_size), 1):
+            features.append(student.base_model(**inputs).last_hidden_state[:, :1, :])
+            logits.append(teacher(**inputs).logits)
+            if done % 20 == 0:
+                click.echo(f"  encoded {min(done * batch_size, len(texts))}/{len(texts)}")
+    return torch.cat(features), torch.cat(logits)
+
+
+def train_head(head, features, teacher_logits, epochs, batch_size, learning_rate, temperature, seed):
+    """Fit ``head`` to the teacher's softened distribution (KL divergence, scaled by T^2)"""
+    import torch
+    import torch.nn.functional as F
+    generator = torch.Generator().manual_seed(seed)
+    optimizer = torch.optim.AdamW(head.parameters(), lr=learning_rate)
+    targets = (teacher_logits / temperature).softmax(-1)
+    head.train()
+    for epoch in range(1, epochs + 1):
+        order = torch.randperm(len(features), generator=generator)
+        total = 0.0
+        for start in range(0, len(order), batch_size):
+            index = order[start:start + batch_size]
+            log_probs = F.log_softmax(head(features[index]) / temperature, dim=-1)
+            loss = F.kl_div(log_probs, targets[index], reduction='batchmean') * temperature ** 2
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total += loss.item() * len(index)
+        click.echo(f"  epoch {epoch}/{epochs}: loss {total / len(order):.4f}")
+    head.eval()
+    return head
+
+
+def agreement(head, features, teacher_logits):
+    import torch
+    if not len(features):
+        return None
+    with torch.inference_mode():
+        predicted = head(features).argmax(-1)
+    return round(100.0 * (predicted == teacher_logits.argmax(-1)).float().mean().item(), 2)
+
+
+@click.group()
+def cli():
+    """Shared-encoder model tools"""
+
+
+@cli.command()
+@click.option('--texts', 'text_files', multiple=True, type=click.Path(exists=True, dir_okay=False),
+              help='Unlabeled training texts, one per line (repeatable)')
+@click.option('--from-db', type=int, default=0, help='Also use up to this many recent texts from DATABASE_URL')
+@click.option('--output', type=click.Path(file_okay=False), required=True, help='Directory to write the model to')
+@click.option('--holdout', type=float, default=0.1, help='Fraction of texts held out to measure agreement')
+@click.option('--epochs', type=int, default=4)
+@click.option('--batch-size', type=int, default=32, help='Texts per encoder batch while extracting features')
+@click.option('--learning-rate', type=float, default=1e-3)
+@click.option('--temperature', type=float, default=2.0, help='Softmax temperature for distillation')
+@click.option('--seed', type=int, default=1)
+def distill(text_files, from_db, output, holdout, epochs, batch_size, learning_rate, temperature, seed):
+    """Train a sentiment head on the emotion encoder and save the combined model"""
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+    # Keep eval/labeled_messages.tsv out of training so model_eval.py stays a fair test
+    texts = read_texts(text_files)
+    if from_db:
+        texts += read_db_texts(from_db)
+    texts = list(dict.fromkeys(texts))
+    if len(texts) < 100:
+        raise click.ClickException(f"Only {len(texts)} distinct texts; distillation needs a few thousand to be reliable")
+    random.Random(seed).shuffle(texts)
+    split = int(len(texts) * (1.0 - holdout))
+    click.echo(f"{len(texts)} distinct texts ({split} train, {len(texts) - split} held out)")
+
+    torch.manual_seed(seed)
+    tokenizer = AutoTokenizer.from_pretrained(models.EMOTION_MODEL)
+    if AutoTokenizer.from_pretrained(models.SENTIMENT_MODEL).get_vocab() != tokenizer.get_vocab():
+        raise click.ClickException('Sentiment and emotion models do not share a vocabulary')
+    student = AutoModelForSequenceClassification.from_pretrained(models.EMOTION_MODEL).eval()
+    teacher = AutoModelForSequenceClassification.from_pretrained(models.SENTIMENT_MODEL).eval()
+    sentiment_labels = models.config_labels(teacher)
+
+    click.echo('Encoding texts with the encoder and the teacher...')
+    features, teacher_logits = compute_targets(tokenizer, student, teacher, texts, batch_size)
+    del teacher
+
+    head = build_head(student.config, len(sentiment_labels))
+    click.echo('Training the sentiment head...')
+    train_head(head, features[:split], teacher_logits[:split], epochs, 64, learning_rate, temperature, seed)
+    held_out = agreement(head, features[split:], teacher_logits[split:])
+    click.echo(f"Held-out agreement with {models.SENTIMENT_MODEL}: {held_out}%")
+
+    os.makedirs(output, exist_ok=True)
+    student.save_pretrained(output)
+    tokenizer.save_pretrained(output)
+    head_path = os.path.join(output, HEAD_WEIGHTS)
+    torch.save(head.state_dict(), head_path)
+    with open(head_path, 'rb') as f:
+        build_id = hashlib.sha256(f.read()).hexdigest()[:16]
+    with open(os.path.join(output, MANIFEST), 'w') as f:
+        json.dump({
+            'build_id': build_id,
+            'encoder': models.EMOTION_MODEL,
+            'teacher': models.SENTIMENT_MODEL,
+            'sentiment_labels': sentiment_labels,
+            'texts': len(texts),
+            'holdout_agreement': held_out,
+            'epochs': epochs,
+            'temperature': temperature,
+            'created_at': datetime.now().isoformat()
+        }, f, indent=2)
+    click.echo(f"Saved multihead model {build_id} to {output}; serve it with "
+               f"ANALYSIS_ENGINE=multihead MULTIHEAD_MODEL_PATH={output}")
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,159 @@
+# queries.py - SQL run by the API routes, shared with the index check in migrate.py
+#
+# Routes execute these exact strings with named parameters, so
+# ``flask db-check-indexes`` EXPLAINs what production runs instead of a copy.
+
+# ---- Dashboard ----
+
+USER_SQL = "SELECT * FROM users WHERE id = %(user_id)s"
+
+LATEST_HEALTH_METRICS_SQL = """
+    SELECT * FROM health_metrics WHERE user_id = %(user_id)s ORDER BY created_at DESC LIMIT 1
+"""
+
+RECENT_ANALYSIS_SQL = """
+    SELECT ar.*, ud.data_type, ud.created_at as data_created_at
+    FROM analysis_results ar
+    JOIN user_data ud ON ar.data_id = ud.id
+    WHERE ar.user_id = %(user_id)s
+    ORDER BY ar.created_at DESC LIMIT 10
+"""
+
+DATA_TYPE_COUNTS_SQL = """
+    SELECT data_type, COUNT(*) as count
+    FROM user_data
+    WHERE user_id = %(user_id)s
+    GROUP BY data_type
+"""
+
+# ---- Writes ----
+
+ENERGY_CHECK_IN_SQL = """
+    WITH updated AS (
+        UPDATE health_metrics
+        SET energy_level = %(energy_level)s, energy_streak = energy_streak + 1, check_ins = check_ins + 1,
+            growth_points = growth_points + 5
+        WHERE user_id = %(user_id)s
+        RETURNING energy_streak, check_ins, created_at
+    )
+    SELECT energy_streak, check_ins FROM updated ORDER BY created_at DESC LIMIT 1
+"""
+
+# Rows a background job already committed, so a re-run doesn't insert them twice
+JOB_ROW_SQL = "SELECT id, user_id FROM user_data WHERE job_id = %(job_id)s"
+
+# The session row stays locked until commit, so the new count numbers the
+# message in commit order for the event stream
+NEXT_MESSAGE_SEQ_SQL = """
+    UPDATE chat_sessions SET message_count = message_count + 1
+    WHERE id = %(session_id)s
+    RETURNING message_count
+"""
+
+SESSION_STATUS_SQL = "SELECT status FROM chat_sessions WHERE id = %(session_id)s"
+
+# ---- Chat sessions ----
+
+# Columns the session listing can return (``fields`` query parameter). Patient
+# columns are looked up per row of the page, always by primary key.
+CHAT_SESSION_FIELDS = {
+    'session_id': 'cs.id',
+    'patient_id': 'cs.patient_id',
+    'therapist_id': 'cs.therapist_id',
+    'patient_name': '(SELECT u.name FROM users u WHERE u.id = cs.patient_id)',
+    'email': '(SELECT u.email FROM users u WHERE u.id = cs.patient_id)',
+    'session_date': 'cs.session_date',
+    'duration_minutes': 'cs.duration_minutes',
+    'status': 'cs.status',
+    'primary_emotion': 'cs.primary_emotion',
+    'emotion_confidence': 'cs.emotion_confidence',
+    'message_count': 'cs.message_count'
+}
+DEFAULT_CHAT_SESSION_FIELDS = [
+    'session_id', 'patient_id', 'patient_name', 'email', 'session_date', 'duration_minutes',
+    'status', 'primary_emotion', 'emotion_confidence', 'message_count'
+]
+
+# Listing filters by name, each with the parameters it binds
+CHAT_SESSION_FILTERS = {
+    'therapist_id': "cs.therapist_id = %(therapist_id)s",
+    'patient_id': "cs.patient_id = %(patient_id)s",
+    'status': "cs.status = %(status)s",
+    'from': "cs.session_date >= %(from)s",
+    'to': "cs.session_date < %(to)s",
+    'cursor': "(cs.session_date, cs.id) < (%(cursor_date)s, %(cursor_id)s)"
+}
+
+
+def chat_sessions_sql(fields, filters):
+    """Keyset-paginated session listing selecting ``fields`` with the named ``filters``.
+
+    Binds ``limit`` plus the parameters of each filter. The keyset columns
+    are always selected (as _cursor_id / _cursor_date) to build the next cursor.
+    """
+    select = [f"{CHAT_SESSION_FIELDS[field]} AS {field}" for field in fields]
+    select += ["cs.id AS _cursor_id", "cs.session_date AS _cursor_date"]
+    where = f"WHERE {' AND '.join(CHAT_SESSION_FILTERS[name] for name in filters)}" if filters else ""
+    return f"""
+    SELECT {', '.join(select)}
+    FROM chat_sessions cs
+    {where}
+    ORDER BY cs.session_date DESC, cs.id DESC
+    LIMIT %(limit)s
+"""
+
+
+CHAT_SESSION_SQL = """
+    SELECT
+        cs.*,
+        u.name as patient_name,
+        u.email,
+        hm.energy_level,
+        hm.mood_score
+    FROM chat_sessions cs
+    JOIN users u ON cs.patient_id = u.id
+    LEFT JOIN health_metrics hm ON u.id = hm.user_id
+    WHERE cs.id = %(session_id)s
+"""
+
+# Latest messages first when limited (``limit`` NULL returns all), returned oldest first
+CHAT_MESSAGES_SQL = """
+    SELECT * FROM (
+        SELECT
+            cm.*,
+            ea.sentiment_score,
+            ea.emotion_detected,
+            ea.confidence_score,
+            ea.emotion_scores
+        FROM chat_messages cm
+        LEFT JOIN emotion_analysis ea ON cm.id = ea.message_id
+        WHERE cm.session_id = %(session_id)s
+        ORDER BY cm.timestamp DESC
+        LIMIT %(limit)s
+    ) recent
+    ORDER BY timestamp ASC
+"""
+
+# Includes live call estimates, which have no message
+SESSION_EMOTION_HISTORY_SQL = """
+    SELECT
+        eh.*,
+        cm.content as message_content
+    FROM emotion_history eh
+    LEFT JOIN chat_messages cm ON eh.message_id = cm.id
+    WHERE eh.session_id = %(session_id)s
+    ORDER BY eh.timestamp DESC
+    LIMIT %(limit)s
+"""
+
+# Stream backfill: messages after a session sequence number
+SESSION_EVENTS_SQL = """
+    SELECT
+        cm.id, cm.session_seq, cm.session_id, cm.sender_type, cm.sender_id, cm.content, cm.timestamp,
+        ea.sentiment_score, ea.emotion_detected, ea.confidence_score
+    FROM chat_messages cm
+    LEFT JOIN emotion_analysis ea ON cm.id = ea.message_id
+    WHERE cm.session_id = %(session_id)s AND cm.session_seq > %(after_seq)s
+    ORDER BY cm.session_seq
+    LIMIT %(limit)s
+"""
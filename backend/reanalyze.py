@@ -0,0 +1,273 @@
+# reanalyze.py - Re-score stored check-in and feedback texts with the current models
+"""Stream historical ``user_data`` texts through the text analyzer and
+rewrite their ``analysis_results``, e.g. after changing models or risk
+thresholds.
+
+    python reanalyze.py run
+    python reanalyze.py run --batch-size 64 --parallel 4 --output results/reanalyze.json
+    INFERENCE_BACKEND=process INFERENCE_WORKERS=4 python reanalyze.py run --parallel 4
+    python reanalyze.py run --restart --data-types 'text_%'
+
+Rows are read in id order from a server-side (named) cursor, so memory
+holds a few batches however large the table is. Each batch is analyzed in
+one ``analyze_text_batch`` call and written with a single upsert keyed on
+``data_id``. The checkpoint file records the id below which every batch
+is written, so an interrupted run resumes there; batches that were in
+flight are simply rescored again. ``--parallel`` batches are in flight at
+once, which only helps if the models can run them concurrently (the
+process inference backend with as many workers).
+
+Once rows were rescored, the shared dashboard cache file
+(DASHBOARD_CACHE_PATH) is cleared so no worker reloads an old dashboard
+from it. Running servers keep their in-memory copies until
+DASHBOARD_CACHE_TTL expires, so dashboards can show the old scores for
+that long.
+"""
+import os
+import sys
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import click
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CHECKPOINT = os.path.join(BACKEND_DIR, 'uploads', 'reanalyze_checkpoint.json')
+sys.path.insert(0, BACKEND_DIR)
+
+# Analyzed text rows; voice rows (which have a file) and activity logs are not
+DEFAULT_DATA_TYPES = 'text_%,feedback_%'
+
+SELECT_SQL = """
+SELECT id, user_id, data_type, content, created_at FROM user_data
+WHERE id > %(after_id)s AND file_path IS NULL AND content <> '' AND data_type LIKE ANY(%(patterns)s)
+ORDER BY id
+"""
+
+# analysis_results has no unique key on data_id, so update what exists and insert the rest
+UPSERT_SQL = """
+WITH v (data_id, user_id, sentiment_score, emotion_detected, risk_level, confidence_score, emotion_scores, created_at) AS (
+    VALUES %s
+), updated AS (
+    UPDATE analysis_results ar SET
+        sentiment_score = v.sentiment_score,
+        emotion_detected = v.emotion_detected,
+        risk_level = v.risk_level,
+        confidence_score = v.confidence_score,
+        emotion_scores = v.emotion_scores
+    FROM v WHERE ar.data_id = v.data_id
+    RETURNING ar.data_id
+), inserted AS (
+    INSERT INTO analysis_results
+        (user_id, data_id, sentiment_score, emotion_detected, risk_level, confidence_score, emotion_scores, created_at)
+    SELECT v.user_id, v.data_id, v.sentiment_score, v.emotion_detected, v.risk_level, v.confidence_score,
+           v.emotion_scores, v.created_at
+    FROM v WHERE NOT EXISTS (SELECT 1 FROM updated WHERE updated.data_id = v.data_id)
+    RETURNING 1
+)
+SELECT (SELECT COUNT(DISTINCT data_id) FROM updated) AS updated, (SELECT COUNT(*) FROM inserted) AS inserted
+"""
+UPSERT_TEMPLATE = "(%s::int, %s::int, %s::real, %s::varchar, %s::varchar, %s::real, %s::bytea, %s::timestamp)"
+
+
+def read_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_checkpoint(path, state):
+    """Replace the checkpoint atomically so a crash never leaves half a file"""
+    state['updated_at'] = datetime.now().isoformat()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(temp_path, path)
+
+
+def read_batches(conn, after_id, patterns, batch_size, limit=None):
+    """Batches of rows after ``after_id`` from a named (server-side) cursor"""
+    cur = conn.cursor(name='reanalyze_user_data')
+    cur.itersize = batch_size * 4
+    cur.execute(SELECT_SQL, {'after_id': after_id, 'patterns': patterns})
+    batch = []
+    read = 0
+    for row in cur:
+        batch.append(row)
+        read += 1
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+        if limit and read >= limit:
+            break
+    if batch:
+        yield batch
+    cur.close()
+
+
+def rescore_batch(backend, rows):
+    """Analyze one batch and upsert its results; returns counts and timings"""
+    import emotion_vectors
+    from psycopg2.extras import execute_values
+
+    t0 = time.perf_counter()
+    analyses = backend.analyze_text_batch([row['content'] for row in rows])
+    analyze_seconds = time.perf_counter() - t0
+
+    values = []
+    for row, analysis in zip(rows, analyses):
+        sentiment_score = analysis['sentiment_score']
+        if row['data_type'].startswith('feedback_'):
+            sentiment_score = backend.weighted_feedback_sentiment(row['data_type'][len('feedback_'):], sentiment_score)
+        values.append((row['id'], row['user_id'], sentiment_score, analysis['emotion'],
+                       backend.determine_risk_level(sentiment_score), analysis['confidence'],
+                       emotion_vectors.pack(analysis.get('emotion_scores')), row['created_at']))
+
+    t0 = time.perf_counter()
+    with backend.db_connection() as conn:
+        if not conn:
+            raise RuntimeError('Database connection failed')
+        cur = conn.cursor()
+        counts = execute_values(cur, UPSERT_SQL, values, template=UPSERT_TEMPLATE,
+                                page_size=len(values), fetch=True)[0]
+        conn.commit()
+        cur.close()
+    return {
+        'rows': len(rows),
+        'updated': counts['updated'],
+        'inserted': counts['inserted'],
+        'analyze_seconds': analyze_seconds,
+        'write_seconds': time.perf_counter() - t0
+    }
+
+
+@click.group()
+def cli():
+    """Offline re-analysis tools"""
+
+
+@cli.command()
+@click.option('--data-types', default=DEFAULT_DATA_TYPES, help='Comma-separated user_data.data_type LIKE patterns')
+@click.option('--batch-size', type=int, default=64, help='Texts per analysis batch and upsert')
+@click.option('--parallel', type=int, default=1, help='Batches in flight at once')
+@click.option('--checkpoint', type=click.Path(dir_okay=False), default=DEFAULT_CHECKPOINT, help='Progress file to resume from')
+@click.option('--restart', is_flag=True, help='Ignore an existing checkpoint and start from the first row')
+@click.option('--limit', type=int, default=None, help='Stop after this many rows (trial runs)')
+@click.option('--report-every', type=float, default=10.0, help='Seconds between progress lines')
+@click.option('--rebuild-rollups/--no-rebuild-rollups', default=True, help='Recompute user_daily_rollups when done')
+@click.option('--output', type=click.Path(dir_okay=False), default=None, help='Write the JSON throughput report here')
+def run(data_types, batch_size, parallel, checkpoint, restart, limit, report_every, rebuild_rollups, output):
+    """Re-score user_data texts and upsert their analysis_results"""
+    os.environ.setdefault('MODEL_LOADING', 'eager')
+    import app as backend
+    import rollups
+
+    backend.load_models()
+
+    if backend.app.config['MODEL_LOADING'] != 'off' and not backend.model_loader.is_ready:
+        raise click.ClickException(f"Models failed to load: {backend.model_loader.error} "
+                                   f"(MODEL_LOADING=off rescores with the lexicon instead)")
+    identity = backend.MODEL_IDENTITY if backend.model_loader.is_ready else 'lexicon'
+    patterns = [pattern.strip() for pattern in data_types.split(',') if pattern.strip()]
+
+    state = None if restart else read_checkpoint(checkpoint)
+    if state is not None:
+        if state['model_identity'] != identity or state['data_types'] != patterns:
+            raise click.ClickException(
+                f"{checkpoint} is for {state['model_identity']} over {state['data_types']}; "
+                f"use --restart to start over with {identity}")
+        click.echo(f"Resuming after user_data id {state['last_id']} ({state['rows']} rows already done)")
+    else:
+        state = {'model_identity': identity, 'data_types': patterns, 'last_id': 0,
+                 'rows': 0, 'updated': 0, 'inserted': 0, 'started_at': datetime.now().isoformat()}
+
+    run_totals = {'rows': 0, 'updated': 0, 'inserted': 0, 'batches': 0, 'analyze_seconds': 0.0, 'write_seconds': 0.0}
+    started = time.perf_counter()
+    last_report = started
+
+    def settle(last_id, future):
+        nonlocal last_report
+        result = future.result()
+        for key in ('rows', 'updated', 'inserted'):
+            state[key] += result[key]
+        for key in ('rows', 'updated', 'inserted', 'analyze_seconds', 'write_seconds'):
+            run_totals[key] += result[key]
+        run_totals['batches'] += 1
+        # Batches settle in submission order, so everything up to last_id is written
+        state['last_id'] = last_id
+        write_checkpoint(checkpoint, state)
+        now = time.perf_counter()
+        if now - last_report >= report_every:
+            last_report = now
+            click.echo(f"  {run_totals['rows']} rows ({run_totals['rows'] / (now - started):.1f} rows/s), "
+                       f"through id {last_id}")
+
+    executor = ThreadPoolExecutor(max_workers=max(1, parallel), thread_name_prefix='reanalyze')
+    in_flight = deque()
+    try:
+        with backend.db_connection() as conn:
+            if not conn:
+                raise click.ClickException('Database connection failed')
+            for batch in read_batches(conn, state['last_id'], patterns, batch_size, limit):
+                in_flight.append((batch[-1]['id'], executor.submit(rescore_batch, backend, batch)))
+                # Bounded read-ahead: at most two batches per worker are held in memory
+                while len(in_flight) >= 2 * max(1, parallel) or (in_flight and in_flight[0][1].done()):
+                    settle(*in_flight.popleft())
+            while in_flight:
+                settle(*in_flight.popleft())
+            conn.rollback()  # end the read transaction that backed the named cursor
+    except KeyboardInterrupt:
+        click.echo(f"Interrupted; rerun to resume after user_data id {state['last_id']}")
+        raise SystemExit(130)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    elapsed = time.perf_counter() - started
+    rows = run_totals['rows']
+    click.echo(f"Rescored {rows} rows in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:.1f} rows/s): "
+               f"{run_totals['updated']} updated, {run_totals['inserted']} inserted, "
+               f"{run_totals['analyze_seconds']:.1f}s analyzing, {run_totals['write_seconds']:.1f}s writing")
+
+    if rows and backend.app.config['DASHBOARD_CACHE_PATH']:
+        # Every cached dashboard may show rescored entries; one statement beats a delete per user
+        backend.dashboard_cache.clear()
+        click.echo(f"Cleared the dashboard cache at {backend.app.config['DASHBOARD_CACHE_PATH']}")
+
+    rollup_seconds = None
+    if rebuild_rollups and rows:
+        t0 = time.perf_counter()
+        with backend.db_connection() as conn:
+            if not conn:
+                raise click.ClickException('Database connection failed')
+            cur = conn.cursor()
+            written = rollups.rebuild(cur)
+            conn.commit()
+            cur.close()
+        rollup_seconds = time.perf_counter() - t0
+        click.echo(f"Rebuilt {written} daily rollup rows in {rollup_seconds:.1f}s")
+
+    if output:
+        report = {
+            'meta': {
+                'timestamp': datetime.now().isoformat(),
+                'model_identity': identity,
+                'config': {'data_types': patterns, 'batch_size': batch_size, 'parallel': parallel, 'limit': limit}
+            },
+            'checkpoint': state,
+            'run': {**run_totals, 'seconds': round(elapsed, 3),
+                    'rows_per_second': round(rows / elapsed, 2) if elapsed else None,
+                    'rollup_seconds': round(rollup_seconds, 3) if rollup_seconds is not None else None}
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        click.echo(f"Report written to {output}")
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,154 @@
+# rollups.py - Per-user daily aggregates backing the analytics endpoint
+import json
+from psycopg2.extras import execute_values
+
+UPSERT_SQL = """
+INSERT INTO user_daily_rollups AS r (user_id, day, mood_sum, mood_count, data_type_counts, risk_counts)
+VALUES %s
+ON CONFLICT (user_id, day) DO UPDATE SET
+    mood_sum = r.mood_sum + EXCLUDED.mood_sum,
+    mood_count = r.mood_count + EXCLUDED.mood_count,
+    data_type_counts = jsonb_add_counts(r.data_type_counts, EXCLUDED.data_type_counts),
+    risk_counts = jsonb_add_counts(r.risk_counts, EXCLUDED.risk_counts),
+    updated_at = NOW()
+"""
+
+REBUILD_SQL = """
+INSERT INTO user_daily_rollups (user_id, day, mood_sum, mood_count, data_type_counts, risk_counts, energy_level)
+SELECT
+    days.user_id,
+    days.day,
+    COALESCE(mood.mood_sum, 0),
+    COALESCE(mood.mood_count, 0),
+    COALESCE(types.counts, '{{}}'::jsonb),
+    COALESCE(risks.counts, '{{}}'::jsonb),
+    energy.energy_level
+FROM (
+    SELECT user_id, DATE(created_at) AS day FROM user_data WHERE {user_filter}
+    UNION
+    SELECT user_id, DATE(created_at) FROM analysis_results WHERE {user_filter}
+    UNION
+    SELECT user_id, DATE(created_at) FROM health_metrics WHERE {user_filter}
+) days
+LEFT JOIN (
+    SELECT user_id, DATE(created_at) AS day, SUM(sentiment_score) AS mood_sum, COUNT(sentiment_score) AS mood_count
+    FROM analysis_results WHERE {user_filter}
+    GROUP BY user_id, DATE(created_at)
+) mood ON mood.user_id = days.user_id AND mood.day = days.day
+LEFT JOIN (
+    SELECT user_id, day, jsonb_object_agg(data_type, n) AS counts FROM (
+        SELECT user_id, DATE(created_at) AS day, data_type, COUNT(*) AS n
+        FROM user_data WHERE {user_filter}
+        GROUP BY user_id, DATE(created_at), data_type
+    ) t GROUP BY user_id, day
+) types ON types.user_id = days.user_id AND types.day = days.day
+LEFT JOIN (
+    SELECT user_id, day, jsonb_object_agg(risk_level, n) AS counts FROM (
+        SELECT user_id, DATE(created_at) AS day, risk_level, COUNT(*) AS n
+        FROM analysis_results WHERE risk_level IS NOT NULL AND {user_filter}
+        GROUP BY user_id, DATE(created_at), risk_level
+    ) t GROUP BY user_id, day
+) risks ON risks.user_id = days.user_id AND risks.day = days.day
+LEFT JOIN (
+    SELECT DISTINCT ON (user_id, DATE(created_at)) user_id, DATE(created_at) AS day, energy_level
+    FROM health_metrics WHERE {user_filter}
+    ORDER BY user_id, DATE(created_at), created_at DESC
+) energy ON energy.user_id = days.user_id AND energy.day = days.day
+WHERE days.user_id IS NOT NULL
+"""
+
+ANALYTICS_SQL = """
+SELECT day, mood_sum, mood_count, data_type_counts, risk_counts, energy_level,
+       day >= CURRENT_DATE - %(days)s AS recent
+FROM user_daily_rollups
+WHERE user_id = %(user_id)s
+ORDER BY day
+"""
+
+
+def record(cur, user_id, data_type=None, sentiment=None, risk_level=None, day=None):
+    """Fold a single write into today's (or ``day``'s) rollup row"""
+    record_many(cur, user_id, [{
+        'data_type': data_type,
+        'sentiment': sentiment,
+        'risk_level': risk_level,
+        'day': day
+    }])
+
+
+def record_many(cur, user_id, events):
+    """Fold several writes for one user into their rollup rows in one statement.
+
+    Each event may carry ``data_type``, ``sentiment``, ``risk_level`` and a
+    ``day`` (date, datetime or ISO string; defaults to today).
+    """
+    per_day = {}
+    for event in events:
+        day = event.get('day')
+        if day is not None and not isinstance(day, str):
+            day = day.isoformat()
+        if isinstance(day, str):
+            day = day[:10]
+        bucket = per_day.setdefault(day, {'mood_sum': 0.0, 'mood_count': 0, 'types': {}, 'risks': {}})
+        if event.get('sentiment') is not None:
+            bucket['mood_sum'] += float(event['sentiment'])
+            bucket['mood_count'] += 1
+        if event.get('data_type'):
+            bucket['types'][event['data_type']] = bucket['types'].get(event['data_type'], 0) + 1
+        if event.get('risk_level'):
+            bucket['risks'][event['risk_level']] = bucket['risks'].get(event['risk_level'], 0) + 1
+
+    if not per_day:
+        return
+    rows = [(user_id, day, bucket['mood_sum'], bucket['mood_count'],
+             json.dumps(bucket['types']), json.dumps(bucket['risks']))
+            for day, bucket in per_day.items()]
+    execute_values(cur, UPSERT_SQL, rows,
+                   template="(%s, COALESCE(%s::date, CURRENT_DATE), %s, %s, %s::jsonb, %s::jsonb)")
+
+
+def record_energy(cur, user_id, energy_level):
+    """Remember the latest energy level reported today"""
+    cur.execute("""
+        INSERT INTO user_daily_rollups (user_id, day, energy_level)
+        VALUES (%s, CURRENT_DATE, %s)
+        ON CONFLICT (user_id, day) DO UPDATE SET energy_level = EXCLUDED.energy_level, updated_at = NOW()
+    """, (user_id, energy_level))
+
+
+def rebuild(cur, user_id=None):
+    """Recompute rollups from the raw tables (backfill / repair). Returns rows written."""
+    if user_id is None:
+        cur.execute("DELETE FROM user_daily_rollups")
+        cur.execute(REBUILD_SQL.format(user_filter='TRUE'))
+    else:
+        cur.execute("DELETE FROM user_daily_rollups WHERE user_id = %s", (user_id,))
+        cur.execute(REBUILD_SQL.format(user_filter='user_id = %(user_id)s'), {'user_id': user_id})
+    return cur.rowcount
+
+
+def load_analytics(cur, user_id, days=30):
+    """Answer the analytics endpoint from the rollups with one indexed lookup"""
+    cur.execute(ANALYTICS_SQL, {'days': days, 'user_id': user_id})
+
+    mood_trends = []
+    energy_trends = []
+    data_counts = {}
+    risk_counts = {}
+    for row in cur.fetchall():
+        if row['recent']:
+            if row['mood_count']:
+                mood_trends.append({'date': str(row['day']), 'avg_mood': row['mood_sum'] / row['mood_count']})
+            if row['energy_level'] is not None:
+                energy_trends.append({'date': str(row['day']), 'energy_level': row['energy_level']})
+        for data_type, count in row['data_type_counts'].items():
+            data_counts[data_type] = data_counts.get(data_type, 0) + count
+        for risk_level, count in row['risk_counts'].items():
+            risk_counts[risk_level] = risk_counts.get(risk_level, 0) + count
+
+    return {
+        'mood_trends': mood_trends,
+        'energy_trends': energy_trends,
+        'data_distribution': [{'data_type': k, 'count': v} for k, v in data_counts.items()],
+        'risk_distribution': [{'risk_level': k, 'count': v} for k, v in risk_counts.items()]
+    }
@@ -0,0 +1,147 @@
+# session_summary.py - Incremental per-session emotion aggregation
+import json
+
+import numpy as np
+
+import emotion_vectors
+
+TRAJECTORY_POINTS = 50   # most recent per-message sentiment values kept
+EMA_ALPHA = 0.3          # weight of the newest message in the sentiment moving average
+
+GET_SQL = "SELECT * FROM chat_session_summaries WHERE session_id = %(session_id)s"
+
+# One upsert per analyzed message; the work is constant regardless of session length
+RECORD_SQL = f"""
+INSERT INTO chat_session_summaries AS s (
+    session_id, message_count, emotion_counts, emotion_confidence_sums,
+    sentiment_sum, sentiment_sq_sum, sentiment_ema,
+    first_sentiment, last_sentiment, min_sentiment, max_sentiment, trajectory, emotion_score_sums, updated_at
+)
+VALUES (
+    %(session_id)s, 1, jsonb_build_object(%(emotion)s, 1), jsonb_build_object(%(emotion)s, %(confidence)s),
+    %(sentiment)s, %(sentiment)s * %(sentiment)s, %(sentiment)s,
+    %(sentiment)s, %(sentiment)s, %(sentiment)s, %(sentiment)s, ARRAY[%(sentiment)s::double precision],
+    %(scores)s::double precision[], NOW()
+)
+ON CONFLICT (session_id) DO UPDATE SET
+    message_count = s.message_count + 1,
+    emotion_counts = s.emotion_counts || jsonb_build_object(
+        %(emotion)s, COALESCE((s.emotion_counts ->> %(emotion)s)::int, 0) + 1),
+    emotion_confidence_sums = s.emotion_confidence_sums || jsonb_build_object(
+        %(emotion)s, COALESCE((s.emotion_confidence_sums ->> %(emotion)s)::double precision, 0) + %(confidence)s),
+    sentiment_sum = s.sentiment_sum + %(sentiment)s,
+    sentiment_sq_sum = s.sentiment_sq_sum + %(sentiment)s * %(sentiment)s,
+    sentiment_ema = COALESCE(s.sentiment_ema * {1 - EMA_ALPHA} + %(sentiment)s * {EMA_ALPHA}, %(sentiment)s),
+    first_sentiment = COALESCE(s.first_sentiment, %(sentiment)s),
+    last_sentiment = %(sentiment)s,
+    min_sentiment = LEAST(s.min_sentiment, %(sentiment)s),
+    max_sentiment = GREATEST(s.max_sentiment, %(sentiment)s),
+    trajectory = (s.trajectory || %(sentiment)s::double precision)[
+        GREATEST(1, COALESCE(array_length(s.trajectory, 1), 0) + 2 - {TRAJECTORY_POINTS}):],
+    emotion_score_sums = CASE
+        WHEN s.emotion_score_sums IS NULL OR %(scores)s::double precision[] IS NULL
+            THEN COALESCE(s.emotion_score_sums, %(scores)s::double precision[])
+        ELSE ARRAY(
+            SELECT total + score
+            FROM unnest(s.emotion_score_sums, %(scores)s::double precision[]) WITH ORDINALITY AS v (total, score, i)
+            ORDER BY i)
+    END,
+    updated_at = NOW()
+RETURNING *
+"""
+
+
+def _score_list(vector):
+    # float32 values as stored in emotion_scores, so the sums match a rebuild
+    return None if vector is None else [float(value) for value in vector]
+
+
+def record_message(cur, session_id, analysis):
+    """Fold one analyzed patient message into the session summary and return it"""
+    scores = analysis.get('emotion_scores')
+    cur.execute(RECORD_SQL, {
+        'session_id': session_id,
+        'emotion': analysis['emotion'],
+        'confidence': float(analysis['confidence']),
+        'sentiment': float(analysis['sentiment_score']),
+        'scores': _score_list(emotion_vectors.from_scores(scores)) if scores else None
+    })
+    return summarize(cur.fetchone())
+
+
+def get_summary(cur, session_id):
+    """Read a session summary, building it once from the raw rows if it is missing"""
+    cur.execute(GET_SQL, {'session_id': session_id})
+    row = cur.fetchone()
+    if row is None:
+        row = rebuild_summary(cur, session_id)
+    return summarize(row)
+
+
+def rebuild_summary(cur, session_id):
+    """Recompute a summary from chat_messages/emotion_analysis (backfill or repair)"""
+    cur.execute("DELETE FROM chat_session_summaries WHERE session_id = %s", (session_id,))
+    cur.execute("""
+        SELECT ea.emotion_detected, ea.confidence_score, ea.sentiment_score, ea.emotion_scores
+        FROM chat_messages cm
+        JOIN emotion_analysis ea ON cm.id = ea.message_id
+        WHERE cm.session_id = %s
+        ORDER BY cm.timestamp, cm.id
+    """, (session_id,))
+    row = None
+    for message in cur.fetchall():
+        cur.execute(RECORD_SQL, {
+            'session_id': session_id,
+            'emotion': message['emotion_detected'],
+            'confidence': float(message['confidence_score'] or 0),
+            'sentiment': float(message['sentiment_score'] or 0.5),
+            'scores': _score_list(emotion_vectors.unpack_many([message['emotion_scores']])[0])
+            if message['emotion_scores'] is not None else None
+        })
+        row = cur.fetchone()
+    return row
+
+
+def summarize(row):
+    """Turn a summary row into the API representation (None for an empty session)"""
+    if not row or not row['message_count']:
+        return None
+
+    count = row['message_count']
+    counts = row['emotion_counts']
+    confidence_sums = row['emotion_confidence_sums']
+    if isinstance(counts, str):
+        counts = json.loads(counts)
+        confidence_sums = json.loads(confidence_sums)
+
+    # Confidence-weighted: an emotion seen often with high confidence dominates
+    dominant = max(confidence_sums, key=confidence_sums.get) if confidence_sums else None
+    mean = row['sentiment_sum'] / count
+    variance = max(row['sentiment_sq_sum'] / count - mean ** 2, 0.0)
+    trajectory = list(row['trajectory'] or [])
+    # Percentages of the summed distribution equal those of the average one
+    score_sums = row.get('emotion_score_sums')
+    breakdown = emotion_vectors.breakdowns(np.array([score_sums]))[0] if score_sums else None
+
+    return {
+        'message_count': count,
+        'dominant_emotion': dominant,
+        'dominant_confidence': round(confidence_sums[dominant] / counts[dominant], 4) if dominant else None,
+        'emotion_counts': counts,
+        'emotion_mean_confidence': {
+            emotion: round(confidence_sums[emotion] / counts[emotion], 4) for emotion in counts
+        },
+        'sentiment': {
+            'mean': round(mean, 4),
+            'std': round(variance ** 0.5, 4),
+            'ema': round(row['sentiment_ema'], 4) if row['sentiment_ema'] is not None else None,
+            'first': row['first_sentiment'],
+            'last': row['last_sentiment'],
+            'min': row['min_sentiment'],
+            'max': row['max_sentiment'],
+            'trend': round(row['last_sentiment'] - row['first_sentiment'], 4)
+        },
+        'trajectory': trajectory,
+        'emotion_breakdown': breakdown,
+        'updated_at': row['updated_at']
+    }
@@ -0,0 +1,24 @@
+# test_cache.py - Invalidation of in-flight fills in the TTL cache
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import TTLCache
+
+
+def test_fill_started_before_invalidate_is_dropped():
+    cache = TTLCache()
+    generation = cache.generation('dashboard:1')
+    cache.invalidate('dashboard:1')
+    assert not cache.set_if_current('dashboard:1', {'stale': True}, generation)
+    assert cache.get('dashboard:1') is None
+    assert cache.set_if_current('dashboard:1', {'fresh': True}, cache.generation('dashboard:1'))
+    assert cache.get('dashboard:1') == {'fresh': True}
+
+
+def test_invalidation_counters_do_not_grow_with_keys():
+    cache = TTLCache(max_entries=10)
+    for user_id in range(50000):
+        cache.invalidate(f'dashboard:{user_id}')
+    assert len(cache._generations) == TTLCache.GENERATION_BUCKETS
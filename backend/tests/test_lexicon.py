@@ -0,0 +1,60 @@
+# test_lexicon.py - Regression cases for the rule-based fallback analyzer
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lexicon import Lexicon, DEFAULT_LEXICON_PATHS
+
+
+@pytest.fixture(scope='module')
+def lexicon():
+    return Lexicon.load(DEFAULT_LEXICON_PATHS)
+
+
+# Distress that negation handling used to turn positive or neutral
+@pytest.mark.parametrize('text', [
+    "I can't stop crying",
+    "never felt so alone",
+    "I can't stop worrying",
+    "I don't want to live anymore",
+    "I cannot sleep",
+])
+def test_distress_is_negative(lexicon, text):
+    analysis = lexicon.analyze(text)
+    assert analysis['raw_sentiment'] == 'NEGATIVE'
+    assert analysis['sentiment_score'] < 0.5
+    assert analysis['emotion'] != 'joy'
+
+
+@pytest.mark.parametrize('text', [
+    "I don't want to live anymore",
+    "I want to die",
+    "I can't go on like this",
+    "there is no reason to live",
+])
+def test_self_harm_phrases_are_high_risk(lexicon, text):
+    assert lexicon.analyze(text)['sentiment_score'] < 0.3
+
+
+@pytest.mark.parametrize('text', ["I'm not sad", "not bad", "it wasn't terrible"])
+def test_negated_negative_is_neutral(lexicon, text):
+    analysis = lexicon.analyze(text)
+    assert analysis['raw_sentiment'] == 'NEUTRAL'
+    assert analysis['emotion'] == 'neutral'
+
+
+def test_negated_positive_is_negative(lexicon):
+    assert lexicon.analyze("I'm not happy")['raw_sentiment'] == 'NEGATIVE'
+
+
+def test_blocker_keeps_positive_positive(lexicon):
+    analysis = lexicon.analyze("Passed my exam today, I can't stop smiling")
+    assert analysis['raw_sentiment'] == 'POSITIVE'
+    assert analysis['emotion'] == 'joy'
+
+
+def test_words_match_whole_tokens_only(lexicon):
+    assert lexicon.analyze('The crusade continues')['raw_sentiment'] == 'NEUTRAL'
@@ -0,0 +1,201 @@
+# upload_stream.py - Multipart audio uploads streamed straight to their final directory
+import os
+import time
+import uuid
+import struct
+import hashlib
+import logging
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+PART_PREFIX = '.upload-'
+PART_SUFFIX = '.part'
+FORM_OVERHEAD = 64 * 1024   # room for boundaries, part headers and small form fields
+WAV_HEADER_LIMIT = 64 * 1024  # give up looking for the data chunk after this many bytes
+
+
+class WavHeaderReader:
+    """Incremental RIFF/WAVE header parser fed with the upload's chunks.
+
+    Only the bytes up to the start of the ``data`` chunk are kept; after
+    that it just counts, so the duration of any length of recording is
+    known the moment the last chunk arrives.
+    """
+
+    def __init__(self):
+        self._header = b''
+        self.sample_rate = None
+        self.channels = None
+        self.byte_rate = None
+        self.data_offset = None
+        self.data_size = None
+        self.failed = False
+
+    def feed(self, data, offset):
+        if self.data_offset is not None or self.failed:
+            return
+        self._header += data[:max(0, WAV_HEADER_LIMIT - offset)]
+        self._parse()
+        if self.data_offset is None and len(self._header) >= WAV_HEADER_LIMIT:
+            self.failed = True
+
+    def _parse(self):
+        header = self._header
+        if len(header) < 12:
+            return
+        if header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+            self.failed = True
+            return
+        position = 12
+        while position + 8 <= len(header):
+            chunk_id, size = struct.unpack_from('<4sI', header, position)
+            body = position + 8
+            if chunk_id == b'data':
+                self.data_offset = body
+                self.data_size = size
+                self._header = b''
+                return
+            if body + size > len(header):
+                return  # wait for the rest of this chunk
+            if chunk_id == b'fmt ' and size >= 16:
+                _, self.channels, self.sample_rate, self.byte_rate = struct.unpack_from('<HHII', header, body)
+            position = body + size + (size & 1)
+
+    def duration(self, total_bytes):
+        """Seconds of audio in a file of ``total_bytes``, or None if it is not a readable WAV"""
+        if self.data_offset is None or not self.byte_rate:
+            return None
+        received = max(0, total_bytes - self.data_offset)
+        # Streaming writers leave the size as 0 or 0xFFFFFFFF; trust what arrived
+        if self.data_size not in (0, 0xFFFFFFFF):
+            received = min(received, self.data_size)
+        return round(received / self.byte_rate, 3)
+
+
+class StreamedUpload:
+    """Writable target for one multipart file part.
+
+    Chunks go straight into a hidden ``.part`` file in the destination
+    directory while their SHA-256 and the WAV duration are computed, so
+    there is no spooled temporary copy and no second pass over the file.
+    ``commit`` renames it into place (same filesystem, no copy); anything
+    not committed is deleted when the request closes.
+    """
+
+    def __init__(self, directory, max_bytes=None):
+        self.path = os.path.join(directory, f'{PART_PREFIX}{uuid.uuid4().hex}{PART_SUFFIX}')
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.committed_path = None
+        self._hash = hashlib.sha256()
+        self._wav = WavHeaderReader()
+        # Werkzeug already hands over 64 KiB chunks, so skip Python's buffer
+        self._file = open(self.path, 'xb', buffering=0)
+
+    def write(self, data):
+        if self.max_bytes is not None and self.size + len(data) > self.max_bytes:
+            self.discard()
+            raise RequestEntityTooLarge(f'Upload exceeds {self.max_bytes} bytes')
+        self._file.write(data)
+        self._hash.update(data)
+        self._wav.feed(data, self.size)
+        self.size += len(data)
+        return len(data)
+
+    def seek(self, offset, whence=0):
+        # The form parser rewinds every part once it is complete
+        return self._file.seek(offset, whence)
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def tell(self):
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    @property
+    def sha256(self):
+        return self._hash.hexdigest()
+
+    def info(self):
+        """What the upload revealed while streaming, for the analysis job payload"""
+        return {
+            'sha256': self.sha256,
+            'size': self.size,
+            'duration': self._wav.duration(self.size),
+            'sample_rate': self._wav.sample_rate
+        }
+
+    def commit(self, final_path):
+        """Move the finished upload to ``final_path`` and keep it"""
+        self._file.close()
+        os.replace(self.path, final_path)
+        self.committed_path = final_path
+        return final_path
+
+    def discard(self):
+        if self.committed_path:
+            return
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class UploadRequest(Request):
+    """Flask request whose file parts can be streamed to a chosen directory.
+
+    A view calls ``stream_files_to`` before touching ``request.files`` or
+    ``request.form``; the multipart body is then parsed with every file part
+    written through a ``StreamedUpload``. Requests that don't opt in keep
+    Werkzeug's default spooling.
+    """
+
+    upload_directory = None
+    upload_max_bytes = None
+
+    def stream_files_to(self, directory, max_bytes=None):
+        if max_bytes is not None and self.content_length is not None \
+                and self.content_length > max_bytes + FORM_OVERHEAD:
+            # Refuse before reading a byte of the body
+            raise RequestEntityTooLarge(f'Upload exceeds {max_bytes} bytes')
+        self.upload_directory = directory
+        self.upload_max_bytes = max_bytes
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.upload_directory is None:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        upload = StreamedUpload(self.upload_directory, self.upload_max_bytes)
+        self.__dict__.setdefault('_streamed_uploads', []).append(upload)
+        return upload
+
+    def close(self):
+        super().close()
+        for upload in self.__dict__.get('_streamed_uploads', ()):
+            upload.discard()
+
+
+def remove_stale_parts(directory, max_age=3600):
+    """Delete ``.part`` files left behind by uploads interrupted by a crash"""
+    cutoff = time.time() - max_age
+    removed = 0
+    for name in os.listdir(directory):
+        if not (name.startswith(PART_PREFIX) and name.endswith(PART_SUFFIX)):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    if removed:
+        logging.info(f"Removed {removed} interrupted uploads from {directory}")
+    return removed
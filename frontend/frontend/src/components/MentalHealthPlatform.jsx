@@ -294,7 +294,8 @@ const MentalHealthDashboard = () => {
       };
 
       recorder.onstop = () => {
-        const blob = new Blob(chunks, { type: 'audio/wav' });
+        // MediaRecorder produces compressed audio (usually WebM/Opus), not WAV
+        const blob = new Blob(chunks, { type: recorder.mimeType || 'audio/webm' });
         setRecordingBlob(blob);
         setRecordingDuration(0);
       };
@@ -323,13 +324,28 @@ const MentalHealthDashboard = () => {
     }
   };
 
+  // Poll a background analysis job until it finishes
+  const waitForJob = async (jobId) => {
+    for (let attempt = 0; attempt < 60; attempt++) {
+      const response = await fetch(`http://localhost:5000/api/jobs/${jobId}`);
+      if (response.ok) {
+        const job = await response.json();
+        if (job.status === 'completed') return job.result;
+        if (job.status === 'failed') throw new Error(job.error || 'Analysis failed');
+      }
+      await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+    throw new Error('Timed out waiting for analysis');
+  };
+
   const uploadVoiceRecording = async () => {
     if (!recordingBlob) return;
     
     setIsLoading(true);
     try {
       const formData = new FormData();
-      formData.append('voice_file', recordingBlob, 'voice_message.wav');
+      const extension = recordingBlob.type.includes('ogg') ? 'ogg' : 'webm';
+      formData.append('voice_file', recordingBlob, `voice_message.${extension}`);
       formData.append('user_id', '1');
 
       const response = await fetch('http://localhost:5000/api/voice-message', {
@@ -338,10 +354,11 @@ const MentalHealthDashboard = () => {
       });
       
       if (response.ok) {
-        const result = await response.json();
+        const { job_id } = await response.json();
         setRecordingBlob(null);
+        const result = await waitForJob(job_id);
         await loadDashboardData();
-        addNotification('Voice processed! Emotion: ' + result.analysis.emotion + ', +' + result.points_earned + ' points');
+        addNotification('Voice processed! Mood: ' + result.analysis.mood + ', +' + result.points_earned + ' points');
       }
     } catch (error) {
       console.error('Error uploading voice:', error);
@@ -17,7 +17,7 @@ import {
   RotateCcw
 } from 'lucide-react';
 
-const TherapistChatSession = () => {
+const TherapistChatSession = ({ sessionId }) => {
   const [patientData] = useState({
     name: 'Simon Jones',
     age: 28,
@@ -92,6 +92,46 @@ const TherapistChatSession = () => {
     scrollToBottom();
   }, [messages]);
 
+  // Live updates pushed by the backend (Server-Sent Events) instead of polling.
+  // EventSource resumes from the last event id (the session message number) automatically on reconnect.
+  useEffect(() => {
+    if (!sessionId) return;
+
+    const source = new EventSource(`http://localhost:5000/api/chat/session/${sessionId}/stream`);
+    source.addEventListener('message', (event) => {
+      const { message, analysis } = JSON.parse(event.data);
+      const timestamp = new Date(message.timestamp);
+      const time = timestamp.toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
+
+      setMessages(prev => prev.some(m => m.id === message.id) ? prev : [...prev, {
+        id: message.id,
+        type: message.sender_type,
+        content: message.content,
+        timestamp,
+        time,
+        ...(analysis && {
+          emotions: {
+            primary: analysis.emotion,
+            percentage: Math.round(analysis.confidence * 100),
+            breakdown: patientEmotions.breakdown
+          }
+        })
+      }]);
+
+      if (analysis) {
+        setEmotionHistory(prev => [{
+          time,
+          type: 'Chat',
+          emotion: analysis.emotion,
+          percentage: Math.round(analysis.confidence * 100),
+          message: message.content
+        }, ...prev]);
+      }
+    });
+
+    return () => source.close();
+  }, [sessionId]);
+
   const sendMessage = () => {
     if (!newMessage.trim()) return;
 